@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,7 +43,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'voting.query_budget.QueryBudgetMiddleware',  # Outermost DB user so session saves are counted too
+    'voting.idempotency.IdempotencyMiddleware',  # Before sessions so replays skip the database entirely
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'voting.rate_limit.RateLimitMiddleware',  # Needs the session for keys; rejects before any view work
     'django.middleware.locale.LocaleMiddleware',  # Add locale middleware for i18n
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,6 +88,56 @@ DATABASES = {
     }
 }
 
+# Caches
+# Sessions live in a file cache so every worker process on the host sees
+# the same copy; switch to Redis or Memcached when running several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'TIMEOUT': 1209600,  # Matches SESSION_COOKIE_AGE; entries also expire with the session
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
+    # Cross-process invalidation counters (ballot generations and the like)
+    # must be seen by every worker: a file cache works on one host, use
+    # Redis or Memcached across hosts. See voting.checks.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'shared',
+        'TIMEOUT': None,
+    },
+}
+
+# Sessions: shared cache first, django_session as the fallback; unchanged
+# sessions are not written back (voting.session_backend)
+SESSION_ENGINE = 'voting.session_backend'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Read replicas (voting.db_router)
+# Views marked read_only_view read from these; everything else uses default.
+# VOTE4ALL_READ_REPLICAS takes comma-separated SQLite paths, e.g. two copies
+# of db.sqlite3 for local testing; production points these at real replicas.
+READ_REPLICA_PATHS = [path for path in os.getenv('VOTE4ALL_READ_REPLICAS', '').split(',') if path]
+
+for index, replica_path in enumerate(READ_REPLICA_PATHS, start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': replica_path,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+READ_REPLICAS = {
+    'ALIASES': [f'replica{index}' for index in range(1, len(READ_REPLICA_PATHS) + 1)],
+    'CHECK_SECONDS': 5,  # How long a passed health check is trusted
+    'RETRY_SECONDS': 30,  # How long a failed replica is skipped
+    'PINNED_APPS': ['sessions', 'auth', 'contenttypes'],  # Just written by the previous request
+}
+
+DATABASE_ROUTERS = ['voting.db_router.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,6 +205,250 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Per-constituency ballot cache (invalidated on Candidate/Party changes)
+BALLOT_CACHE = {
+    'CACHE_ALIAS': 'default',  # Ballots themselves; per-process is fine
+    'GENERATION_ALIAS': 'shared',  # Must be shared by all workers for edits to reach them
+    'TIMEOUT': 60,  # Seconds; bounds staleness should an invalidation be lost
+}
+
+# Live results streaming (Server-Sent Events over ASGI)
+LIVE_RESULTS = {
+    'TICK_SECONDS': 2.0,  # One tally read per tick per worker, shared by all clients
+    'HEARTBEAT_SECONDS': 15.0,  # Keepalive comment when nothing changed
+    'CLIENT_QUEUE_SIZE': 4,  # Events buffered per client before it is resynced
+    'MAX_STREAM_SECONDS': 600,  # Streams end after this and EventSource reconnects
+}
+
+# Group-commit vote journal
+# When enabled, submit_vote appends ballots to a local journal that is
+# fsynced in groups and bulk-inserted into Vote by a background flusher
+VOTE_JOURNAL = {
+    'ENABLED': False,
+    'DIRECTORY': BASE_DIR / 'vote_journal',  # Local disk, one file per worker process
+    'FLUSH_INTERVAL_MS': 10,  # Longest a ballot waits for the shared fsync
+    'FLUSH_BATCH_SIZE': 256,  # fsync immediately once this many ballots are waiting
+    'APPLY_BATCH_SIZE': 500,  # Ballots per bulk insert into Vote
+    'APPLY_INTERVAL_MS': 100,  # Longest a durable ballot waits to reach the database
+    'ROTATE_BYTES': 64 * 1024 * 1024,  # Truncate the journal once fully applied and this large
+}
+
+# Turnout time series (voting.turnout)
+# Minute buckets are folded into hours, and hours into days, by rollup_turnout
+TURNOUT = {
+    'MINUTE_RETENTION_HOURS': 6,  # Keep minute resolution for the current polling window
+    'HOUR_RETENTION_DAYS': 14,
+}
+
+# OTP service (voting.otp_service)
+# Codes are stored as HMACs in the cache, with a copy in the OTP table so any
+# worker can verify them; run sweep_otps periodically to bound the table.
+OTP_SERVICE = {
+    'CACHE_ALIAS': 'default',
+    'TTL_SECONDS': 300,
+    'CODE_LENGTH': 6,
+    'MAX_ATTEMPTS': 5,  # Wrong guesses before the code is locked
+    'DB_WRITE_THROUGH': True,
+    'SECRET': None,  # HMAC key; defaults to SECRET_KEY
+    'EXPOSE_CODES': DEBUG,  # Echo codes in API responses; never in production
+}
+
+# SMS dispatch (voting.sms_dispatch)
+# OTP messages are queued and delivered by background worker threads in
+# batches. Set GATEWAY to a provider class implementing SMSGateway; with it
+# unset, sending OTPs fails rather than losing the codes.
+SMS_DISPATCH = {
+    # Console logs messages with codes masked; FileGateway / LoopbackGateway for local testing
+    'GATEWAY': 'voting.sms_dispatch.ConsoleGateway' if DEBUG else None,
+    'GATEWAY_OPTIONS': {},  # Keyword arguments for the gateway, e.g. {'path': ...} for FileGateway
+    'WORKERS': 2,
+    'BATCH_SIZE': 50,  # Messages per gateway call (capped by the gateway's max_batch_size)
+    'BATCH_WAIT_MS': 20,  # How long a worker waits to fill a batch
+    'MAX_RETRIES': 5,
+    'BACKOFF_BASE_MS': 200,  # Doubles per attempt, with jitter
+    'BACKOFF_MAX_MS': 10000,
+    'MAX_QUEUE': 10000,  # Requests get 503 beyond this instead of piling up
+    'SHUTDOWN_TIMEOUT': 5.0,  # Seconds to drain the queue on exit
+}
+
+# Admission control (voting.admission)
+# Per-process limits in front of the vote and OTP endpoints. Requests over
+# the constituency rate, or that would queue longer than TARGET_QUEUE_MS for
+# a worker slot, get 429 with Retry-After instead of waiting on the database.
+ADMISSION = {
+    'ENABLED': True,
+    'GROUPS': {
+        'vote': {
+            'RATE': 50,  # Ballots per second per constituency, per process
+            'BURST': 100,
+            'MAX_CONCURRENT': 8,  # Keep below the database connection budget per process
+            'MAX_QUEUE': 64,
+            'TARGET_QUEUE_MS': 500,
+        },
+        'otp': {
+            'RATE': 20,
+            'BURST': 40,
+            'MAX_CONCURRENT': 4,
+            'MAX_QUEUE': 32,
+            'TARGET_QUEUE_MS': 1000,
+        },
+    },
+}
+
+# Idempotency keys (voting.idempotency)
+# Responses of views marked @idempotent are replayed for retries carrying
+# the same Idempotency-Key header. The cache must be shared by every worker
+# process, or duplicates reaching different workers both run (voting.E003).
+IDEMPOTENCY = {
+    'CACHE_ALIAS': 'shared',
+    'TTL': 24 * 3600,  # Seconds a stored response can be replayed
+    'LOCK_TIMEOUT': 30,  # Longest a duplicate waits for the original to finish
+}
+
+# Rate limiting and lockout (voting.rate_limit)
+# Routes opt in from voting/urls.py with rate_limit(view, scope=..., keys=...).
+# Failed attempts and lockout default to BIOMETRIC_VERIFICATION's MAX_ATTEMPTS
+# and LOCKOUT_DURATION. Use BACKEND 'cache' with a shared cache when running
+# more than one worker process.
+RATE_LIMIT = {
+    'ENABLED': True,
+    'BACKEND': 'memory',  # 'memory' (per process) or 'cache'
+    'CACHE_ALIAS': 'default',
+    'WINDOW_SECONDS': 900,  # Sliding window for counting attempts
+    'MAX_REQUESTS': None,  # Default cap on requests per window per key (None = only count failures)
+    'IP_FACTOR': 10,  # Client IP keys get this multiple of each limit (shared NAT addresses)
+    # Reverse proxies in front of the app that append to X-Forwarded-For;
+    # 0 uses REMOTE_ADDR, as the header can then be forged by the client
+    'TRUSTED_PROXY_COUNT': int(os.getenv('VOTE4ALL_TRUSTED_PROXY_COUNT', '0')),
+}
+
+# Registration uniqueness pre-check (voting.registration_index)
+# Bloom filters per unique field let user_register_submit skip the database
+# when nothing collides. Size CAPACITY above the expected number of
+# registrations: each field costs about 1.2 bytes per registration at 1%.
+REGISTRATION_INDEX = {
+    'ENABLED': True,
+    'CAPACITY': 1000000,
+    'ERROR_RATE': 0.01,  # False positive rate at capacity (a false positive only costs one query)
+    'WARM_CHUNK_SIZE': 10000,
+    'WARM_IN_BACKGROUND': True,  # Tests warm synchronously for deterministic queries (voting.test_runner)
+}
+
+# Elector search (voting.elector_search)
+# Prefix and fuzzy search over voter names, EPIC numbers and constituencies.
+# PostgreSQL answers from pg_trgm GIN indexes (migration 0012); other
+# databases use a per-process trigram index of roughly 700 bytes per
+# voter, so rolls in the millions belong on PostgreSQL.
+ELECTOR_SEARCH = {
+    'BACKEND': 'auto',  # 'auto' (trigram on PostgreSQL, memory elsewhere), 'trigram' or 'memory'
+    'MIN_SIMILARITY': 0.3,  # Same as pg_trgm.similarity_threshold's default
+    'MIN_QUERY_LENGTH': 2,
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 50,
+    'WARM_CHUNK_SIZE': 10000,
+    'WARM_IN_BACKGROUND': True,  # Off under voting.test_runner
+}
+
+# Duplicate registration detection (voting.duplicate_detection)
+# Registrations sharing a blocking key (phonetic name, date of birth,
+# guardian name) are scored pairwise by the detect_duplicates command.
+DUPLICATE_DETECTION = {
+    'MIN_SCORE': 0.9,  # Pairs scoring lower are not stored; same name and guardian alone score 0.85
+    'WEIGHTS': {'name': 0.6, 'guardian': 0.25, 'dob': 0.15},
+    'MAX_BLOCK_SIZE': 200,  # Larger blocks compare each name with its WINDOW neighbours only
+    'WINDOW': 20,
+    'TASK_SIZE': 5000,  # Registrations per worker task
+}
+
+# Media storage (voting.storage)
+# Party, Candidate and RegisteredUser images are stored once per distinct
+# content (named by SHA-256) with reference counts, instead of Django's
+# suffixed copies. Run `manage.py dedupe_media` after enabling on existing data.
+MEDIA_STORAGE = {
+    'CONTENT_ADDRESSED': True,
+}
+
+# Registration document images (voting.document_pipeline)
+# After a registration commits, its Aadhaar and Voter ID images are
+# validated, stripped of metadata, downscaled and recompressed in a worker
+# pool, and a thumbnail is written for admin review.
+DOCUMENT_PIPELINE = {
+    'ENABLED': True,
+    'ASYNC': True,  # Tests process inline after commit (voting.test_runner)
+    'WORKERS': 2,  # Threads per process; Pillow releases the GIL while decoding and resizing
+    'ALLOWED_FORMATS': ('JPEG', 'PNG', 'WEBP'),
+    'MAX_PIXELS': 40000000,  # Reject larger uploads (decompression bombs)
+    'FORMAT': 'WEBP',  # Or 'JPEG'; WebP is about 40% smaller at the same quality
+    'MAX_DIMENSION': 1280,  # Longest side after downscaling; keeps ID card text legible
+    'QUALITY': 75,
+    'THUMBNAIL_DIMENSION': 240,
+    'THUMBNAIL_QUALITY': 70,
+}
+
+# Per-view query budgets (voting.query_budget)
+# Budgets are keyed by URL name and count every query of the request,
+# including session and auth lookups. Violations fail the test suite (see
+# voting.test_runner) and are logged as warnings in production.
+QUERY_BUDGETS = {
+    'ENABLED': True,
+    'STRICT': os.getenv('VOTE4ALL_QUERY_BUDGETS_STRICT') == '1',  # Raise instead of logging
+    'REPEAT_THRESHOLD': 5,  # Same query shape this often in one request is reported as N+1
+    'DEFAULT_QUERIES': 10,  # Views without an entry below
+    'DEFAULT_DB_MS': 250,  # Logged only; timings are too noisy to fail tests on
+    'VIEWS': {
+        # Static pages: at most a session read and the auth user
+        'landing': 3,
+        'guidelines': 3,
+        'nationality': 3,
+        'home': 3,
+        'user_register': 3,
+        'digilocker_login': 3,
+        'digilocker_signup': 3,
+        'registration_success': 3,
+        'login_page': 3,
+        'voter_login': 3,
+        'search': 3,
+        'nri_login': 3,
+
+        # Registration
+        'user_register_submit': 16,  # Uniqueness check, insert, two stored blobs, session write
+        'digilocker_auth': 16,
+        'digilocker_signup_auth': 16,
+        'send_otp_page': 4,
+        'send_otp': 5,  # Includes the OTP write-through row
+        'verify_otp': 17,  # Provisions the User and Voter inside one transaction
+
+        # Login and voting
+        'login_send_otp': 6,  # New session plus the OTP write-through row
+        'login_verify_otp': 5,
+        'voter_auth': 8,
+        'voter_info': 5,  # Voter plus up to two RegisteredUser fallbacks
+        'vote': 5,  # Ballot comes from voting.ballot_cache
+        'submit_vote': 16,  # Claim, insert, tally and turnout bucket; first vote of a bucket adds savepoints
+        'logout': 4,
+        'face_detection': 4,
+
+        # Federated biometric API
+        'register_biometric_api': 8,
+        'verify_biometric_api': 6,
+        'verify_biometric_batch_api': 6,  # Session, user, embeddings, voters without one, last_used, audit rows
+        'federated_model_info': 5,
+        'submit_graderated_gradients': 14,  # Includes aggregation once enough gradients arrive
+        'biometric_status': 6,
+        'delete_biometric': 6,
+        'federated_stats': 4,
+
+        'live_results_stream': 2,  # Tallies are read by the shared aggregator, not per request
+        'turnout_api': 3,
+        'elector_search': 3,  # Index warm-up (tests warm synchronously), new-voter catch-up, page rows
+        'admission_metrics': 3,
+        'sms_dispatch_metrics': 3,
+
+        # Admin
+        'voting_registereduser_changelist': 16,  # The approve action provisions voters in constant queries
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -183,6 +481,20 @@ BIOMETRIC_VERIFICATION = {
     'MAX_ATTEMPTS': 3,  # Maximum failed authentication attempts before lockout
     'LOCKOUT_DURATION': 900,  # Lockout duration in seconds (15 minutes)
     'EMBEDDING_DIMENSION': 128,  # FaceAPI descriptor dimension
+    'MAX_BATCH_SIZE': 100,  # Voters per call to the kiosk batch endpoint
+}
+
+# Decrypted embedding cache (voting.embedding_cache)
+# Per-process LRU of normalized embeddings for repeat verification; changes
+# reach other processes through a generation counter in CACHE_ALIAS, which
+# must be shared between them (the cache is not used otherwise).
+BIOMETRIC_EMBEDDING_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 10000,  # About 0.5 KiB of vector each for 128-d embeddings
+    'TTL': 300,  # Seconds; bounds staleness if the generation counter is lost
+    'CACHE_ALIAS': 'shared',
+    'LAST_USED_INTERVAL': 60,  # Seconds between last_used writes for one embedding
+    'DECRYPT_WORKERS': 4,  # Threads decrypting cache misses of a batch verification
 }
 
 # Privacy and Compliance
@@ -227,3 +539,6 @@ LOGGING = {
         },
     },
 }
+
+# Applies voting.test_runner.TEST_OVERRIDES for `manage.py test`
+TEST_RUNNER = 'voting.test_runner.TestRunner'
@@ -1,12 +1,31 @@
-from django.contrib import admin
-from .models import Party, Candidate, Voter, Vote, LoginSession, RegisteredUser, OTP
+from django.contrib import admin, messages
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import (
+    Party, Candidate, Voter, Vote, CandidateTally, TurnoutBucket, LoginSession, RegisteredUser, OTP,
+    DocumentProcessingLog, DuplicateSuspect, StoredBlob,
+)
+from .provisioning import provision_registrations
+
+# Larger approvals are left to `manage.py provision_voters`, outside the request
+ADMIN_PROVISION_LIMIT = 1000
+
+
+def _thumbnail(thumbnail, image):
+    # Thumbnails are written by voting.document_pipeline; link to the full image
+    if not thumbnail:
+        return '-'
+    return format_html(
+        '<a href="{}"><img src="{}" alt="" style="max-height:60px" loading="lazy"></a>',
+        image.url if image else thumbnail.url, thumbnail.url,
+    )
 
 @admin.register(RegisteredUser)
 class RegisteredUserAdmin(admin.ModelAdmin):
-    list_display = ['full_name', 'username', 'voter_id_epic', 'phone_number', 'phone_verified', 'documents_verified', 'is_approved', 'created_at']
+    list_display = ['full_name', 'username', 'voter_id_epic', 'phone_number', 'aadhaar_preview', 'voter_id_preview', 'phone_verified', 'documents_verified', 'is_approved', 'created_at']
     search_fields = ['full_name', 'username', 'voter_id_epic', 'aadhaar_number', 'phone_number']
     list_filter = ['gender', 'guardian_relation', 'phone_verified', 'documents_verified', 'is_approved', 'created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['aadhaar_preview', 'voter_id_preview', 'created_at', 'updated_at']
     list_select_related = ['linked_voter']
     
     fieldsets = (
@@ -26,7 +45,7 @@ class RegisteredUserAdmin(admin.ModelAdmin):
             'fields': ('address', 'constituency')
         }),
         ('Document Uploads', {
-            'fields': ('aadhaar_image', 'voter_id_image')
+            'fields': (('aadhaar_image', 'aadhaar_preview'), ('voter_id_image', 'voter_id_preview'))
         }),
         ('Verification Status', {
             'fields': ('phone_verified', 'documents_verified', 'is_approved')
@@ -41,22 +60,96 @@ class RegisteredUserAdmin(admin.ModelAdmin):
     
     actions = ['approve_registration', 'mark_documents_verified']
     
+    def aadhaar_preview(self, obj):
+        return _thumbnail(obj.aadhaar_thumbnail, obj.aadhaar_image)
+    aadhaar_preview.short_description = "Aadhaar"
+    
+    def voter_id_preview(self, obj):
+        return _thumbnail(obj.voter_id_thumbnail, obj.voter_id_image)
+    voter_id_preview.short_description = "Voter ID"
+    
     def approve_registration(self, request, queryset):
-        updated = queryset.update(is_approved=True, documents_verified=True)
-        self.message_user(request, f'{updated} registrations approved successfully.')
-    approve_registration.short_description = "Approve selected registrations"
+        registration_ids = list(queryset.values_list('pk', flat=True))
+        updated = RegisteredUser.objects.filter(pk__in=registration_ids).update(is_approved=True, documents_verified=True)
+        if len(registration_ids) > ADMIN_PROVISION_LIMIT:
+            self.message_user(request, f'{updated} registrations approved. Voter accounts are not created for more '
+                                       f'than {ADMIN_PROVISION_LIMIT} at once; run `manage.py provision_voters`.',
+                              level=messages.WARNING)
+            return
+        stats = provision_registrations(registration_ids)
+        self.message_user(request, f'{updated} registrations approved successfully, '
+                                   f'{stats["voters_created"]} voter accounts created.')
+        if stats['conflicts']:
+            self.message_user(request, f'{stats["conflicts"]} registrations could not be linked: their username '
+                                       f'already belongs to another voter.', level=messages.WARNING)
+    approve_registration.short_description = "Approve selected registrations and create voter accounts"
     
     def mark_documents_verified(self, request, queryset):
         updated = queryset.update(documents_verified=True)
         self.message_user(request, f'{updated} documents marked as verified.')
     mark_documents_verified.short_description = "Mark documents as verified"
 
+@admin.register(DocumentProcessingLog)
+class DocumentProcessingLogAdmin(admin.ModelAdmin):
+    list_display = ['registration', 'field', 'status', 'original_format', 'original_bytes', 'processed_bytes', 'thumbnail_bytes', 'duration_ms', 'processed_at']
+    search_fields = ['registration__username', 'registration__voter_id_epic']
+    list_filter = ['status', 'field', 'original_format', 'processed_at']
+    list_select_related = ['registration']
+    
+    def has_add_permission(self, request):
+        return False  # Written by voting.document_pipeline
+    
+    def has_change_permission(self, request, obj=None):
+        return False  # Processing history is read-only
+
+@admin.register(DuplicateSuspect)
+class DuplicateSuspectAdmin(admin.ModelAdmin):
+    list_display = ['registration', 'similar_to', 'score', 'name_similarity', 'guardian_similarity', 'dob_similarity', 'blocking_pass', 'status', 'detected_at']
+    search_fields = ['registration__full_name', 'registration__voter_id_epic', 'similar_to__full_name', 'similar_to__voter_id_epic']
+    list_filter = ['status', 'blocking_pass', 'detected_at']
+    list_select_related = ['registration', 'similar_to']
+    readonly_fields = ['registration', 'similar_to', 'blocking_pass', 'score', 'name_similarity', 'guardian_similarity', 'dob_similarity', 'detected_at', 'reviewed_at']
+    ordering = ['-score']
+    
+    actions = ['mark_confirmed', 'mark_dismissed']
+    
+    def has_add_permission(self, request):
+        return False  # Found by the detect_duplicates command
+    
+    def save_model(self, request, obj, form, change):
+        if 'status' in form.changed_data:
+            obj.reviewed_at = timezone.now()
+        super().save_model(request, obj, form, change)
+    
+    def mark_confirmed(self, request, queryset):
+        updated = queryset.update(status='confirmed', reviewed_at=timezone.now())
+        self.message_user(request, f'{updated} pairs marked as duplicates.')
+    mark_confirmed.short_description = "Mark selected pairs as duplicates"
+    
+    def mark_dismissed(self, request, queryset):
+        updated = queryset.update(status='dismissed', reviewed_at=timezone.now())
+        self.message_user(request, f'{updated} pairs marked as different people.')
+    mark_dismissed.short_description = "Mark selected pairs as different people"
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'refcount', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False  # Maintained by voting.storage and dedupe_media
+    
+    def has_change_permission(self, request, obj=None):
+        return False  # Reference counts must match the stored files
+
 @admin.register(OTP)
 class OTPAdmin(admin.ModelAdmin):
-    list_display = ['phone_number', 'otp_code', 'created_at', 'expires_at', 'is_verified', 'is_used']
+    list_display = ['phone_number', 'created_at', 'expires_at', 'is_verified', 'is_used']
     search_fields = ['phone_number']
     list_filter = ['is_verified', 'is_used', 'created_at']
     readonly_fields = ['created_at', 'expires_at']
+    exclude = ['otp_code']  # HMAC of the code; meaningless to staff
     
     def has_add_permission(self, request):
         return False  # Prevent manual OTP creation
@@ -96,6 +189,33 @@ class VoteAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False  # Prevent vote deletion
 
+@admin.register(CandidateTally)
+class CandidateTallyAdmin(admin.ModelAdmin):
+    list_display = ['candidate', 'constituency', 'votes', 'updated_at']
+    search_fields = ['candidate__name', 'constituency']
+    list_filter = ['constituency']
+    readonly_fields = ['candidate', 'constituency', 'votes', 'updated_at']
+    list_select_related = ['candidate', 'candidate__party']
+    
+    def has_add_permission(self, request):
+        return False  # Maintained by submit_vote and rebuild_tallies
+    
+    def has_change_permission(self, request, obj=None):
+        return False  # Prevent tally modification
+
+@admin.register(TurnoutBucket)
+class TurnoutBucketAdmin(admin.ModelAdmin):
+    list_display = ['constituency', 'granularity', 'bucket_start', 'votes']
+    search_fields = ['constituency']
+    list_filter = ['granularity', 'constituency']
+    readonly_fields = ['constituency', 'granularity', 'bucket_start', 'votes']
+    
+    def has_add_permission(self, request):
+        return False  # Maintained by submit_vote and rollup_turnout
+    
+    def has_change_permission(self, request, obj=None):
+        return False  # Prevent turnout modification
+
 @admin.register(LoginSession)
 class LoginSessionAdmin(admin.ModelAdmin):
     list_display = ['voter', 'login_type', 'login_time', 'logout_time', 'is_active']
@@ -0,0 +1,232 @@
+"""
+Admission control for the vote and OTP write paths
+Each protected view belongs to a group (settings.ADMISSION['GROUPS']).
+A request is admitted only if
+
+    1. its constituency's token bucket has a token, and
+    2. a slot in the group's per-process concurrency limit frees up before
+       the queueing delay would exceed the group's latency target.
+
+Otherwise it is shed immediately with 429 and Retry-After, so a slow
+database makes clients back off instead of piling requests into workers
+until everything times out.
+"""
+
+from collections import defaultdict
+from functools import wraps
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = '*'
+
+
+def _config():
+    return getattr(settings, 'ADMISSION', {})
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Token buckets per key plus a bounded concurrency limiter for one group"""
+
+    def __init__(self, name, rate, burst, max_concurrent, max_queue, target_queue_ms):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.target_queue = target_queue_ms / 1000
+
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._buckets = {}
+        self._active = 0
+        self._queued = 0
+        self._service_time = None  # EWMA of admitted request duration in seconds
+        self.metrics = defaultdict(int)
+
+    def try_token(self, key):
+        """
+        Returns:
+            float: 0 if admitted by the rate limit, else suggested retry delay
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return bucket.take(time.monotonic())
+
+    def predicted_wait(self):
+        """Queueing delay a new request would see, from the recent service time"""
+        if self._service_time is None:
+            return 0.0
+        return (self._queued + 1) * self._service_time / self.max_concurrent
+
+    def acquire(self):
+        """
+        Wait for a concurrency slot, but never past the latency target
+
+        Returns:
+            str or None: None when admitted, else the reason it was shed
+        """
+        with self._lock:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                return None
+            if self._queued >= self.max_queue:
+                return 'queue_full'
+            if self.predicted_wait() > self.target_queue:
+                return 'latency'
+
+            self._queued += 1
+            deadline = time.monotonic() + self.target_queue
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return 'timeout'
+                    self._slot_freed.wait(remaining)
+            finally:
+                self._queued -= 1
+            self._active += 1
+            return None
+
+    def release(self, elapsed):
+        with self._lock:
+            self._active -= 1
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._slot_freed.notify()
+
+    def retry_after(self):
+        """Seconds a shed client should wait: roughly one queue's worth of work"""
+        with self._lock:
+            service_time = self._service_time or self.target_queue
+            backlog = (self._active + self._queued) * service_time / self.max_concurrent
+        return max(1, math.ceil(backlog))
+
+    def record(self, outcome):
+        with self._lock:
+            self.metrics[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'active': self._active,
+                'queued': self._queued,
+                'service_time_ms': round((self._service_time or 0) * 1000, 1),
+                **self.metrics,
+            }
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(group):
+    """Per-process controller for a group in settings.ADMISSION['GROUPS']"""
+    config = _config().get('GROUPS', {}).get(group, {})
+    signature = (group, tuple(sorted(config.items())))
+    with _controllers_lock:
+        controller = _controllers.get(group)
+        if controller is None or controller.signature != signature:
+            controller = AdmissionController(
+                group,
+                rate=config.get('RATE', 100),
+                burst=config.get('BURST', 200),
+                max_concurrent=config.get('MAX_CONCURRENT', 8),
+                max_queue=config.get('MAX_QUEUE', 32),
+                target_queue_ms=config.get('TARGET_QUEUE_MS', 500),
+            )
+            controller.signature = signature
+            _controllers[group] = controller
+        return controller
+
+
+def admission_metrics():
+    """Counters and queue state for every group seen by this process"""
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return {controller.name: controller.snapshot() for controller in controllers}
+
+
+def session_constituency(request):
+    """Token bucket key: the constituency of the voter in session, if any"""
+    session = getattr(request, 'session', None)
+    user_details = session.get('user_details') if session is not None else None
+    if user_details and user_details.get('constituency'):
+        return user_details['constituency']
+    return GLOBAL_KEY
+
+
+def _shed(controller, reason, retry_after, request):
+    controller.record(f'shed_{reason}')
+    logger.warning(f"Shed {request.method} {request.path} ({controller.name}: {reason}), retry after {retry_after}s")
+    response = JsonResponse({
+        'success': False,
+        'error': 'The service is busy. Please try again shortly.'
+    }, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def admission_controlled(group, key_func=session_constituency):
+    """
+    Put a view behind the group's admission controller
+
+    Args:
+        group: name of an entry in settings.ADMISSION['GROUPS']
+        key_func: request -> token bucket key (constituency by default)
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _config().get('ENABLED', True):
+                return view_func(request, *args, **kwargs)
+
+            controller = get_controller(group)
+            wait = controller.try_token(key_func(request))
+            if wait:
+                return _shed(controller, 'rate', max(1, math.ceil(wait)), request)
+
+            reason = controller.acquire()
+            if reason:
+                return _shed(controller, reason, controller.retry_after(), request)
+
+            controller.record('admitted')
+            started = time.monotonic()
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                controller.release(time.monotonic() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+"""
+Per-constituency ballot cache
+Holds the candidate list for each constituency (ids, names, party names,
+photo and symbol URLs) plus a pre-serialized JSON copy, so rendering the
+ballot and validating a submitted choice need no database query.
+
+Any Candidate or Party change bumps a generation counter (see
+voting.signals), which invalidates every cached ballot at once. Ballots
+change rarely, so coarse invalidation keeps this simple and correct. The
+ballots may live in a per-process cache, but the counter must be in a
+cache every worker shares (GENERATION_ALIAS, checked by voting.checks)
+or edits would only reach the worker that made them.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'ballot:generation'
+
+
+def _config():
+    return getattr(settings, 'BALLOT_CACHE', {})
+
+
+def _cache():
+    return caches[_config().get('CACHE_ALIAS', 'default')]
+
+
+def _generation_cache():
+    return caches[_config().get('GENERATION_ALIAS', 'shared')]
+
+
+def _file_url(field):
+    return field.url if field else ''
+
+
+class Ballot:
+    """Immutable candidate list for one constituency"""
+
+    def __init__(self, constituency, entries):
+        self.constituency = constituency
+        self.entries = entries
+        self.json = json.dumps(entries)
+        self._by_id = {entry['id']: entry for entry in entries}
+        self._by_name = {(entry['name'], entry['party']): entry for entry in entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidate(self, candidate_id):
+        """Ballot entry for a candidate id, or None if not on this ballot"""
+        try:
+            return self._by_id.get(int(candidate_id))
+        except (TypeError, ValueError):
+            return None
+
+    def resolve(self, candidate_id=None, name=None, party=None):
+        """
+        Find the ballot entry a client selected
+
+        Clients should send the candidate id; name and party are accepted
+        for older clients that post the displayed labels.
+        """
+        if candidate_id is not None:
+            return self.candidate(candidate_id)
+        return self._by_name.get((name, party))
+
+
+def build_ballot(constituency):
+    """Load a constituency's ballot from the database"""
+    from .models import Candidate
+
+    candidates = (
+        Candidate.objects
+        .filter(constituency=constituency)
+        .select_related('party')
+        .order_by('id')
+    )
+    entries = [
+        {
+            'id': candidate.id,
+            'name': candidate.name,
+            'party': candidate.party.name,
+            'party_id': candidate.party_id,
+            'photo_url': _file_url(candidate.photo),
+            'symbol_url': _file_url(candidate.party.symbol),
+        }
+        for candidate in candidates
+    ]
+    return Ballot(constituency, entries)
+
+
+def _generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _ballot_key(generation, constituency):
+    digest = hashlib.sha1(constituency.encode()).hexdigest()
+    return f'ballot:{generation}:{digest}'
+
+
+def get_ballot(constituency):
+    """
+    Cached ballot for a constituency
+
+    Returns:
+        Ballot (empty if the constituency has no candidates)
+    """
+    cache = _cache()
+    key = _ballot_key(_generation(_generation_cache()), constituency)
+
+    ballot = cache.get(key)
+    if ballot is None:
+        ballot = build_ballot(constituency)
+        cache.set(key, ballot, timeout=_config().get('TIMEOUT', 60))
+        logger.debug(f"Cached ballot for {constituency} ({len(ballot)} candidates)")
+    return ballot
+
+
+def invalidate_ballots():
+    """Drop every cached ballot, in every worker, by moving to a new generation"""
+    cache = _generation_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Counter expired or was never set
+        cache.set(GENERATION_KEY, 2, timeout=None)
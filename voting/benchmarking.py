@@ -0,0 +1,147 @@
+"""
+Helpers shared by the benchmark and load-test management commands
+Benchmarks run against a throwaway database created the same way the
+test runner does, so they never touch live election data
+"""
+
+from contextlib import contextmanager
+import math
+import os
+import tempfile
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def isolated_database(on_disk=True, verbosity=0):
+    """
+    Create and migrate a temporary copy of the default database
+
+    Args:
+        on_disk: for SQLite, use a temporary file instead of :memory: so
+                 commits pay for real fsyncs like they do in production
+        verbosity: passed through to the test database creation
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    original_name = test_settings.get('NAME')
+    temp_dir = None
+
+    if on_disk and connection.vendor == 'sqlite' and not original_name:
+        temp_dir = tempfile.mkdtemp(prefix='vote4all-bench-')
+        test_settings['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+
+    old_config = setup_databases(verbosity=verbosity, interactive=False, aliases={'default'})
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        from voting import document_pipeline
+
+        # Background jobs must not outlive the database they write to
+        document_pipeline.drain()
+        teardown_databases(old_config, verbosity=verbosity)
+        test_settings['NAME'] = original_name
+        if temp_dir:
+            for name in os.listdir(temp_dir):
+                os.remove(os.path.join(temp_dir, name))
+            os.rmdir(temp_dir)
+
+
+def seed_voters(count, constituency='Bench Constituency', prefix='BENCH', batch_size=5000):
+    """
+    Bulk-create synthetic users and voters
+
+    Returns:
+        list of Voter primary keys
+    """
+    from voting.models import Voter
+
+    # Unusable password: hashing would dominate seeding time
+    password = make_password(None)
+    voter_pks = []
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        users = User.objects.bulk_create([
+            User(username=f'{prefix.lower()}_{i}', password=password)
+            for i in range(start, stop)
+        ])
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(
+                username__in=[u.username for u in users]
+            ).order_by('pk'))
+        voters = Voter.objects.bulk_create([
+            Voter(user=user, voter_id=f'{prefix}{i:08d}', constituency=constituency)
+            for i, user in zip(range(start, stop), users)
+        ])
+        if voters and voters[0].pk is None:
+            voters = list(Voter.objects.filter(
+                voter_id__in=[v.voter_id for v in voters]
+            ).order_by('pk'))
+        voter_pks.extend(v.pk for v in voters)
+    return voter_pks
+
+
+def registration_values(i):
+    """Unique field values of the i-th synthetic registration"""
+    return {
+        'username': f'bench_user_{i}',
+        'voter_id_epic': f'BEN{i:07d}',
+        'aadhaar_number': f'{500000000000 + i:012d}',
+        'phone_number': f'{6000000000 + i:010d}',
+    }
+
+
+def seed_registrations(count, batch_size=5000):
+    """Bulk-create synthetic RegisteredUser rows (no document files)"""
+    from voting.models import RegisteredUser
+
+    for start in range(0, count, batch_size):
+        RegisteredUser.objects.bulk_create([
+            RegisteredUser(
+                full_name=f'Bench User {i}', date_of_birth='1990-01-01', gender='other',
+                guardian_name='Bench Guardian', guardian_relation='father', address='Bench Address',
+                constituency='Bench Constituency', **registration_values(i),
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+
+
+def seed_candidate(constituency='Bench Constituency', name='Bench Candidate'):
+    """Create a party and candidate for benchmark ballots"""
+    from voting.models import Candidate, Party
+
+    party, _ = Party.objects.get_or_create(
+        name='Bench Party',
+        defaults={'symbol': 'party_symbols/bench.png'}
+    )
+    return Candidate.objects.create(
+        name=name,
+        party=party,
+        photo='candidate_photos/bench.png',
+        constituency=constituency,
+    )
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class Stopwatch:
+    """Context manager measuring wall-clock time in seconds"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+        return False
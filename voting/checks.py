@@ -0,0 +1,54 @@
+"""
+System checks for settings that only work with more than one worker
+when configured a particular way
+"""
+
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache_problems(setting, alias, purpose, check_id):
+    """
+    An Error (a Warning with DEBUG on, i.e. the single-process runserver)
+    when a cache that must be shared between workers is process-local
+    """
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    level = checks.Warning if settings.DEBUG else checks.Error
+    return [level(
+        f"{setting} uses the process-local cache '{alias}' ({backend.rsplit('.', 1)[-1]}), "
+        f"so {purpose} only reach the worker that made them.",
+        hint="Point it at a cache shared by every worker, such as the 'shared' alias, Redis or Memcached.",
+        id=check_id,
+    )]
+
+
+@checks.register(checks.Tags.caches)
+def check_ballot_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'BALLOT_CACHE', {}).get('GENERATION_ALIAS', 'shared')
+    return shared_cache_problems("BALLOT_CACHE['GENERATION_ALIAS']", alias, 'candidate and party edits', 'voting.E001')
+
+
+@checks.register(checks.Tags.caches)
+def check_embedding_cache(app_configs, **kwargs):
+    config = getattr(settings, 'BIOMETRIC_EMBEDDING_CACHE', {})
+    if not config.get('ENABLED', True):
+        return []
+    return shared_cache_problems(
+        "BIOMETRIC_EMBEDDING_CACHE['CACHE_ALIAS']", config.get('CACHE_ALIAS', 'shared'),
+        'revoked or replaced biometric embeddings', 'voting.E002',
+    )
+
+
+@checks.register(checks.Tags.caches)
+def check_idempotency_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'IDEMPOTENCY', {}).get('CACHE_ALIAS', 'shared')
+    return shared_cache_problems(
+        "IDEMPOTENCY['CACHE_ALIAS']", alias, 'in-flight markers and stored responses', 'voting.E003',
+    )
@@ -0,0 +1,153 @@
+"""
+Read-replica database router
+Views marked with `read_only_view` send their reads to the replicas
+listed in settings.READ_REPLICAS, round-robin, skipping any replica that
+failed its last health check. Everything else - writes, reads inside a
+transaction, sessions and auth - stays on the primary, so read-your-writes
+paths such as submit_vote and verify_otp never see replica lag.
+"""
+
+from contextvars import ContextVar
+from functools import wraps
+import asyncio
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+_read_only = ContextVar('read_only_view', default=False)
+
+
+def _config():
+    return getattr(settings, 'READ_REPLICAS', {})
+
+
+def read_only_view(view_func):
+    """
+    Let a view read from a replica
+
+    Only use on views that tolerate a few seconds of replication lag and
+    do not need to read something the same request just wrote.
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await view_func(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return view_func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def ping(alias):
+    """Health check: open the connection and run a trivial query"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+class ReplicaPool:
+    """
+    Round-robin over replica aliases with health-based fallback
+
+    A replica that fails its check is skipped for RETRY_SECONDS; a healthy
+    one is only re-checked every CHECK_SECONDS, so routing does not add a
+    round-trip to every query.
+    """
+
+    def __init__(self, aliases, check_seconds=5.0, retry_seconds=30.0, check=ping):
+        self.aliases = list(aliases)
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self.check = check
+        self._cycle = itertools.cycle(self.aliases) if self.aliases else None
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._down_until = {}
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(alias, 0) > now:
+                return False
+            if now - self._checked_at.get(alias, float('-inf')) < self.check_seconds:
+                return True
+
+        try:
+            self.check(alias)
+        except Exception as e:
+            with self._lock:
+                self._down_until[alias] = now + self.retry_seconds
+            logger.warning(f"Read replica {alias} failed its health check, using the primary: {str(e)}")
+            return False
+
+        with self._lock:
+            self._checked_at[alias] = now
+            self._down_until.pop(alias, None)
+        return True
+
+    def choose(self):
+        """
+        Next healthy replica alias
+
+        Returns:
+            str or None: None when every replica is down
+        """
+        if self._cycle is None:
+            return None
+        for _ in range(len(self.aliases)):
+            with self._lock:
+                alias = next(self._cycle)
+            if self.healthy(alias):
+                return alias
+        return None
+
+
+class ReadReplicaRouter:
+    """Database router configured by settings.READ_REPLICAS"""
+
+    def __init__(self):
+        config = _config()
+        self.primary = DEFAULT_DB_ALIAS
+        self.pinned_apps = set(config.get('PINNED_APPS', []))
+        self.pool = ReplicaPool(
+            config.get('ALIASES', []),
+            check_seconds=config.get('CHECK_SECONDS', 5.0),
+            retry_seconds=config.get('RETRY_SECONDS', 30.0),
+        )
+
+    def db_for_read(self, model, **hints):
+        if not _read_only.get() or model._meta.app_label in self.pinned_apps:
+            return None
+        if connections[self.primary].in_atomic_block:
+            return None  # Reads inside a transaction must see its writes
+        return self.pool.choose()
+
+    def db_for_write(self, model, **hints):
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {self.primary, *self.pool.aliases}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.pool.aliases:
+            return False  # Replicas receive schema changes through replication
+        return None
@@ -0,0 +1,310 @@
+"""
+Document image pipeline
+Registration uploads (Aadhaar and Voter ID images) arrive as multi-MB PNG
+screenshots, WebP or JPEG. Once the registration commits, each image is
+handed to a per-process worker pool that
+
+    1. validates it (allowed format, pixel limit, decodes cleanly),
+    2. strips metadata and applies the EXIF orientation,
+    3. downscales it to MAX_DIMENSION and recompresses it (WebP by default),
+    4. writes a small thumbnail for admin review,
+
+and records sizes and timings in DocumentProcessingLog. Images that fail
+validation are kept as uploaded and logged as rejected for manual review;
+the same upload is not tried again unless forced.
+
+Results are only stored if the registration still points at the images
+that were processed, so a concurrent run or edit is never overwritten.
+Management commands call drain() before their database goes away; the
+pool is also drained at interpreter exit.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import DocumentProcessingLog, RegisteredUser
+
+logger = logging.getLogger(__name__)
+
+# Image field -> thumbnail field
+DOCUMENT_FIELDS = {
+    'aadhaar_image': 'aadhaar_thumbnail',
+    'voter_id_image': 'voter_id_thumbnail',
+}
+
+
+class InvalidDocument(Exception):
+    """The upload is not an acceptable document image"""
+
+
+def _config():
+    return getattr(settings, 'DOCUMENT_PIPELINE', {})
+
+
+# Output format -> (file extension, encoder options)
+OUTPUT_FORMATS = {
+    'WEBP': ('.webp', {'method': 4}),
+    'JPEG': ('.jpg', {'optimize': True, 'progressive': True}),
+}
+
+
+def _encode(image, quality):
+    output_format = _config().get('FORMAT', 'WEBP')
+    buffer = BytesIO()
+    image.save(buffer, format=output_format, quality=quality, **OUTPUT_FORMATS[output_format][1])
+    return buffer.getvalue()
+
+
+def process_image(data):
+    """
+    Validate and re-encode one document image
+
+    Args:
+        data: bytes of the uploaded file
+
+    Returns:
+        tuple: (processed image bytes, thumbnail bytes, info dict)
+
+    Raises:
+        InvalidDocument: unsupported format, too many pixels or corrupt data
+    """
+    config = _config()
+    allowed = config.get('ALLOWED_FORMATS', ('JPEG', 'PNG', 'WEBP'))
+    max_pixels = config.get('MAX_PIXELS', 40000000)
+
+    try:
+        with Image.open(BytesIO(data)) as probe:
+            image_format = probe.format
+            width, height = probe.size
+            if image_format not in allowed:
+                raise InvalidDocument(f"Unsupported image format {image_format}")
+            if width * height > max_pixels:
+                raise InvalidDocument(f"Image too large ({width}x{height})")
+            probe.verify()
+
+        # verify() leaves the image unusable; decode again for real
+        with Image.open(BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            max_dimension = config.get('MAX_DIMENSION', 1280)
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            # A fresh encode carries no EXIF, ICC or text chunks from the upload
+            processed = _encode(image, config.get('QUALITY', 75))
+
+            thumbnail_dimension = config.get('THUMBNAIL_DIMENSION', 240)
+            preview = image.copy()
+            preview.thumbnail((thumbnail_dimension, thumbnail_dimension), Image.LANCZOS)
+            thumbnail = _encode(preview, config.get('THUMBNAIL_QUALITY', 70))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidDocument(f"Unreadable image: {str(e)}")
+
+    return processed, thumbnail, {
+        'format': image_format,
+        'original_size': f'{width}x{height}',
+        'processed_size': f'{image.width}x{image.height}',
+    }
+
+
+def _process_field(registration, field):
+    image_field = getattr(registration, field)
+    log = DocumentProcessingLog(registration=registration, field=field, image_name=image_field.name)
+    started = time.perf_counter()
+    try:
+        with image_field.open('rb') as upload:
+            data = upload.read()
+        log.original_bytes = len(data)
+        processed, thumbnail, info = process_image(data)
+    except InvalidDocument as e:
+        log.status = 'rejected'
+        log.error = str(e)
+        logger.warning(f"Rejected {field} of registration {registration.pk}: {str(e)}")
+        return None, log
+    except Exception as e:
+        log.status = 'failed'
+        log.error = str(e)
+        logger.error(f"Processing {field} of registration {registration.pk} failed: {str(e)}")
+        return None, log
+    finally:
+        log.duration_ms = (time.perf_counter() - started) * 1000
+
+    stem = os.path.splitext(os.path.basename(image_field.name))[0]
+    extension = OUTPUT_FORMATS[_config().get('FORMAT', 'WEBP')][0]
+    storage = image_field.storage
+    directory = os.path.dirname(image_field.name)
+    processed_name = storage.save(f'{directory}/{stem}{extension}', ContentFile(processed))
+    thumbnail_field = DOCUMENT_FIELDS[field]
+    upload_to = registration._meta.get_field(thumbnail_field).upload_to
+    thumbnail_name = storage.save(f'{upload_to}{stem}{extension}', ContentFile(thumbnail))
+
+    log.status = 'processed'
+    log.original_format = info['format']
+    log.original_size = info['original_size']
+    log.processed_size = info['processed_size']
+    log.processed_bytes = len(processed)
+    log.thumbnail_bytes = len(thumbnail)
+    log.duration_ms = (time.perf_counter() - started) * 1000
+    return {field: processed_name, thumbnail_field: thumbnail_name}, log
+
+
+def _rejected(field):
+    """Whether the registration's current image in `field` was already rejected"""
+    return Exists(DocumentProcessingLog.objects.filter(
+        registration=OuterRef('pk'), field=field, status='rejected', image_name=OuterRef(field)))
+
+
+def process_registration_documents(registration_id, force=False):
+    """
+    Run the pipeline over both document images of a registration
+
+    Args:
+        registration_id: RegisteredUser primary key
+        force: also reprocess images that already have a thumbnail
+
+    Returns:
+        list of DocumentProcessingLog rows written
+    """
+    try:
+        # Read with the registration: was each current image already rejected?
+        registration = RegisteredUser.objects.annotate(**{
+            f'{field}_rejected': _rejected(field) for field in DOCUMENT_FIELDS
+        }).get(pk=registration_id)
+    except RegisteredUser.DoesNotExist:
+        return []
+
+    updates = {}
+    logs = []
+    replaced = []
+    for field, thumbnail_field in DOCUMENT_FIELDS.items():
+        if not getattr(registration, field) or (getattr(registration, thumbnail_field) and not force):
+            continue
+        if getattr(registration, f'{field}_rejected') and not force:
+            continue
+        names, log = _process_field(registration, field)
+        logs.append(log)
+        if names:
+            updates.update(names)
+            replaced.append(getattr(registration, field))
+            if getattr(registration, thumbnail_field):
+                replaced.append(getattr(registration, thumbnail_field))
+
+    # update() rather than save(): no signals, no rewrite of unrelated fields
+    with transaction.atomic():
+        stored = True
+        if updates:
+            # Only over the images this run read; a concurrent run or edit wins otherwise
+            current = {name: getattr(registration, name).name for name in updates}
+            stored = RegisteredUser.objects.filter(pk=registration_id, **current).update(**updates) == 1
+        if stored:
+            DocumentProcessingLog.objects.bulk_create(logs)
+
+    if not stored:
+        for field, name in updates.items():
+            getattr(registration, field).storage.delete(name)
+        logger.warning(f"Documents of registration {registration_id} changed while processing; results discarded")
+        return []
+
+    # Old files go only once the row points at the new ones
+    for original in replaced:
+        original.storage.delete(original.name)
+
+    if logs:
+        before = sum(log.original_bytes for log in logs)
+        after = sum(log.processed_bytes or log.original_bytes for log in logs)
+        logger.info(f"Processed documents of registration {registration_id}: {before} -> {after} bytes")
+    return logs
+
+
+def pending_registrations():
+    """Registrations with an image that has no thumbnail and was not rejected as uploaded"""
+    condition = Q()
+    for field, thumbnail_field in DOCUMENT_FIELDS.items():
+        condition |= Q(**{thumbnail_field: ''}) & ~Q(**{field: ''}) & ~_rejected(field)
+    return RegisteredUser.objects.filter(condition)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    """Per-process worker pool for document processing"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_config().get('WORKERS', 2),
+                thread_name_prefix='document-pipeline',
+            )
+        return _executor
+
+
+def drain(timeout=None):
+    """
+    Wait for every scheduled job to finish
+
+    Returns:
+        bool: False if jobs were still running when the timeout expired
+    """
+    with _executor_lock:
+        futures = list(_pending)
+    return not wait(futures, timeout).not_done
+
+
+@atexit.register
+def shutdown():
+    """Finish outstanding jobs and stop the pool (a later schedule() starts a new one)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _submit(registration_id):
+    future = get_executor().submit(_run, registration_id)
+    with _executor_lock:
+        _pending.add(future)
+    future.add_done_callback(_finished)
+
+
+def _finished(future):
+    with _executor_lock:
+        _pending.discard(future)
+
+
+def _run(registration_id):
+    try:
+        process_registration_documents(registration_id)
+    except Exception as e:
+        logger.error(f"Document pipeline failed for registration {registration_id}: {str(e)}")
+    finally:
+        connection.close()
+
+
+def schedule(registration_id):
+    """Process a registration's documents after the current transaction commits"""
+    if not _config().get('ENABLED', True):
+        return
+    if _config().get('ASYNC', True):
+        transaction.on_commit(lambda: _submit(registration_id))
+    else:
+        transaction.on_commit(lambda: process_registration_documents(registration_id))
@@ -0,0 +1,286 @@
+"""
+Fuzzy duplicate registration detection
+The unique constraints on RegisteredUser catch the same EPIC, Aadhaar or
+phone number twice, not the same person registering again with a typo in
+their name. Comparing every pair of registrations is O(n^2); instead each
+registration gets a blocking key per pass and only registrations sharing
+a key are compared:
+
+    - name_dob: phonetic name + date of birth
+    - dob_guardian: date of birth + phonetic guardian name
+    - name_guardian: phonetic name + phonetic guardian name
+
+A typo in any one of the three still leaves the pair together in one
+pass. Keys are hashed to 64-bit integers and grouped by sorting, blocks
+are compared in worker processes (see the detect_duplicates command), and
+blocks too large to compare pairwise (common names) are compared within a
+sliding window over their sorted names, so the work stays near-linear.
+Pairs scoring at least MIN_SCORE are stored as DuplicateSuspect rows for
+review in the admin.
+"""
+
+from hashlib import blake2b
+from itertools import combinations
+import logging
+import re
+
+from django.conf import settings
+from django.db import transaction
+import numpy as np
+
+from .models import DuplicateSuspect, RegisteredUser
+
+logger = logging.getLogger(__name__)
+
+PASSES = ('name_dob', 'dob_guardian', 'name_guardian')
+
+# Fields read for keys and scoring
+RECORD_FIELDS = ('pk', 'full_name', 'date_of_birth', 'guardian_name')
+
+# Primary keys per IN list; SQLite allows 999 parameters per query
+READ_BATCH_SIZE = 900
+
+# Transliteration variants of the same sound, applied in order
+PHONETIC_RULES = [
+    (re.compile(pattern), replacement) for pattern, replacement in [
+        (r'EE|IE|EA', 'I'), (r'OO|OU', 'U'), (r'AI|AY|EY', 'E'), (r'AU|AW', 'O'),
+        (r'PH|F', 'P'), (r'([BDGJKT])H', r'\1'), (r'SH|SS|X', 'S'), (r'CH|CK|C|Q', 'K'),
+        (r'Z', 'J'), (r'W', 'V'), (r'Y', 'I'),
+    ]
+]
+VOWELS_AND_H = re.compile(r'(?<!^)[AEIOUH]')
+REPEATS = re.compile(r'(.)\1+')
+WORD = re.compile(r'[A-Z]+')
+
+
+def _config():
+    return getattr(settings, 'DUPLICATE_DETECTION', {})
+
+
+def normalize_name(name):
+    """Upper-case words in a stable order (so "Rao Asha" matches "Asha Rao")"""
+    return ' '.join(sorted(WORD.findall((name or '').upper())))
+
+
+def phonetic(word):
+    """
+    Sound-alike code of one word, tuned for Indian names in Latin script
+
+    Kumar, Kumaar and Coomar all become KMR; Sharma and Sarma become SRM.
+    """
+    for pattern, replacement in PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    return REPEATS.sub(r'\1', VOWELS_AND_H.sub('', word))
+
+
+def phonetic_name(name):
+    """Sorted phonetic codes of a name's words; initials are dropped"""
+    return ' '.join(sorted(phonetic(word) for word in WORD.findall((name or '').upper()) if len(word) > 1))
+
+
+def blocking_keys(full_name, date_of_birth, guardian_name):
+    """One key per pass (PASSES order); None where a part is missing"""
+    name, guardian = phonetic_name(full_name), phonetic_name(guardian_name)
+    dob = date_of_birth.isoformat() if date_of_birth else ''
+    parts = {'name_dob': (name, dob), 'dob_guardian': (dob, guardian), 'name_guardian': (name, guardian)}
+    return [f'{first}|{second}' if first and second else None for first, second in (parts[p] for p in PASSES)]
+
+
+def key_hash(key):
+    """Non-zero 64-bit hash of a blocking key; 0 stands for no key"""
+    if key is None:
+        return 0
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'little', signed=True) or 1
+
+
+def jaro_winkler(first, second):
+    if first == second:
+        return 1.0
+    if not first or not second:
+        return 0.0
+    window = max(0, max(len(first), len(second)) // 2 - 1)
+    first_matched = [False] * len(first)
+    second_matched = [False] * len(second)
+    matches = 0
+    for i, character in enumerate(first):
+        for j in range(max(0, i - window), min(len(second), i + window + 1)):
+            if not second_matched[j] and second[j] == character:
+                first_matched[i] = second_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    first_chars = [c for c, matched in zip(first, first_matched) if matched]
+    second_chars = [c for c, matched in zip(second, second_matched) if matched]
+    transpositions = sum(a != b for a, b in zip(first_chars, second_chars)) / 2
+    jaro = (matches / len(first) + matches / len(second) + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for a, b in zip(first[:4], second[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def dob_similarity(first, second):
+    """1 for the same date, 0.5 for a likely typo (one digit wrong, or day and month swapped), else 0"""
+    if first == second:
+        return 1.0
+    if not first or not second:
+        return 0.0
+    if (first.day, first.month, first.year) == (second.month, second.day, second.year):
+        return 0.5
+    return 0.5 if sum(a != b for a, b in zip(first.isoformat(), second.isoformat())) == 1 else 0.0
+
+
+def score_pair(first, second, weights, min_score=0.0):
+    """
+    Weighted similarity of two records (pk, full_name, date_of_birth, guardian_name)
+
+    Names must already be normalize_name()d. The cheap parts are scored
+    first and scoring stops as soon as the pair cannot reach min_score.
+
+    Returns:
+        tuple: (score, name similarity, guardian similarity, dob similarity),
+        or None below min_score
+    """
+    dob = dob_similarity(first[2], second[2])
+    if weights['name'] + weights['guardian'] + weights['dob'] * dob < min_score:
+        return None
+    name = jaro_winkler(first[1], second[1])
+    if weights['name'] * name + weights['guardian'] + weights['dob'] * dob < min_score:
+        return None
+    guardian = jaro_winkler(first[3], second[3])
+    score = weights['name'] * name + weights['guardian'] * guardian + weights['dob'] * dob
+    if score < min_score:
+        return None
+    return round(score, 4), round(name, 4), round(guardian, 4), dob
+
+
+def compute_keys(low, high, chunk_size=20000):
+    """
+    Hashed blocking keys of registrations with low <= pk < high
+
+    Returns:
+        tuple: (pks as int64 array, hashes as an int64 array with a column per pass)
+    """
+    pks, hashes = [], []
+    rows = (
+        RegisteredUser.objects.filter(pk__gte=low, pk__lt=high)
+        .values_list(*RECORD_FIELDS).iterator(chunk_size=chunk_size)
+    )
+    for pk, full_name, date_of_birth, guardian_name in rows:
+        pks.append(pk)
+        hashes.append([key_hash(key) for key in blocking_keys(full_name, date_of_birth, guardian_name)])
+    return np.array(pks, dtype=np.int64), np.array(hashes, dtype=np.int64).reshape(-1, len(PASSES))
+
+
+def find_blocks(pks, hashes):
+    """
+    Groups of two or more registrations sharing a key
+
+    Returns:
+        list of (pass index, list of pks)
+    """
+    blocks = []
+    for index in range(len(PASSES)):
+        column = hashes[:, index]
+        keyed = column != 0
+        order = np.argsort(column[keyed], kind='stable')
+        keys, members = column[keyed][order], pks[keyed][order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            blocks.append((index, members[start:start + size].tolist()))
+    return blocks
+
+
+def batch_blocks(blocks, task_size):
+    """Split blocks into tasks of about `task_size` registrations"""
+    task, size = [], 0
+    for block in blocks:
+        task.append(block)
+        size += len(block[1])
+        if size >= task_size:
+            yield task
+            task, size = [], 0
+    if task:
+        yield task
+
+
+def _pairs(records, max_block_size, window):
+    if len(records) <= max_block_size:
+        return combinations(records, 2)
+    # Too many for every pair: compare neighbours in name order
+    ordered = sorted(records, key=lambda record: record[1])
+    return ((ordered[i], ordered[j]) for i in range(len(ordered)) for j in range(i + 1, min(i + 1 + window, len(ordered))))
+
+
+def compare_blocks(blocks):
+    """
+    Score the pairs within each block (a few database reads for the whole task)
+
+    Returns:
+        list of (registration pk, similar_to pk, pass, score, name, guardian, dob),
+        the newer registration first
+    """
+    config = _config()
+    min_score = config.get('MIN_SCORE', 0.9)
+    weights = config.get('WEIGHTS', {'name': 0.6, 'guardian': 0.25, 'dob': 0.15})
+    max_block_size = config.get('MAX_BLOCK_SIZE', 200)
+    window = config.get('WINDOW', 20)
+
+    records, keys = {}, {}
+    pks = sorted({pk for index, members in blocks for pk in members})
+    for start in range(0, len(pks), READ_BATCH_SIZE):
+        rows = RegisteredUser.objects.filter(pk__in=pks[start:start + READ_BATCH_SIZE]).values_list(*RECORD_FIELDS)
+        for pk, full_name, date_of_birth, guardian_name in rows:
+            records[pk] = (pk, normalize_name(full_name), date_of_birth, normalize_name(guardian_name))
+            keys[pk] = blocking_keys(*records[pk][1:])
+
+    suspects = []
+    for index, members in blocks:
+        block = [records[pk] for pk in members if pk in records]
+        for first, second in _pairs(block, max_block_size, window):
+            # Hash collisions put unrelated keys in one block
+            if keys[first[0]][index] != keys[second[0]][index]:
+                continue
+            scores = score_pair(first, second, weights, min_score)
+            if scores is not None:
+                older, newer = sorted((first[0], second[0]))
+                suspects.append((newer, older, PASSES[index], *scores))
+    return suspects
+
+
+def save_suspects(suspects, detected_at, batch_size=1000):
+    """
+    Store the best-scoring result per pair; pairs already reviewed keep their status
+
+    Returns:
+        int: pairs stored
+    """
+    best = {}
+    for suspect in suspects:
+        pair = suspect[:2]
+        if pair not in best or suspect[3] > best[pair][3]:
+            best[pair] = suspect
+    rows = [
+        DuplicateSuspect(
+            registration_id=registration_id, similar_to_id=similar_to_id, blocking_pass=blocking_pass,
+            score=score, name_similarity=name, guardian_similarity=guardian, dob_similarity=dob,
+            detected_at=detected_at,
+        )
+        for registration_id, similar_to_id, blocking_pass, score, name, guardian, dob in best.values()
+    ]
+    with transaction.atomic():
+        DuplicateSuspect.objects.bulk_create(
+            rows, batch_size=batch_size, update_conflicts=True,
+            unique_fields=['registration', 'similar_to'],
+            update_fields=['blocking_pass', 'score', 'name_similarity', 'guardian_similarity',
+                           'dob_similarity', 'detected_at'],
+        )
+        # Pending pairs this run no longer finds (corrected or deleted registrations)
+        stale = DuplicateSuspect.objects.filter(status='pending', detected_at__lt=detected_at).delete()[0]
+    if stale:
+        logger.info(f"Removed {stale} duplicate suspects that no longer match")
+    return len(rows)
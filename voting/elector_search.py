@@ -0,0 +1,453 @@
+"""
+Elector search
+Finds voters by name, EPIC number or constituency: prefixes ("ASHA R"
+finds "Asha Rao", "ABC12" finds EPIC ABC1234567) and misspelled names
+("Ravi Kumaar" finds "Ravi Kumar").
+
+EPIC-shaped queries (one word with a digit) are prefix lookups on the
+unique voter_id index; the exact number ranks first. Everything else is
+matched against names and constituencies by trigrams, as in PostgreSQL's
+pg_trgm: every word is padded ("  kumar ") and cut into three-letter
+grams, and two strings are as similar as the share of grams they have in
+common. A result's score is its best similarity plus 1 for a word-prefix
+match, so prefix matches come first.
+
+    - On PostgreSQL the query runs in the database against the GIN
+      trigram indexes created by migration 0012.
+    - Elsewhere (SQLite) a per-process inverted index from trigram to
+      voter ids answers it; only the page of results is read from the
+      database. The index is warmed in the background and picks up new
+      voters by primary key before each search.
+
+Results are ordered by score, then EPIC number, and paginated with a
+keyset cursor, so later pages cost the same as the first.
+"""
+
+from array import array
+import base64
+import binascii
+import bisect
+from functools import lru_cache
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, FloatField, Func, Lookup, Q, Value, When
+from django.db.models.functions import Greatest, Round, Upper
+import numpy as np
+
+from .models import Voter
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r'[A-Z0-9]+')
+
+# Voter fields returned, in the order of the index's stored tuples
+SEARCH_FIELDS = ('voter_id', 'full_name', 'constituency')
+
+# Fields matched by trigrams
+TEXT_FIELDS = ('full_name', 'constituency')
+
+
+def _config():
+    return getattr(settings, 'ELECTOR_SEARCH', {})
+
+
+def normalize(text):
+    """Upper-case words separated by single spaces; punctuation is dropped"""
+    return ' '.join(WORD.findall((text or '').upper()))
+
+
+def is_epic_query(query):
+    """EPIC numbers are one word with digits; names and constituencies have none"""
+    return bool(query) and ' ' not in query and any(character.isdigit() for character in query)
+
+
+@lru_cache(maxsize=65536)
+def trigrams(text):
+    """Trigram set of a string, padded per word like pg_trgm"""
+    grams = set()
+    for word in WORD.findall((text or '').upper()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def prefix_trigrams(text):
+    """Trigrams of `text` that every value starting with it also has (no trailing pad on the last word)"""
+    words = WORD.findall((text or '').upper())
+    grams = set(trigrams(' '.join(words[:-1])))
+    if words:
+        padded = f'  {words[-1]}'
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(query_grams, text):
+    grams = trigrams(text)
+    if not grams or not query_grams:
+        return 0.0
+    shared = len(query_grams & grams)
+    return shared / (len(query_grams) + len(grams) - shared)
+
+
+def is_prefix_match(query, *values):
+    """Whether any of the values has a word sequence starting with the query"""
+    return any(f' {normalize(value)}'.find(f' {query}') >= 0 for value in values)
+
+
+def encode_cursor(score, voter_id):
+    return base64.urlsafe_b64encode(json.dumps([score, voter_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(score, voter_id) of the last result on the previous page"""
+    try:
+        score, voter_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), str(voter_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError('Invalid cursor')
+
+
+def _after(voters, after):
+    if after is None:
+        return voters
+    return voters.filter(Q(score__lt=after[0]) | Q(score=after[0], voter_id__gt=after[1]))
+
+
+def _rows(voters, limit):
+    return [
+        (float(row[0]), row[1], row[2], row[3])
+        for row in voters.order_by(F('score').desc(), 'voter_id').values_list('score', *SEARCH_FIELDS)[:limit + 1]
+    ]
+
+
+def search_epic(query, constituency=None, limit=20, after=None):
+    """
+    EPIC numbers starting with the query (one indexed query, any database)
+
+    Returns:
+        list of (score, voter_id, full_name, constituency), at most `limit` + 1;
+        2.0 for the exact number, 1.0 for longer ones
+    """
+    if connection.vendor == 'postgresql':
+        # Range scans follow the column collation there; LIKE uses the
+        # varchar_pattern_ops index Django creates for unique CharFields
+        voters = Voter.objects.filter(voter_id__startswith=query)
+    else:
+        voters = Voter.objects.filter(voter_id__gte=query, voter_id__lt=query + '\U0010ffff')
+    if constituency:
+        voters = voters.filter(constituency__iexact=constituency)
+    voters = voters.annotate(score=Case(
+        When(voter_id=query, then=Value(2.0)), default=Value(1.0), output_field=FloatField(),
+    ))
+    return _rows(_after(voters, after), limit)
+
+
+class TrigramSimilarity(Func):
+    """pg_trgm similarity(); PostgreSQL only"""
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+class TrigramMatch(Lookup):
+    """
+    `lhs % rhs`: similarity above pg_trgm.similarity_threshold, answered
+    from the GIN index. Used as an expression rather than registered on
+    CharField, so it is not offered for every text column in the project.
+    """
+    lookup_name = 'trigram_match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} %% {rhs}', lhs_params + rhs_params
+
+
+def search_database(query, constituency=None, limit=20, after=None, fuzzy=True):
+    """
+    Search names and constituencies with one query (trigram indexes on PostgreSQL)
+
+    With fuzzy=False only prefix matches are returned; that form runs on
+    any database and serves while the in-process index is warming.
+
+    Returns:
+        list of (score, voter_id, full_name, constituency), at most `limit` + 1
+    """
+    prefix = Q()
+    for field in TEXT_FIELDS:
+        prefix |= Q(**{f'{field}__istartswith': query}) | Q(**{f'{field}__icontains': f' {query}'})
+    score = Case(When(prefix, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    condition = prefix
+    if fuzzy:
+        score = score + Greatest(*[
+            TrigramSimilarity(Upper(field), Value(query), output_field=FloatField()) for field in TEXT_FIELDS
+        ])
+        for field in TEXT_FIELDS:
+            condition |= Q(TrigramMatch(F(f'upper_{field}'), query))
+
+    # The aliases are the expressions the trigram indexes were built on
+    voters = Voter.objects.alias(**{f'upper_{field}': Upper(field) for field in TEXT_FIELDS}).filter(condition)
+    if constituency:
+        voters = voters.filter(constituency__iexact=constituency)
+    voters = voters.annotate(score=Round(score, 4, output_field=FloatField()))
+    return _rows(_after(voters, after), limit)
+
+
+class ElectorIndex:
+    """In-process inverted index from name and constituency trigrams to voter primary keys"""
+
+    def __init__(self):
+        self.voters = {}  # pk -> (voter_id, full_name, constituency)
+        # Per text field: trigram -> sorted array of pks, and trigram count by pk
+        self.postings = tuple({} for _ in TEXT_FIELDS)
+        self.lengths = tuple(array('H') for _ in TEXT_FIELDS)
+        self.max_pk = 0
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def add(self, pk, voter_id, full_name, constituency):
+        values = (voter_id, full_name or '', constituency or '')
+        with self._lock:
+            previous = self.voters.get(pk)
+            self.voters[pk] = values
+            for field, (postings, lengths) in enumerate(zip(self.postings, self.lengths), 1):
+                grams = trigrams(values[field])
+                known = trigrams(previous[field]) if previous else frozenset()
+                for gram in known - grams:
+                    pks = postings[gram]
+                    del pks[bisect.bisect_left(pks, pk)]
+                for gram in grams - known:
+                    pks = postings.get(gram)
+                    if pks is None:
+                        pks = postings[gram] = array('q')
+                    if not pks or pks[-1] < pk:
+                        pks.append(pk)
+                    else:
+                        # Re-added rows: keep the list sorted for binary search
+                        position = bisect.bisect_left(pks, pk)
+                        if position == len(pks) or pks[position] != pk:
+                            pks.insert(position, pk)
+                if len(lengths) <= pk:
+                    lengths.extend(bytes(2 * (pk + 1 - len(lengths))))
+                lengths[pk] = min(len(grams), 0xFFFF)
+
+    def remove(self, pk):
+        # Postings are left behind; candidates without values are skipped
+        with self._lock:
+            self.voters.pop(pk, None)
+
+    def catch_up(self, chunk_size=10000):
+        """Index voters inserted since the last call (bulk inserts send no signals)"""
+        rows = 0
+        queryset = Voter.objects.filter(pk__gt=self.max_pk).order_by('pk').values_list('pk', *SEARCH_FIELDS)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            self.add(*row)
+            # Only catch_up moves max_pk: a row saved by this process may
+            # have a higher pk than rows other processes have inserted
+            self.max_pk = row[0]
+            rows += 1
+        return rows
+
+    def warm(self, chunk_size=10000):
+        rows = self.catch_up(chunk_size)
+        self.ready = True
+        logger.info(f"Elector index warmed with {rows} voters "
+                    f"({sum(len(postings) for postings in self.postings)} trigrams)")
+        return rows
+
+    @staticmethod
+    def _array(pks):
+        return np.frombuffer(pks, dtype=np.int64) if pks else np.empty(0, dtype=np.int64)
+
+    def candidates(self, query, min_similarity):
+        """
+        Voters whose name or constituency may match, scored without leaving numpy
+
+        Each field's shared-gram counts come from adding up the query's
+        posting lists in one array indexed by pk, which gives the exact
+        similarity of every voter at once. Having every prefix gram is
+        necessary for a word-prefix match but not sufficient, so `prefix`
+        still has to be confirmed.
+
+        Returns:
+            (pks, similarities, prefix flags) as lists, best first
+        """
+        query_grams = trigrams(query)
+        prefix_grams = prefix_trigrams(query)
+        if not query_grams:
+            return [], [], []
+        needed = math.ceil(min_similarity * len(query_grams))
+
+        counts = []
+        matched = np.zeros(len(self.lengths[0]), dtype=bool)
+        for postings in self.postings:
+            shared = np.zeros(len(matched), dtype=np.uint16)
+            for gram in query_grams:
+                shared[self._array(postings.get(gram))] += 1
+            prefix = np.zeros(len(matched), dtype=np.uint16)
+            for gram in prefix_grams:
+                prefix[self._array(postings.get(gram))] += 1
+            prefix = prefix == len(prefix_grams)
+            matched |= prefix | (shared >= max(needed, 1))
+            counts.append((shared, prefix))
+        pks = np.flatnonzero(matched)
+
+        best = np.zeros(len(pks))
+        prefix = np.zeros(len(pks), dtype=bool)
+        for (shared, field_prefix), lengths in zip(counts, self.lengths):
+            shared = shared[pks].astype(np.float64)
+            total = len(query_grams) + np.frombuffer(lengths, dtype=np.uint16)[pks] - shared
+            best = np.maximum(best, shared / np.maximum(total, 1))
+            prefix |= field_prefix[pks]
+
+        keep = prefix | (best >= min_similarity)
+        pks, best, prefix = pks[keep], best[keep].round(4), prefix[keep]
+        order = np.argsort(-(best + prefix), kind='stable')
+        return pks[order].tolist(), best[order].tolist(), prefix[order].tolist()
+
+    def rank(self, query, constituency=None, limit=20, after=None, min_similarity=0.3):
+        """
+        Best matches from memory alone
+
+        Candidates come best first, so only as many are confirmed as it
+        takes to fill the page.
+
+        Returns:
+            list of (score, voter_id, pk), at most `limit` + 1
+        """
+        constituency = normalize(constituency) if constituency else None
+        results = []
+        page_scores = []  # Min-heap of the best limit + 1 scores so far
+        with self._lock:
+            for pk, best, prefix in zip(*self.candidates(query, min_similarity)):
+                if len(page_scores) > limit and best + prefix < page_scores[0]:
+                    break
+                values = self.voters.get(pk)
+                if values is None or (constituency and normalize(values[2]) != constituency):
+                    continue
+                if prefix and not is_prefix_match(query, *values[1:]):
+                    prefix = False
+                    if best < min_similarity:
+                        continue
+                score = best + (1.0 if prefix else 0.0)
+                if after is not None and (score > after[0] or (score == after[0] and values[0] <= after[1])):
+                    continue
+                results.append((-score, values[0], pk))
+                if len(page_scores) <= limit:
+                    heapq.heappush(page_scores, score)
+                else:
+                    heapq.heappushpop(page_scores, score)
+        return [(-score, voter_id, pk) for score, voter_id, pk in heapq.nsmallest(limit + 1, results)]
+
+    def search(self, query, constituency=None, limit=20, after=None, min_similarity=0.3):
+        """
+        Same contract as search_database(), answered from memory
+
+        Returns:
+            list of (score, voter_id, full_name, constituency), at most `limit` + 1
+        """
+        page = self.rank(query, constituency, limit, after, min_similarity)
+        # Names and constituencies come from the database, not the index
+        current = {
+            row[0]: row[1:] for row in
+            Voter.objects.filter(pk__in=[pk for score, voter_id, pk in page]).values_list('pk', *SEARCH_FIELDS)
+        }
+        return [(score, *current[pk]) for score, voter_id, pk in page if pk in current]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Per-process index; the first call starts warming it"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            config = _config()
+            _index = ElectorIndex()
+            chunk_size = config.get('WARM_CHUNK_SIZE', 10000)
+            if config.get('WARM_IN_BACKGROUND', True):
+                threading.Thread(
+                    target=_warm, args=(_index, chunk_size), name='elector-index-warm', daemon=True,
+                ).start()
+            else:
+                _index.warm(chunk_size)
+        return _index
+
+
+def _warm(index, chunk_size):
+    try:
+        index.warm(chunk_size)
+    except Exception as e:
+        logger.error(f"Elector index warm-up failed: {str(e)}")
+    finally:
+        connection.close()
+
+
+def index_voter(instance):
+    """Keep this process's index current after a save (voting.signals)"""
+    if _index is not None:
+        _index.add(instance.pk, instance.voter_id, instance.full_name, instance.constituency)
+
+
+def unindex_voter(instance):
+    if _index is not None:
+        _index.remove(instance.pk)
+
+
+def use_database():
+    backend = _config().get('BACKEND', 'auto')
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'trigram'
+
+
+def search(query, constituency=None, limit=20, cursor=None):
+    """
+    Search the electoral roll
+
+    Args:
+        query: name, EPIC number or constituency (or the start of one)
+        constituency: only return voters of this constituency (optional)
+        limit: page size
+        cursor: next_cursor of the previous page (optional)
+
+    Returns:
+        dict: results (list of dicts with voter_id, full_name, constituency
+        and score) and next_cursor (None on the last page)
+
+    Raises:
+        ValueError: the cursor is malformed
+    """
+    query = normalize(query)
+    after = decode_cursor(cursor) if cursor else None
+    min_similarity = _config().get('MIN_SIMILARITY', 0.3)
+
+    if is_epic_query(query):
+        rows = search_epic(query, constituency, limit, after)
+    elif use_database():
+        rows = search_database(query, constituency, limit, after)
+    else:
+        index = get_index()
+        if index.ready:
+            index.catch_up()
+            rows = index.search(query, constituency, limit, after, min_similarity)
+        else:
+            # Prefix matches only until the index is warm
+            rows = search_database(query, constituency, limit, after, fuzzy=False)
+
+    page = rows[:limit]
+    return {
+        'results': [
+            {'voter_id': voter_id, 'full_name': full_name, 'constituency': voter_constituency, 'score': score}
+            for score, voter_id, full_name, voter_constituency in page
+        ],
+        'next_cursor': encode_cursor(page[-1][0], page[-1][1]) if len(rows) > limit else None,
+    }
@@ -0,0 +1,380 @@
+"""
+Electoral roll import
+Streams a CSV or JSONL roll in fixed-size batches so memory stays flat no
+matter how large the file is. Rows are validated in worker processes
+(parse_batch is pure Python and needs no database) and valid rows are
+inserted a batch at a time: User, Voter and, optionally, RegisteredUser
+rows with bulk_create, or with COPY on PostgreSQL.
+
+Accounts created here have unusable passwords; voters sign in with OTP.
+"""
+
+import csv
+from datetime import date, datetime
+import io
+import itertools
+import json
+import logging
+import re
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Accepted column names -> field
+COLUMN_ALIASES = {
+    'voter_id': 'voter_id', 'epic': 'voter_id', 'epic_no': 'voter_id', 'voter_id_epic': 'voter_id',
+    'full_name': 'full_name', 'name': 'full_name',
+    'constituency': 'constituency', 'ac_name': 'constituency',
+    'phone_number': 'phone_number', 'phone': 'phone_number', 'mobile': 'phone_number',
+    'date_of_birth': 'date_of_birth', 'dob': 'date_of_birth',
+    'gender': 'gender',
+    'guardian_name': 'guardian_name', 'relative_name': 'guardian_name',
+    'guardian_relation': 'guardian_relation', 'relation_type': 'guardian_relation',
+    'aadhaar_number': 'aadhaar_number', 'aadhaar': 'aadhaar_number',
+    'address': 'address',
+    'email': 'email',
+}
+
+# Extra fields a row needs when registrations are imported too
+REGISTRATION_FIELDS = ('date_of_birth', 'gender', 'guardian_name', 'guardian_relation', 'aadhaar_number', 'address')
+
+# Column limits of the fields rows are written to, so one long value rejects its row, not the batch
+MAX_LENGTHS = {'full_name': 200, 'constituency': 200, 'guardian_name': 200, 'email': 254}
+
+VOTER_ID_PATTERN = re.compile(r'^[A-Z0-9]{6,20}$')
+GENDERS = {'male': 'male', 'm': 'male', 'female': 'female', 'f': 'female', 'other': 'other', 'o': 'other', 't': 'other'}
+RELATIONS = {'father': 'father', 'f': 'father', 'mother': 'mother', 'm': 'mother', 'husband': 'husband', 'h': 'husband'}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+
+def read_rows(path, file_format=None):
+    """
+    Yield (line number, dict) pairs from a CSV or JSONL roll
+
+    Malformed JSON lines are yielded with a None row so they can be rejected.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as roll:
+        if file_format == 'csv':
+            reader = csv.DictReader(roll)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(roll, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+
+
+def user_names(full_name):
+    """First and last name for an imported User, cut to the auth_user columns"""
+    from .provisioning import split_name
+
+    first_name, last_name = split_name(full_name)
+    return first_name[:150], last_name[:150]
+
+
+def batches(rows, size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date_of_birth {value!r}")
+
+
+def clean_row(raw, registrations=False):
+    """
+    Normalize and validate one roll entry
+
+    Returns:
+        dict of clean field values
+
+    Raises:
+        ValueError: with the reason the row is rejected
+    """
+    if raw is None:
+        raise ValueError('malformed line')
+    row = {}
+    for column, value in raw.items():
+        field = COLUMN_ALIASES.get(str(column).strip().lower())
+        if field and value is not None:
+            row[field] = str(value).strip()
+
+    voter_id = row.get('voter_id', '').upper()
+    if not VOTER_ID_PATTERN.match(voter_id):
+        raise ValueError(f"invalid voter_id {row.get('voter_id', '')!r}")
+    row['voter_id'] = voter_id
+    if not row.get('full_name'):
+        raise ValueError('missing full_name')
+    if not row.get('constituency'):
+        raise ValueError('missing constituency')
+    for field, max_length in MAX_LENGTHS.items():
+        if len(row.get(field, '')) > max_length:
+            raise ValueError(f"{field} longer than {max_length} characters")
+    if row.get('email'):
+        try:
+            validate_email(row['email'])
+        except ValidationError:
+            raise ValueError(f"invalid email {row['email']!r}")
+
+    phone = re.sub(r'\D', '', row.get('phone_number', ''))[-10:]
+    if row.get('phone_number') and len(phone) != 10:
+        raise ValueError(f"invalid phone_number {row['phone_number']!r}")
+    row['phone_number'] = phone
+
+    row['date_of_birth'] = _parse_date(row['date_of_birth']) if row.get('date_of_birth') else None
+    if row['date_of_birth'] and not date(1900, 1, 1) <= row['date_of_birth'] <= date.today():
+        raise ValueError(f"implausible date_of_birth {row['date_of_birth']}")
+
+    if registrations:
+        missing = [field for field in REGISTRATION_FIELDS if not row.get(field)]
+        if not phone:
+            missing.append('phone_number')
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)} for registration")
+        if row['gender'].lower() not in GENDERS:
+            raise ValueError(f"invalid gender {row['gender']!r}")
+        row['gender'] = GENDERS[row['gender'].lower()]
+        if row['guardian_relation'].lower() not in RELATIONS:
+            raise ValueError(f"invalid guardian_relation {row['guardian_relation']!r}")
+        row['guardian_relation'] = RELATIONS[row['guardian_relation'].lower()]
+        if not row['aadhaar_number'].isdigit() or len(row['aadhaar_number']) != 12:
+            raise ValueError('aadhaar_number must be 12 digits')
+    return row
+
+
+def parse_batch(batch, registrations=False):
+    """
+    Validate a batch in a worker process
+
+    Args:
+        batch: list of (line number, raw dict)
+
+    Returns:
+        tuple: (list of (line number, clean row), list of (line number, raw, reason))
+    """
+    valid = []
+    rejects = []
+    seen = set()
+    for line_number, raw in batch:
+        try:
+            row = clean_row(raw, registrations)
+        except ValueError as e:
+            rejects.append((line_number, raw, str(e)))
+            continue
+        if row['voter_id'] in seen:
+            rejects.append((line_number, raw, f"duplicate voter_id {row['voter_id']} in file"))
+            continue
+        seen.add(row['voter_id'])
+        valid.append((line_number, row))
+    return valid, rejects
+
+
+def _drop_existing(rows, registrations):
+    """Reject rows whose voter id, username, Aadhaar or phone is already stored (one query per key)"""
+    from django.contrib.auth.models import User
+
+    from .models import RegisteredUser, Voter
+
+    voter_ids = [row['voter_id'] for line_number, row in rows]
+    taken = set(Voter.objects.filter(voter_id__in=voter_ids).values_list('voter_id', flat=True))
+    taken |= set(User.objects.filter(username__in=voter_ids).values_list('username', flat=True))
+    taken_aadhaar, taken_phone = set(), set()
+    if registrations:
+        taken |= {username.upper() for username in RegisteredUser.objects.filter(
+            username__in=[voter_id.lower() for voter_id in voter_ids]).values_list('username', flat=True)}
+        taken |= set(RegisteredUser.objects.filter(voter_id_epic__in=voter_ids).values_list('voter_id_epic', flat=True))
+        taken_aadhaar = set(RegisteredUser.objects.filter(
+            aadhaar_number__in=[row['aadhaar_number'] for line_number, row in rows]
+        ).values_list('aadhaar_number', flat=True))
+        taken_phone = set(RegisteredUser.objects.filter(
+            phone_number__in=[row['phone_number'] for line_number, row in rows]
+        ).values_list('phone_number', flat=True))
+
+    kept, rejects = [], []
+    for line_number, row in rows:
+        if row['voter_id'] in taken:
+            rejects.append((line_number, row, f"voter_id {row['voter_id']} already exists"))
+        elif row.get('aadhaar_number') in taken_aadhaar:
+            rejects.append((line_number, row, 'aadhaar_number already registered'))
+        elif row.get('phone_number') in taken_phone:
+            rejects.append((line_number, row, 'phone_number already registered'))
+        else:
+            kept.append((line_number, row))
+            if registrations:
+                # Later rows of the same batch must not reuse them either
+                taken_aadhaar.add(row['aadhaar_number'])
+                taken_phone.add(row['phone_number'])
+    return kept, rejects
+
+
+class BulkCreateWriter:
+    """Insert a batch with bulk_create (any database)"""
+
+    def __init__(self, registrations=False):
+        self.registrations = registrations
+        # One unusable password for every imported account: no hashing per row
+        self.password = make_password(None)
+
+    def write(self, rows):
+        from django.contrib.auth.models import User
+
+        from .models import RegisteredUser, Voter
+
+        def new_user(row):
+            first_name, last_name = user_names(row['full_name'])
+            return User(username=row['voter_id'], password=self.password, email=row.get('email', ''),
+                        first_name=first_name, last_name=last_name)
+
+        users = User.objects.bulk_create([new_user(row) for line_number, row in rows])
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__in=[user.username for user in users]).order_by('pk'))
+            by_username = {user.username: user for user in users}
+            users = [by_username[row['voter_id']] for line_number, row in rows]
+
+        voters = Voter.objects.bulk_create([
+            Voter(
+                user=user, voter_id=row['voter_id'], full_name=row['full_name'], constituency=row['constituency'],
+                phone_number=row['phone_number'], date_of_birth=row['date_of_birth'],
+            )
+            for user, (line_number, row) in zip(users, rows)
+        ])
+        if voters and voters[0].pk is None:
+            by_voter_id = {voter.voter_id: voter for voter in Voter.objects.filter(
+                voter_id__in=[voter.voter_id for voter in voters])}
+            voters = [by_voter_id[row['voter_id']] for line_number, row in rows]
+
+        if self.registrations:
+            RegisteredUser.objects.bulk_create([
+                RegisteredUser(linked_voter=voter, is_approved=True, documents_verified=True,
+                               **_registration_values(row))
+                for voter, (line_number, row) in zip(voters, rows)
+            ])
+
+
+def _registration_values(row):
+    return {
+        'full_name': row['full_name'],
+        'username': row['voter_id'].lower(),
+        'date_of_birth': row['date_of_birth'],
+        'gender': row['gender'],
+        'voter_id_epic': row['voter_id'],
+        'aadhaar_number': row['aadhaar_number'],
+        'guardian_name': row['guardian_name'],
+        'guardian_relation': row['guardian_relation'],
+        'phone_number': row['phone_number'],
+        'email': row.get('email') or None,
+        'address': row['address'],
+        'constituency': row['constituency'],
+    }
+
+
+class PostgresCopyWriter(BulkCreateWriter):
+    """
+    Insert a batch with COPY (PostgreSQL)
+
+    Primary keys are reserved from the tables' sequences first, so Voter
+    and RegisteredUser rows can reference the new ids without reading
+    them back.
+    """
+
+    def _reserve_ids(self, cursor, table, count):
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def _copy(self, cursor, table, columns, records):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow(['\\N' if value is None else value for value in record])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
+    def write(self, rows):
+        from django.contrib.auth.models import User
+
+        from .models import RegisteredUser, Voter
+
+        now = timezone.now()
+        user_table = User._meta.db_table
+        voter_table = Voter._meta.db_table
+        with connection.cursor() as cursor:
+            raw = cursor.cursor  # COPY needs the driver cursor
+            user_ids = self._reserve_ids(cursor, user_table, len(rows))
+            self._copy(raw, user_table, [
+                'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+                'email', 'is_staff', 'is_active', 'date_joined',
+            ], (
+                [user_id, self.password, False, row['voter_id'], *user_names(row['full_name']),
+                 row.get('email', ''), False, True, now]
+                for user_id, (line_number, row) in zip(user_ids, rows)
+            ))
+
+            voter_ids = self._reserve_ids(cursor, voter_table, len(rows))
+            self._copy(raw, voter_table, [
+                'id', 'user_id', 'voter_id', 'full_name', 'constituency', 'phone_number', 'date_of_birth',
+                'has_voted', 'created_at',
+            ], (
+                [voter_pk, user_id, row['voter_id'], row['full_name'], row['constituency'], row['phone_number'],
+                 row['date_of_birth'], False, now]
+                for voter_pk, user_id, (line_number, row) in zip(voter_ids, user_ids, rows)
+            ))
+
+            if self.registrations:
+                columns = list(_registration_values(rows[0][1]))
+                self._copy(raw, RegisteredUser._meta.db_table, columns + [
+                    'aadhaar_image', 'voter_id_image', 'aadhaar_thumbnail', 'voter_id_thumbnail',
+                    'phone_verified', 'documents_verified', 'is_approved', 'created_at', 'updated_at',
+                    'linked_voter_id',
+                ], (
+                    list(_registration_values(row).values()) + ['', '', '', '', False, True, True, now, now, voter_pk]
+                    for voter_pk, (line_number, row) in zip(voter_ids, rows)
+                ))
+
+
+def get_writer(registrations=False, use_copy=True):
+    """COPY on PostgreSQL with psycopg2 (requirements.txt), bulk_create everywhere else"""
+    if use_copy and connection.vendor == 'postgresql' and connection.Database.__name__ == 'psycopg2':
+        return PostgresCopyWriter(registrations)
+    return BulkCreateWriter(registrations)
+
+
+def insert_batch(writer, rows):
+    """
+    Insert validated rows in one transaction
+
+    Returns:
+        list of (line number, row, reason) for rows rejected against the database
+    """
+    if not rows:
+        return []
+    with transaction.atomic():
+        rows, rejects = _drop_existing(rows, writer.registrations)
+        if rows:
+            writer.write(rows)
+    return rejects
@@ -0,0 +1,274 @@
+"""
+Decrypted biometric embedding cache
+Verifying a face used to cost a query for the voter, a query for their
+active BiometricEmbedding and a Fernet decryption, on every attempt.
+This keeps each voter's decrypted embedding, already scaled to unit
+length, in a bounded per-process LRU with a TTL, so retries and
+multi-step flows at a booth cost a dot product.
+
+Entries are dropped when a voter's embeddings change (registration,
+deactivation, deletion; see voting.signals): in this process directly,
+and in the others through a per-voter generation counter in the shared
+cache, read on every hit as voting.ballot_cache does for ballots. The
+TTL bounds staleness should the shared cache lose the counter. With a
+process-local CACHE_ALIAS a revoked embedding would keep verifying in
+the other workers, so the cache is then not used at all (outside DEBUG;
+voting.checks reports it). Vectors
+are overwritten with zeros when they leave the cache, so decrypted
+biometrics do not linger in freed memory.
+
+Batch verification (FederatedAuthenticationManager.verify_biometric_batch)
+copies many cached vectors at once and decrypts the misses in a small
+thread pool.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+import numpy as np
+
+from .checks import PROCESS_LOCAL_CACHES
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'BIOMETRIC_EMBEDDING_CACHE', {})
+
+
+def _shared_cache():
+    return caches[_config().get('CACHE_ALIAS', 'shared')]
+
+
+_local_alias_reported = False
+
+
+def enabled():
+    """Whether decrypted embeddings may be cached: on, and invalidations reach every worker"""
+    global _local_alias_reported
+    config = _config()
+    if not config.get('ENABLED', True):
+        return False
+    alias = config.get('CACHE_ALIAS', 'shared')
+    if settings.DEBUG or settings.CACHES.get(alias, {}).get('BACKEND') not in PROCESS_LOCAL_CACHES:
+        return True
+    if not _local_alias_reported:
+        _local_alias_reported = True
+        logger.error(f"Biometric embedding cache disabled: CACHE_ALIAS '{alias}' is not shared between workers")
+    return False
+
+
+def _generation_key(voter_id):
+    return f'biometric:generation:{voter_id}'
+
+
+class CachedEmbedding:
+    """A voter's active embedding, decrypted and normalized"""
+    __slots__ = ('voter_pk', 'embedding_pk', 'model_version', 'vector', 'last_used', 'generation', 'expires_at')
+
+    def __init__(self, voter_pk, embedding_pk, model_version, vector, last_used, generation, expires_at):
+        self.voter_pk = voter_pk
+        self.embedding_pk = embedding_pk
+        self.model_version = model_version
+        self.vector = vector
+        self.last_used = last_used
+        self.generation = generation
+        self.expires_at = expires_at
+
+
+def normalize(vector):
+    """Unit-length float32 copy of a vector (zeros stay zeros)"""
+    vector = np.array(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def cosine(unit_vector, challenge):
+    """Cosine similarity of a normalized vector and a challenge, clamped to [-1, 1]"""
+    challenge = np.asarray(challenge, dtype=np.float32)
+    norm = np.linalg.norm(challenge)
+    if not norm or challenge.shape != unit_vector.shape:
+        return 0.0
+    return float(np.clip(np.dot(unit_vector, challenge) / norm, -1, 1))
+
+
+class EmbeddingCache:
+    """LRU of CachedEmbedding keyed by EPIC number; evicted vectors are zeroed"""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def score(self, voter_id, generation, challenge):
+        """
+        Similarity of the challenge to a voter's cached embedding
+
+        Scored under the lock, so an entry cannot be zeroed mid-comparison.
+
+        Returns:
+            (CachedEmbedding, similarity), or None when not cached, expired or stale
+        """
+        with self._lock:
+            entry = self._entries.get(voter_id)
+            if entry is None:
+                return None
+            if entry.generation != generation or entry.expires_at <= time.monotonic():
+                self._discard(voter_id)
+                return None
+            self._entries.move_to_end(voter_id)
+            return entry, cosine(entry.vector, challenge)
+
+    def copy_into(self, wanted, matrix):
+        """
+        Copy many voters' cached vectors into rows of a matrix, under the lock
+
+        Args:
+            wanted: dict of voter_id -> (generation, row index)
+            matrix: float32 array with a row per index and the embedding dimension
+
+        Returns:
+            dict: voter_id -> CachedEmbedding for each voter copied; vectors
+            of another dimension are left out of the matrix
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for voter_id, (generation, row) in wanted.items():
+                entry = self._entries.get(voter_id)
+                if entry is None:
+                    continue
+                if entry.generation != generation or entry.expires_at <= now:
+                    self._discard(voter_id)
+                    continue
+                self._entries.move_to_end(voter_id)
+                if entry.vector.shape == matrix.shape[1:]:
+                    matrix[row] = entry.vector
+                found[voter_id] = entry
+        return found
+
+    def put(self, voter_id, entry):
+        with self._lock:
+            self._discard(voter_id)
+            self._entries[voter_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def discard(self, voter_id):
+        with self._lock:
+            self._discard(voter_id)
+
+    def clear(self):
+        with self._lock:
+            for voter_id in list(self._entries):
+                self._discard(voter_id)
+
+    def _discard(self, voter_id):
+        entry = self._entries.pop(voter_id, None)
+        if entry is not None:
+            entry.vector.fill(0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = _config()
+            _cache = EmbeddingCache(config.get('MAX_ENTRIES', 10000), config.get('TTL', 300))
+        return _cache
+
+
+def generation(voter_id):
+    """Current generation of a voter's embeddings (0 until they first change)"""
+    return _shared_cache().get(_generation_key(voter_id), 0)
+
+
+def generations(voter_ids):
+    """Current generation of many voters' embeddings, in one shared cache round trip"""
+    keys = {voter_id: _generation_key(voter_id) for voter_id in voter_ids}
+    stored = _shared_cache().get_many(keys.values())
+    return {voter_id: stored.get(key, 0) for voter_id, key in keys.items()}
+
+
+def load(voter_pk, embedding, generation):
+    """
+    Decrypt an embedding into a cache entry (not yet stored)
+
+    Raises:
+        ValueError: the embedding cannot be decrypted
+    """
+    vector = normalize(embedding._decrypt_embedding())
+    if not vector.any():
+        logger.warning(f"Zero-norm biometric embedding {embedding.pk}; it will never verify")
+    return CachedEmbedding(
+        voter_pk, embedding.pk, embedding.model_version, vector, embedding.last_used,
+        generation, time.monotonic() + get_cache().ttl,
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Per-process pool batch verification decrypts embeddings in"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_config().get('DECRYPT_WORKERS', 4),
+                thread_name_prefix='embedding-decrypt',
+            )
+        return _executor
+
+
+def _load_or_none(row):
+    try:
+        return load(*row)
+    except ValueError:
+        return None
+
+
+def load_many(rows):
+    """
+    Decrypt many embeddings into cache entries (not yet stored)
+
+    Args:
+        rows: list of (voter_pk, BiometricEmbedding, generation)
+
+    Returns:
+        list: a CachedEmbedding per row, None where decryption failed
+    """
+    if len(rows) < 2 or _config().get('DECRYPT_WORKERS', 4) < 2:
+        return [_load_or_none(row) for row in rows]
+    return list(get_executor().map(_load_or_none, rows))
+
+
+def invalidate(voter_id):
+    """Drop a voter's cached embedding here and, through the generation counter, everywhere else"""
+    if not enabled():
+        return
+    shared = _shared_cache()
+    key = _generation_key(voter_id)
+    if not shared.add(key, 1, timeout=None):
+        try:
+            shared.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            shared.set(key, 1, timeout=None)
+    get_cache().discard(voter_id)
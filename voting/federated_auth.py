@@ -13,14 +13,23 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 from cryptography.fernet import Fernet
+from functools import lru_cache
 import numpy as np
 import json
 import hashlib
 import logging
 
+from . import embedding_cache
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=4)
+def _cipher(key):
+    # Fernet derives its signing and encryption keys on construction
+    return Fernet(key.encode())
+
+
 class BiometricEmbedding(models.Model):
     """
     Stores ONLY encrypted biometric embeddings, never raw images
@@ -48,7 +57,7 @@ class BiometricEmbedding(models.Model):
         verbose_name_plural = "Biometric Embeddings"
 
     def __str__(self):
-        return f"Biometric for {self.voter.voter_id_epic} (v{self.model_version})"
+        return f"Biometric for {self.voter.voter_id} (v{self.model_version})"
 
     def verify_embedding(self, challenge_embedding, threshold=0.6):
         """
@@ -75,7 +84,7 @@ class BiometricEmbedding(models.Model):
             norm_challenge = np.linalg.norm(challenge_embedding)
             
             if norm_stored == 0 or norm_challenge == 0:
-                logger.warning(f"Zero norm detected in embedding comparison for voter {self.voter.voter_id_epic}")
+                logger.warning(f"Zero norm detected in embedding comparison for voter {self.voter.voter_id}")
                 return False, 0.0
             
             similarity = dot_product / (norm_stored * norm_challenge)
@@ -89,9 +98,9 @@ class BiometricEmbedding(models.Model):
             if is_verified:
                 self.last_used = timezone.now()
                 self.save(update_fields=['last_used'])
-                logger.info(f"Biometric verification successful for {self.voter.voter_id_epic} (similarity: {similarity:.3f})")
+                logger.info(f"Biometric verification successful for {self.voter.voter_id} (similarity: {similarity:.3f})")
             else:
-                logger.info(f"Biometric verification failed for {self.voter.voter_id_epic} (similarity: {similarity:.3f}, threshold: {threshold})")
+                logger.info(f"Biometric verification failed for {self.voter.voter_id} (similarity: {similarity:.3f}, threshold: {threshold})")
             
             return is_verified, similarity
             
@@ -105,7 +114,7 @@ class BiometricEmbedding(models.Model):
         Never logged or returned in API responses
         """
         try:
-            cipher = Fernet(settings.BIOMETRIC_ENCRYPTION_KEY.encode())
+            cipher = _cipher(settings.BIOMETRIC_ENCRYPTION_KEY)
             decrypted_bytes = cipher.decrypt(bytes(self.encrypted_embedding))
             embedding = np.frombuffer(decrypted_bytes, dtype=np.float32)
             return embedding
@@ -127,7 +136,7 @@ class BiometricEmbedding(models.Model):
         if isinstance(embedding_array, list):
             embedding_array = np.array(embedding_array, dtype=np.float32)
         
-        cipher = Fernet(settings.BIOMETRIC_ENCRYPTION_KEY.encode())
+        cipher = _cipher(settings.BIOMETRIC_ENCRYPTION_KEY)
         encrypted = cipher.encrypt(embedding_array.tobytes())
         return encrypted
 
@@ -137,7 +146,7 @@ class BiometricEmbedding(models.Model):
         """
         self.is_active = False
         self.save(update_fields=['is_active'])
-        logger.info(f"Deactivated biometric embedding for {self.voter.voter_id_epic}")
+        logger.info(f"Deactivated biometric embedding for {self.voter.voter_id}")
 
 
 class FederatedModelVersion(models.Model):
@@ -206,7 +215,7 @@ class FederatedGradientContribution(models.Model):
         verbose_name_plural = "Federated Gradient Contributions"
 
     def __str__(self):
-        return f"Gradient from {self.voter.voter_id_epic} for {self.model_version.version}"
+        return f"Gradient from {self.voter.voter_id} for {self.model_version.version}"
 
 
 class BiometricAuthLog(models.Model):
@@ -239,7 +248,7 @@ class BiometricAuthLog(models.Model):
 
     def __str__(self):
         status = "✓" if self.success else "✗"
-        return f"{status} {self.voter.voter_id_epic} at {self.timestamp}"
+        return f"{status} {self.voter.voter_id} at {self.timestamp}"
 
 
 class FederatedAuthenticationManager:
@@ -277,7 +286,7 @@ class FederatedAuthenticationManager:
             ).first()
             
             if existing:
-                logger.info(f"Biometric embedding already exists for {voter.voter_id_epic}")
+                logger.info(f"Biometric embedding already exists for {voter.voter_id}")
                 return existing
             
             # Deactivate old embeddings for this voter (keep audit trail)
@@ -295,7 +304,7 @@ class FederatedAuthenticationManager:
                 model_version=model_version
             )
             
-            logger.info(f"Registered new biometric embedding for {voter.voter_id_epic}")
+            logger.info(f"Registered new biometric embedding for {voter.voter_id}")
             return embedding
             
         except Exception as e:
@@ -307,6 +316,9 @@ class FederatedAuthenticationManager:
         """
         Verify biometric authentication using stored embeddings
         
+        The decrypted embedding is kept in voting.embedding_cache, so a
+        repeated attempt for the same voter needs no lookup or decryption.
+        
         Args:
             voter_id: Voter ID (EPIC number)
             challenge_embedding: numpy array or list (128-d)
@@ -318,47 +330,84 @@ class FederatedAuthenticationManager:
         """
         from voting.models import Voter
         
-        try:
-            voter = Voter.objects.get(voter_id_epic=voter_id)
-        except Voter.DoesNotExist:
-            logger.warning(f"Verification attempted for non-existent voter: {voter_id}")
-            return False, 0.0, "Voter not found"
-        
-        # Get active embedding for this voter
-        embedding = BiometricEmbedding.objects.filter(
-            voter=voter,
-            is_active=True
-        ).order_by('-created_at').first()
-        
-        if not embedding:
-            logger.warning(f"No biometric embedding found for voter: {voter_id}")
+        cache_config = getattr(settings, 'BIOMETRIC_EMBEDDING_CACHE', {})
+        cache = embedding_cache.get_cache()
+        generation = embedding_cache.generation(voter_id)
+        scored = cache.score(voter_id, generation, challenge_embedding) if embedding_cache.enabled() else None
+        
+        if scored is None:
+            try:
+                voter = Voter.objects.only('pk').get(voter_id=voter_id)
+            except Voter.DoesNotExist:
+                logger.warning(f"Verification attempted for non-existent voter: {voter_id}")
+                return False, 0.0, "Voter not found"
             
-            # Log the attempt
-            BiometricAuthLog.objects.create(
+            # Get active embedding for this voter
+            embedding = BiometricEmbedding.objects.filter(
                 voter=voter,
-                success=False,
-                similarity_score=0.0,
-                model_version='unknown',
-                ip_address=ip_address,
-                user_agent=user_agent or '',
-                failure_reason="No biometric embedding registered"
-            )
+                is_active=True
+            ).order_by('-created_at').first()
+            
+            if not embedding:
+                logger.warning(f"No biometric embedding found for voter: {voter_id}")
+                
+                # Log the attempt
+                BiometricAuthLog.objects.create(
+                    voter=voter,
+                    success=False,
+                    similarity_score=0.0,
+                    model_version='unknown',
+                    ip_address=ip_address,
+                    user_agent=user_agent or '',
+                    failure_reason="No biometric embedding registered"
+                )
+                
+                return False, 0.0, "No biometric data registered"
+            
+            try:
+                entry = embedding_cache.load(voter.pk, embedding, generation)
+            except ValueError:
+                BiometricAuthLog.objects.create(
+                    voter=voter,
+                    embedding=embedding,
+                    success=False,
+                    similarity_score=0.0,
+                    model_version=embedding.model_version,
+                    ip_address=ip_address,
+                    user_agent=user_agent or '',
+                    failure_reason="Stored embedding could not be decrypted"
+                )
+                return False, 0.0, "Similarity score too low (0.000)"
             
-            return False, 0.0, "No biometric data registered"
+            # Scored before it is shared, so no other thread can zero it meanwhile
+            similarity = embedding_cache.cosine(entry.vector, challenge_embedding)
+            if embedding_cache.enabled():
+                cache.put(voter_id, entry)
+        else:
+            entry, similarity = scored
         
         # Get threshold from settings
         threshold = getattr(settings, 'BIOMETRIC_VERIFICATION', {}).get('SIMILARITY_THRESHOLD', 0.6)
+        is_verified = similarity >= threshold
         
-        # Verify using encrypted embedding comparison
-        is_verified, similarity = embedding.verify_embedding(challenge_embedding, threshold)
+        if is_verified:
+            # Retries seconds apart would each rewrite the same timestamp
+            now = timezone.now()
+            interval = cache_config.get('LAST_USED_INTERVAL', 60)
+            if entry.last_used is None or (now - entry.last_used).total_seconds() >= interval:
+                BiometricEmbedding.objects.filter(pk=entry.embedding_pk).update(last_used=now)
+                entry.last_used = now
+            logger.info(f"Biometric verification successful for {voter_id} (similarity: {similarity:.3f})")
+        else:
+            logger.info(f"Biometric verification failed for {voter_id} (similarity: {similarity:.3f}, threshold: {threshold})")
         
         # Log authentication attempt
         BiometricAuthLog.objects.create(
-            voter=voter,
-            embedding=embedding,
+            voter_id=entry.voter_pk,
+            embedding_id=entry.embedding_pk,
             success=is_verified,
             similarity_score=similarity,
-            model_version=embedding.model_version,
+            model_version=entry.model_version,
             ip_address=ip_address,
             user_agent=user_agent or '',
             failure_reason="" if is_verified else f"Similarity {similarity:.3f} below threshold {threshold}"
@@ -369,6 +418,152 @@ class FederatedAuthenticationManager:
         else:
             return False, similarity, f"Similarity score too low ({similarity:.3f})"
     
+    @staticmethod
+    def verify_biometric_batch(items, ip_address=None, user_agent=None):
+        """
+        Verify many voters at once (polling booth kiosks)
+        
+        Cached embeddings are used as in verify_biometric(); the others are
+        fetched in one query and decrypted in voting.embedding_cache's pool.
+        Every challenge is then scored in one matrix operation, last_used is
+        written in one UPDATE and the audit rows in one bulk_create.
+        
+        Args:
+            items: list of (voter_id, challenge_embedding)
+            ip_address: str (optional)
+            user_agent: str (optional)
+            
+        Returns:
+            list of (is_verified: bool, similarity: float, message: str), in item order
+        """
+        from voting.models import Voter
+        
+        if not items:
+            return []
+        cache_config = getattr(settings, 'BIOMETRIC_EMBEDDING_CACHE', {})
+        verification = getattr(settings, 'BIOMETRIC_VERIFICATION', {})
+        threshold = verification.get('SIMILARITY_THRESHOLD', 0.6)
+        dimension = verification.get('EMBEDDING_DIMENSION', 128)
+        cache = embedding_cache.get_cache()
+        
+        # One row of stored vectors per distinct voter
+        rows = {voter_id: row for row, voter_id in enumerate(dict.fromkeys(voter_id for voter_id, _ in items))}
+        stored = np.zeros((len(rows), dimension), dtype=np.float32)
+        generations = embedding_cache.generations(rows)
+        if embedding_cache.enabled():
+            entries = cache.copy_into({voter_id: (generations[voter_id], row) for voter_id, row in rows.items()}, stored)
+        else:
+            entries = {}
+        
+        loaded, undecryptable, voter_pks = {}, {}, {}
+        missing = [voter_id for voter_id in rows if voter_id not in entries]
+        if missing:
+            latest = {}
+            embeddings = (
+                BiometricEmbedding.objects.filter(voter__voter_id__in=missing, is_active=True)
+                .select_related('voter')
+                .only('encrypted_embedding', 'model_version', 'last_used', 'voter__voter_id')
+                .order_by('voter', '-created_at')
+            )
+            for embedding in embeddings:
+                latest.setdefault(embedding.voter.voter_id, embedding)
+            
+            unregistered = [voter_id for voter_id in missing if voter_id not in latest]
+            if unregistered:
+                voter_pks = dict(Voter.objects.filter(voter_id__in=unregistered).values_list('voter_id', 'pk'))
+            
+            decrypted = embedding_cache.load_many([
+                (embedding.voter_id, embedding, generations[voter_id]) for voter_id, embedding in latest.items()
+            ])
+            for (voter_id, embedding), entry in zip(latest.items(), decrypted):
+                if entry is None:
+                    undecryptable[voter_id] = embedding
+                    continue
+                # Copied before it is shared, so no other thread can zero it meanwhile
+                if entry.vector.shape == (dimension,):
+                    stored[rows[voter_id]] = entry.vector
+                entries[voter_id] = loaded[voter_id] = entry
+        
+        challenges = np.zeros((len(items), dimension), dtype=np.float32)
+        for index, (_, challenge) in enumerate(items):
+            try:
+                challenge = np.asarray(challenge, dtype=np.float32)
+            except (TypeError, ValueError):
+                continue
+            if challenge.shape == (dimension,):
+                challenges[index] = challenge
+        norms = np.linalg.norm(challenges, axis=1)
+        norms[norms == 0] = 1  # Zero or malformed challenges score 0
+        matched = stored[[rows[voter_id] for voter_id, _ in items]]
+        similarities = np.clip(np.einsum('ij,ij->i', matched, challenges) / norms, -1, 1).tolist()
+        matched.fill(0)
+        stored.fill(0)
+        
+        now = timezone.now()
+        interval = cache_config.get('LAST_USED_INTERVAL', 60)
+        results, logs, used = [], [], set()
+        for (voter_id, _), similarity in zip(items, similarities):
+            entry = entries.get(voter_id)
+            if entry is None:
+                if voter_id in undecryptable:
+                    embedding = undecryptable[voter_id]
+                    logs.append(BiometricAuthLog(
+                        voter_id=embedding.voter_id,
+                        embedding=embedding,
+                        success=False,
+                        similarity_score=0.0,
+                        model_version=embedding.model_version,
+                        ip_address=ip_address,
+                        user_agent=user_agent or '',
+                        failure_reason="Stored embedding could not be decrypted"
+                    ))
+                    results.append((False, 0.0, "Similarity score too low (0.000)"))
+                elif voter_id in voter_pks:
+                    logs.append(BiometricAuthLog(
+                        voter_id=voter_pks[voter_id],
+                        success=False,
+                        similarity_score=0.0,
+                        model_version='unknown',
+                        ip_address=ip_address,
+                        user_agent=user_agent or '',
+                        failure_reason="No biometric embedding registered"
+                    ))
+                    results.append((False, 0.0, "No biometric data registered"))
+                else:
+                    logger.warning(f"Verification attempted for non-existent voter: {voter_id}")
+                    results.append((False, 0.0, "Voter not found"))
+                continue
+            
+            is_verified = similarity >= threshold
+            if is_verified and (entry.last_used is None or (now - entry.last_used).total_seconds() >= interval):
+                used.add(entry.embedding_pk)
+                entry.last_used = now
+            logs.append(BiometricAuthLog(
+                voter_id=entry.voter_pk,
+                embedding_id=entry.embedding_pk,
+                success=is_verified,
+                similarity_score=similarity,
+                model_version=entry.model_version,
+                ip_address=ip_address,
+                user_agent=user_agent or '',
+                failure_reason="" if is_verified else f"Similarity {similarity:.3f} below threshold {threshold}"
+            ))
+            if is_verified:
+                results.append((True, similarity, "Authentication successful"))
+            else:
+                results.append((False, similarity, f"Similarity score too low ({similarity:.3f})"))
+        
+        if used:
+            BiometricEmbedding.objects.filter(pk__in=used).update(last_used=now)
+        BiometricAuthLog.objects.bulk_create(logs)
+        if embedding_cache.enabled():
+            for voter_id, entry in loaded.items():
+                cache.put(voter_id, entry)
+        
+        verified = sum(result[0] for result in results)
+        logger.info(f"Batch biometric verification: {verified} of {len(items)} verified")
+        return results
+    
     @staticmethod
     def aggregate_federated_gradients(model_version_obj):
         """
@@ -470,7 +665,7 @@ class FederatedAuthenticationManager:
             num_samples=num_samples
         )
         
-        logger.info(f"Received gradient contribution from {voter.voter_id_epic} for {model_version_obj.version}")
+        logger.info(f"Received gradient contribution from {voter.voter_id} for {model_version_obj.version}")
         
         # Check if we have enough contributions to aggregate
         pending_count = FederatedGradientContribution.objects.filter(
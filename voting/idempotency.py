@@ -0,0 +1,193 @@
+"""
+Idempotency keys for retried POSTs
+Clients on flaky networks send an `Idempotency-Key` header with each
+logical request and reuse it on every retry. The first request runs the
+view; its response (status, body and cookies) is kept in the cache for
+IDEMPOTENCY['TTL'] seconds and replayed for retries without touching the
+database. Duplicates that arrive while the first is still running wait
+for it: a per-key lock serializes them inside a process and a cache.add
+marker does the same across processes.
+
+Only views marked with `idempotent` take part.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _config():
+    return getattr(settings, 'IDEMPOTENCY', {})
+
+
+def _cache():
+    return caches[_config().get('CACHE_ALIAS', 'shared')]
+
+
+def idempotent(view_func):
+    """Honour Idempotency-Key headers on this view (see IdempotencyMiddleware)"""
+    view_func.idempotent = True
+    return view_func
+
+
+@contextmanager
+def _key_lock(key, timeout):
+    """Serialize requests carrying the same key within this process"""
+    with _local_locks_guard:
+        entry = _local_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    acquired = entry[0].acquire(timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            entry[0].release()
+        with _local_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _local_locks[key]
+
+
+def request_fingerprint(request):
+    """
+    Hash of what the client asked for, so a key reused for a different
+    request is rejected instead of replaying an unrelated response
+
+    Uploaded files are represented by name and size; hashing request.body
+    would pull multipart uploads into memory.
+    """
+    digest = hashlib.sha256(f'{request.method} {request.path}'.encode())
+    if request.content_type == 'multipart/form-data':
+        for name, values in sorted(request.POST.lists()):
+            digest.update(repr((name, values)).encode())
+        for name, files in sorted(request.FILES.lists()):
+            digest.update(repr((name, [(upload.name, upload.size) for upload in files])).encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(record):
+    fingerprint, status, content_type, content, cookies = record
+    response = HttpResponse(content, status=status, content_type=content_type)
+    response.cookies = cookies
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class IdempotencyMiddleware:
+    """
+    Store and replay responses of idempotent views
+
+    Sits outside SessionMiddleware so a replay also re-sends the session
+    cookie the original response set (e.g. the pending registration).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY', '').strip()
+        if request.method != 'POST' or not key or not self.is_idempotent(request):
+            return self.get_response(request)
+
+        if len(key) > 255:
+            return JsonResponse({'success': False, 'error': 'Idempotency-Key is too long'}, status=400)
+
+        config = _config()
+        lock_timeout = config.get('LOCK_TIMEOUT', 30)
+        # Scope keys to the caller's session cookie and route
+        session_cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+        scope = hashlib.sha256(f'{request.path}\0{session_cookie}\0{key}'.encode()).hexdigest()
+        result_key = f'idempotency:{scope}'
+        marker_key = f'idempotency-lock:{scope}'
+        fingerprint = request_fingerprint(request)
+        cache = _cache()
+
+        response = self.stored(cache, result_key, fingerprint)
+        if response is not None:
+            return response
+
+        with _key_lock(scope, lock_timeout) as acquired:
+            if not acquired:
+                return self.in_progress()
+
+            # Another thread may have finished while we waited
+            response = self.stored(cache, result_key, fingerprint)
+            if response is not None:
+                return response
+
+            token = uuid.uuid4().hex
+            if not cache.add(marker_key, token, lock_timeout):
+                return self.wait_for_result(cache, result_key, fingerprint, lock_timeout)
+
+            try:
+                response = self.get_response(request)
+                self.store(cache, result_key, fingerprint, response, config.get('TTL', 86400))
+            finally:
+                if cache.get(marker_key) == token:
+                    cache.delete(marker_key)
+        return response
+
+    def is_idempotent(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return getattr(match.func, 'idempotent', False)
+
+    def stored(self, cache, result_key, fingerprint):
+        record = cache.get(result_key)
+        if record is None:
+            return None
+        if record[0] != fingerprint:
+            return JsonResponse({
+                'success': False,
+                'error': 'Idempotency-Key was already used for a different request'
+            }, status=422)
+        return _replay(record)
+
+    def store(self, cache, result_key, fingerprint, response, ttl):
+        # Server errors, throttling and streams are not final; let the client retry them
+        if response.status_code >= 500 or response.status_code == 429 or response.streaming:
+            return
+        record = (
+            fingerprint,
+            response.status_code,
+            response.get('Content-Type'),
+            response.content,
+            response.cookies,
+        )
+        cache.set(result_key, record, ttl)
+
+    def wait_for_result(self, cache, result_key, fingerprint, timeout):
+        """Another process is running this request: poll for its result"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = self.stored(cache, result_key, fingerprint)
+            if response is not None:
+                return response
+        return self.in_progress()
+
+    def in_progress(self):
+        logger.warning("Idempotent request still in progress; asking the client to retry")
+        response = JsonResponse({
+            'success': False,
+            'error': 'A request with this Idempotency-Key is still being processed'
+        }, status=409)
+        response['Retry-After'] = '1'
+        return response
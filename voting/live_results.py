@@ -0,0 +1,236 @@
+"""
+In-process live results aggregator for the Server-Sent Events endpoint
+A single ticker per worker reads the CandidateTally table once per tick
+and fans the change set out to every connected client, so database load
+does not grow with the number of observers.
+
+Events are rendered to bytes once per tick (and per constituency filter)
+and the same bytes object is shared by every subscriber queue, which keeps
+the cost of an idle connection down to its queue and generator frame.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'LIVE_RESULTS', {})
+
+
+def read_tallies():
+    """
+    Current votes per candidate, grouped by constituency (one query)
+
+    Returns:
+        dict: {constituency: {candidate_id: votes}}
+    """
+    from .models import CandidateTally
+
+    tallies = defaultdict(dict)
+    rows = CandidateTally.objects.values_list('constituency', 'candidate_id', 'votes')
+    for constituency, candidate_id, votes in rows:
+        tallies[constituency][candidate_id] = votes
+    return dict(tallies)
+
+
+class LiveEvent:
+    """One SSE message, rendered lazily and shared between clients"""
+
+    def __init__(self, name, tick, tallies, turnout=None):
+        self.name = name
+        self.tick = tick
+        self.tallies = tallies
+        # A delta only holds the changed candidates; its turnout comes from the full tally
+        self.turnout = turnout if turnout is not None else {
+            name: sum(candidates.values()) for name, candidates in tallies.items()
+        }
+        self._rendered = {}
+
+    def render(self, constituency=None):
+        """
+        Encode the event for a client, optionally filtered to one constituency
+
+        Returns:
+            bytes, or None when the event has nothing for that constituency
+        """
+        if constituency in self._rendered:
+            return self._rendered[constituency]
+
+        tallies, turnout = self.tallies, self.turnout
+        if constituency is not None:
+            tallies = {constituency: tallies[constituency]} if constituency in tallies else {}
+            turnout = {name: turnout[name] for name in tallies}
+
+        chunk = None
+        if tallies or self.name == 'snapshot':
+            data = {
+                'tick': self.tick,
+                'turnout': turnout,
+                'tallies': tallies,
+            }
+            chunk = (
+                f"event: {self.name}\nid: {self.tick}\n"
+                f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+            ).encode()
+
+        self._rendered[constituency] = chunk
+        return chunk
+
+
+class Heartbeat:
+    """SSE comment line that keeps idle connections open through proxies"""
+
+    CHUNK = b': keepalive\n\n'
+
+    def render(self, constituency=None):
+        return self.CHUNK
+
+
+HEARTBEAT = Heartbeat()
+
+
+class LiveResultsAggregator:
+    """
+    Shared ticker feeding every live-results subscriber in this process
+
+    Subscribers receive a full snapshot first, then 'delta' events holding
+    only the candidates whose totals changed since the previous tick.
+    A client that falls behind has its backlog replaced by a fresh snapshot.
+    """
+
+    def __init__(self, tick_seconds=2.0, heartbeat_seconds=15.0, client_queue_size=4):
+        self.tick_seconds = tick_seconds
+        self.heartbeat_ticks = max(1, round(heartbeat_seconds / tick_seconds))
+        self.client_queue_size = client_queue_size
+
+        self._subscribers = set()
+        self._task = None
+        self._ready = None
+        self._loop = None
+        self._snapshot = None
+        self._snapshot_event = None
+        self._tick = 0
+        self._quiet_ticks = 0
+        self.reads = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = _config()
+        return cls(
+            tick_seconds=config.get('TICK_SECONDS', 2.0),
+            heartbeat_seconds=config.get('HEARTBEAT_SECONDS', 15.0),
+            client_queue_size=config.get('CLIENT_QUEUE_SIZE', 4),
+        )
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    async def subscribe(self):
+        """
+        Register a client
+
+        Returns:
+            asyncio.Queue that yields LiveEvent / Heartbeat objects
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the previous event loop has gone away
+            self._reset()
+            self._loop = loop
+            self._ready = asyncio.Event()
+
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        await self._ready.wait()
+
+        queue = asyncio.Queue(maxsize=self.client_queue_size)
+        queue.put_nowait(self._snapshot_event)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _reset(self):
+        self._subscribers = set()
+        self._task = None
+        self._snapshot = None
+        self._snapshot_event = None
+        self._quiet_ticks = 0
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    snapshot = await sync_to_async(read_tallies, thread_sensitive=False)()
+                    self.reads += 1
+                    self._publish(snapshot)
+                except Exception as e:
+                    logger.error(f"Live results tick failed: {e}")
+
+                await asyncio.sleep(self.tick_seconds)
+                if not self._subscribers:
+                    break
+        finally:
+            # Last client left: stop polling until somebody subscribes again
+            self._task = None
+            self._snapshot = None
+            self._snapshot_event = None
+            self._ready.clear()
+
+    def _publish(self, snapshot):
+        previous = self._snapshot
+        self._tick += 1
+        self._snapshot = snapshot
+        self._snapshot_event = LiveEvent('snapshot', self._tick, snapshot)
+
+        if previous is None:
+            self._ready.set()
+            return
+
+        changed = {}
+        for constituency, candidates in snapshot.items():
+            before = previous.get(constituency, {})
+            diff = {cid: votes for cid, votes in candidates.items() if before.get(cid) != votes}
+            if diff:
+                changed[constituency] = diff
+
+        if changed:
+            turnout = {name: sum(snapshot[name].values()) for name in changed}
+            event = LiveEvent('delta', self._tick, changed, turnout)
+            self._quiet_ticks = 0
+        else:
+            self._quiet_ticks += 1
+            if self._quiet_ticks < self.heartbeat_ticks:
+                return
+            event = HEARTBEAT
+            self._quiet_ticks = 0
+
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Deltas carry absolute values of changed rows only, so a
+                # dropped delta would lose updates; resync with a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_event)
+
+
+_aggregator = None
+
+
+def get_aggregator():
+    """Process-wide aggregator (one per ASGI worker)"""
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = LiveResultsAggregator.from_settings()
+    return _aggregator
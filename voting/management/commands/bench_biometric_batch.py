@@ -0,0 +1,79 @@
+"""
+Benchmark batch biometric verification
+Verifies the same queues of voters one call at a time, as
+/api/verify-biometric/ does, and with one verify_biometric_batch() call,
+as /api/verify-biometric/batch/ does, against a throwaway database of
+--voters voters with registered embeddings. Both paths are measured with
+an empty embedding cache (a fresh kiosk queue) and a warm one (retries).
+"""
+
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+import numpy as np
+
+from voting import embedding_cache
+from voting.benchmarking import Stopwatch, isolated_database, percentile, seed_voters
+from voting.federated_auth import BiometricEmbedding, FederatedAuthenticationManager
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batch biometric verification against one call per voter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=5000, help='Voters seeded with an embedding')
+        parser.add_argument('--batch-size', type=int, default=50, help='Voters per kiosk queue')
+        parser.add_argument('--rounds', type=int, default=20, help='Queues verified per measurement')
+
+    def handle(self, *args, **options):
+        batch_size, rounds = options['batch_size'], options['rounds']
+        with isolated_database(on_disk=True) as database:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{options['voters']:,} voters, queues of {batch_size} ({database}, {connection.vendor})"
+            ))
+            rng = np.random.default_rng(42)
+            voter_pks = seed_voters(options['voters'], prefix='KIOSK')
+            vectors = rng.standard_normal((len(voter_pks), 128)).astype(np.float32)
+            embeddings = []
+            for voter_pk, vector in zip(voter_pks, vectors):
+                encrypted = BiometricEmbedding.encrypt_embedding(vector)
+                embeddings.append(BiometricEmbedding(
+                    voter_id=voter_pk, encrypted_embedding=encrypted,
+                    embedding_hash=hashlib.sha256(encrypted).hexdigest(),
+                    confidence_score=0.9, model_version='v1.0.0',
+                ))
+            BiometricEmbedding.objects.bulk_create(embeddings, batch_size=1000)
+
+            queues = []
+            for _ in range(rounds):
+                picked = rng.choice(len(voter_pks), size=min(batch_size, len(voter_pks)), replace=False)
+                # Live captures are close to, not equal to, the registered descriptor
+                noise = rng.normal(0, 0.3, (len(picked), 128)).astype(np.float32)
+                queues.append([(f'KIOSK{i:08d}', vectors[i] + row) for i, row in zip(picked.tolist(), noise)])
+
+            def single(queue):
+                return [FederatedAuthenticationManager.verify_biometric(voter_id, challenge)
+                        for voter_id, challenge in queue]
+
+            def batch(queue):
+                return FederatedAuthenticationManager.verify_biometric_batch(queue)
+
+            for warm in (False, True):
+                for label, run in [('one call per voter', single), ('batch', batch)]:
+                    latencies = []
+                    for queue in queues:
+                        if warm:
+                            run(queue)
+                        else:
+                            embedding_cache.get_cache().clear()
+                        with Stopwatch() as timer:
+                            results = run(queue)
+                        latencies.append(timer.elapsed * 1000)
+                    verified = sum(result[0] for result in results)
+                    self.stdout.write(
+                        f"  {'warm' if warm else 'cold'} cache, {label}: "
+                        f"p50={percentile(latencies, 50):.1f}ms p99={percentile(latencies, 99):.1f}ms per queue, "
+                        f"{percentile(latencies, 50) / len(queues[0]):.2f}ms per voter "
+                        f"({verified}/{len(results)} verified in the last queue)"
+                    )
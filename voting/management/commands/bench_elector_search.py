@@ -0,0 +1,124 @@
+"""
+Benchmark elector search
+Part 1 builds the in-process trigram index over --voters synthetic
+electors (no database) and measures memory and query latency for name
+prefixes and misspelled names. Part 2 compares the index, and the
+voter_id range used for EPIC prefixes, with icontains scans against a
+throwaway database of --db-voters rows.
+"""
+
+import random
+import resource
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from voting.benchmarking import Stopwatch, isolated_database, percentile, seed_voters
+from voting.elector_search import ElectorIndex, normalize, search_epic
+from voting.models import Voter
+
+FIRST_NAMES = ['Asha', 'Ravi', 'Meena', 'Suresh', 'Anita', 'Vikram', 'Lakshmi', 'Arjun', 'Priya', 'Mohan',
+               'Kavita', 'Rahul', 'Sunita', 'Amit', 'Geeta', 'Rajesh', 'Pooja', 'Sanjay', 'Neha', 'Deepak']
+SURNAMES = ['Rao', 'Kumar', 'Iyer', 'Sharma', 'Patel', 'Singh', 'Reddy', 'Nair', 'Gupta', 'Das',
+            'Joshi', 'Mehta', 'Pillai', 'Verma', 'Yadav', 'Bose', 'Menon', 'Chopra', 'Shetty', 'Khan']
+SYLLABLES = ['ka', 'ra', 'mi', 'su', 'de', 'vi', 'no', 'la', 'pa', 'ti', 'sha', 'ga', 'ma', 'ni', 'ro']
+
+
+def elector(i, rng):
+    """(voter_id, full_name, constituency) of the i-th synthetic elector"""
+    given = rng.choice(FIRST_NAMES) + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(0, 2)))
+    family = rng.choice(SURNAMES) + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(0, 2)))
+    return f'ELR{i:07d}', f'{given} {family}', f'Constituency {i % 543}'
+
+
+def misspell(name, rng):
+    letters = list(name)
+    position = rng.randrange(1, len(letters))
+    letters.insert(position, letters[position - 1])
+    return ''.join(letters)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-process elector search index against icontains scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=1000000, help='Electors held by the in-memory index')
+        parser.add_argument('--db-voters', type=int, default=100000, help='Voters seeded for the scan comparison')
+        parser.add_argument('--queries', type=int, default=300)
+
+    def handle(self, *args, **options):
+        self._bench_index(options['voters'], options['queries'])
+        self._bench_database(options['db_voters'], min(options['queries'], 100))
+
+    def _queries(self, electors, count, rng):
+        sample = rng.sample(electors, min(count, len(electors)))
+        return {
+            'name prefix': [normalize(name)[:len(name.split()[0]) + 3] for voter_id, name, _ in sample],
+            'misspelled name': [misspell(name, rng) for voter_id, name, _ in sample],
+        }
+
+    def _bench_index(self, voters, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'In-process index over {voters:,} electors'))
+        rng = random.Random(42)
+        electors = [elector(i, rng) for i in range(voters)]
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        index = ElectorIndex()
+        with Stopwatch() as build:
+            for pk, values in enumerate(electors, 1):
+                index.add(pk, *values)
+        index.ready = True
+        grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024
+        self.stdout.write(f'  build {build.elapsed:.1f}s ({voters / build.elapsed:,.0f} electors/sec), '
+                          f'~{grown / 2 ** 20:.0f} MiB ({grown / voters:.0f} bytes per elector), '
+                          f'{sum(len(postings) for postings in index.postings):,} trigrams')
+
+        for label, texts in self._queries(electors, queries, rng).items():
+            latencies = []
+            for text in texts:
+                with Stopwatch() as timer:
+                    index.rank(normalize(text), limit=20)
+                latencies.append(timer.elapsed * 1000)
+            self.stdout.write(f'  {label}: p50={percentile(latencies, 50):.2f}ms '
+                              f'p99={percentile(latencies, 99):.2f}ms')
+
+    def _bench_database(self, db_voters, queries):
+        with isolated_database(on_disk=True) as database:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'Search against {db_voters:,} voters ({database}, {connection.vendor})'
+            ))
+            rng = random.Random(7)
+            seed_voters(db_voters, prefix='ELR')
+            electors = [elector(i, rng) for i in range(db_voters)]
+            for start in range(0, db_voters, 5000):
+                chunk = electors[start:start + 5000]
+                voters = list(Voter.objects.filter(voter_id__in=[f'ELR{i:08d}' for i in range(start, start + len(chunk))]))
+                for voter, (voter_id, name, constituency) in zip(sorted(voters, key=lambda v: v.voter_id), chunk):
+                    voter.full_name, voter.constituency = name, constituency
+                Voter.objects.bulk_update(voters, ['full_name', 'constituency'])
+            electors = list(Voter.objects.values_list('voter_id', 'full_name', 'constituency'))
+
+            index = ElectorIndex()
+            index.warm()
+            sample = rng.sample(electors, min(queries, len(electors)))
+            names = self._queries(sample, queries, rng)['name prefix']
+            epics = [voter_id[:8] for voter_id, name, _ in sample]
+
+            def scan(text):
+                return list(Voter.objects.filter(
+                    Q(full_name__icontains=text) | Q(voter_id__icontains=text) | Q(constituency__icontains=text)
+                ).values_list('voter_id', 'full_name')[:20])
+
+            for label, run, texts in [
+                ('name prefix, icontains scan', scan, names),
+                ('name prefix, trigram index', lambda text: index.search(normalize(text)), names),
+                ('EPIC prefix, icontains scan', scan, epics),
+                ('EPIC prefix, voter_id range', lambda text: search_epic(normalize(text)), epics),
+            ]:
+                latencies = []
+                for text in texts:
+                    with Stopwatch() as timer:
+                        run(text)
+                    latencies.append(timer.elapsed * 1000)
+                self.stdout.write(f'  {label}: p50={percentile(latencies, 50):.2f}ms '
+                                  f'p99={percentile(latencies, 99):.2f}ms')
@@ -0,0 +1,91 @@
+"""
+Benchmark the registration uniqueness pre-check
+Part 1 sizes Bloom filters for --users registrations (10M by default) and
+measures build time, memory, lookup latency and the observed false
+positive rate. Part 2 compares the old four exists() queries with the
+filter + single OR query against a throwaway database of --db-users rows.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from voting.benchmarking import Stopwatch, isolated_database, percentile, registration_values, seed_registrations
+from voting.models import RegisteredUser
+from voting.registration_index import UNIQUE_FIELDS, RegistrationIndex, find_collisions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Bloom-filter registration uniqueness checks against per-field queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000000, help='Registrations held by the filters')
+        parser.add_argument('--db-users', type=int, default=50000, help='Registrations seeded for the query comparison')
+        parser.add_argument('--lookups', type=int, default=20000, help='New registrations to check')
+        parser.add_argument('--error-rate', type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        self._bench_filters(options['users'], options['lookups'], options['error_rate'])
+        self._bench_queries(options['db_users'], min(options['lookups'], 2000), options['error_rate'])
+
+    def _bench_filters(self, users, lookups, error_rate):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Bloom filters for {users:,} registrations'))
+        index = RegistrationIndex(users, error_rate)
+        with Stopwatch() as build:
+            for i in range(users):
+                index.add(registration_values(i))
+                if i and i % 1000000 == 0:
+                    self.stdout.write(f'  {i:,} added...')
+        index.ready = True
+        memory = sum(bloom.nbytes for bloom in index.filters.values())
+        self.stdout.write(f'  build {build.elapsed:.1f}s ({users / build.elapsed:,.0f} registrations/sec), '
+                          f'{memory / 2 ** 20:.1f} MiB for {len(UNIQUE_FIELDS)} fields')
+
+        latencies = []
+        false_positives = 0
+        for i in range(users, users + lookups):
+            with Stopwatch() as timer:
+                maybe = index.maybe_taken(registration_values(i))
+            latencies.append(timer.elapsed * 1e6)
+            false_positives += bool(maybe)
+        self.stdout.write(f'  miss lookup p50={percentile(latencies, 50):.1f}us p99={percentile(latencies, 99):.1f}us, '
+                          f'{false_positives}/{lookups} registrations need a query '
+                          f'({false_positives / lookups:.2%})')
+
+    def _bench_queries(self, db_users, lookups, error_rate):
+        with isolated_database(on_disk=True) as database:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'Uniqueness checks against {db_users:,} rows ({database}, {connection.vendor})'
+            ))
+            seed_registrations(db_users)
+            candidates = [registration_values(i) for i in range(db_users, db_users + lookups)]
+
+            def per_field(values):
+                return [
+                    field for field in UNIQUE_FIELDS
+                    if RegisteredUser.objects.filter(**{field: values[field]}).exists()
+                ]
+
+            index = RegistrationIndex(max(db_users, 1), error_rate)
+            index.warm()
+            self._report('Four exists() queries', candidates, per_field)
+            self._report('Single OR query', candidates, find_collisions)
+            self._report('Bloom filters + OR query', candidates, index.collisions)
+
+    def _report(self, label, candidates, check):
+        latencies = []
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            for values in candidates:
+                with Stopwatch() as timer:
+                    check(values)
+                latencies.append(timer.elapsed * 1000)
+        self.stdout.write(
+            f'  {label}: p50={percentile(latencies, 50):.3f}ms p99={percentile(latencies, 99):.3f}ms, '
+            f'{queries / len(candidates):.2f} queries per registration'
+        )
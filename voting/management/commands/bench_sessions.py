@@ -0,0 +1,123 @@
+"""
+Benchmark the login flow under the database and cached session engines
+Each simulated voter runs login_send_otp -> login_verify_otp -> voter_auth
+-> voter_auth (a retry that stores the same session data) with the test
+client. Reports requests/sec and django_session queries per request.
+Runs against a throwaway on-disk database and a temporary session cache.
+"""
+
+import shutil
+import tempfile
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from voting.benchmarking import Stopwatch, isolated_database, seed_voters
+from voting.models import Voter
+
+ENGINES = [
+    ('database', 'django.contrib.sessions.backends.db'),
+    ('cached', 'voting.session_backend'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare login-flow throughput with database-backed and cache-backed sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=500, help='Login flows per engine')
+        parser.add_argument('--threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        cache_dir = tempfile.mkdtemp(prefix='vote4all-bench-sessions-')
+        caches_config = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'sessions': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            },
+        }
+        overrides = override_settings(
+            CACHES=caches_config,
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            ADMISSION={'ENABLED': False},  # Measure sessions, not the rate limiter
+            RATE_LIMIT={'ENABLED': False},
+            OTP_SERVICE={**getattr(settings, 'OTP_SERVICE', {}), 'EXPOSE_CODES': True},
+        )
+
+        try:
+            with isolated_database(on_disk=True), overrides:
+                voter_ids = list(
+                    Voter.objects
+                    .filter(pk__in=seed_voters(options['voters'] * len(ENGINES)))
+                    .order_by('pk')
+                    .values_list('voter_id', flat=True)
+                )
+                self.stdout.write(f"{'engine':<10}{'requests':>10}{'req/s':>10}{'session q/req':>15}{'errors':>8}")
+                for index, (label, engine) in enumerate(ENGINES):
+                    batch = voter_ids[index::len(ENGINES)]
+                    with override_settings(SESSION_ENGINE=engine):
+                        caches['sessions'].clear()
+                        self._run(label, batch, options['threads'])
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def _run(self, label, voter_ids, threads):
+        lock = threading.Lock()
+        pending = iter(voter_ids)
+        totals = {'requests': 0, 'session_queries': 0, 'errors': 0}
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        voter_id = next(pending, None)
+                    if voter_id is None:
+                        return
+                    requests, session_queries, errors = self._login(voter_id)
+                    with lock:
+                        totals['requests'] += requests
+                        totals['session_queries'] += session_queries
+                        totals['errors'] += errors
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        with Stopwatch() as timer:
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        rate = totals['requests'] / timer.elapsed if timer.elapsed else 0
+        per_request = totals['session_queries'] / totals['requests'] if totals['requests'] else 0
+        self.stdout.write(
+            f"{label:<10}{totals['requests']:>10}{rate:>10.1f}{per_request:>15.2f}{totals['errors']:>8}"
+        )
+
+    def _login(self, voter_id):
+        client = Client(raise_request_exception=False)
+        phone = f'9{zlib.crc32(voter_id.encode()) % 10 ** 9:09d}'  # One OTP per phone at a time
+        errors = 0
+
+        def post(url, payload):
+            nonlocal errors
+            response = client.post(url, data=payload, content_type='application/json')
+            errors += response.status_code != 200 or response.json().get('success') is False
+            return response
+
+        with CaptureQueriesContext(connection) as queries:
+            otp = post(reverse('login_send_otp'), {'method': 'voter_id', 'phone': phone}).json().get('otp', '')
+            post(reverse('login_verify_otp'), {'otp': otp})
+            for _ in range(2):
+                post(reverse('voter_auth'), {'voter_id': voter_id, 'phone': phone, 'otp': otp})
+        session_queries = sum('django_session' in query['sql'] for query in queries)
+        return 4, session_queries, errors
@@ -0,0 +1,117 @@
+"""
+Benchmark ballot commits/sec: one transaction per vote vs the group-commit journal
+Both modes go through the functions submit_vote uses (commit_vote and
+journal_vote), so journal mode includes the per-vote voter claim.
+Runs against a throwaway on-disk database; live data is never touched
+"""
+
+import shutil
+import tempfile
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from voting.benchmarking import Stopwatch, isolated_database, percentile, seed_candidate, seed_voters
+from voting.models import CandidateTally, Vote
+from voting.views import commit_vote, journal_vote
+from voting.vote_journal import VoteJournal
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request vote transactions with the group-commit vote journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ballots', type=int, default=2000, help='Ballots per mode')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent submitters')
+        parser.add_argument('--flush-interval-ms', type=int, default=10)
+        parser.add_argument('--flush-batch-size', type=int, default=256)
+
+    def handle(self, *args, **options):
+        ballots = options['ballots']
+
+        with isolated_database(on_disk=True) as database:
+            self.stdout.write(f"Benchmark database: {database} ({connection.vendor})")
+            candidate = seed_candidate()
+            voter_pks = seed_voters(ballots * 2)
+
+            per_request = self._run(
+                voter_pks[:ballots],
+                options['threads'],
+                lambda pk: commit_vote(pk, candidate.id, candidate.constituency),
+            )
+            self._report('Per-request transaction', ballots, per_request)
+
+            journal_dir = tempfile.mkdtemp(prefix='vote4all-journal-')
+            journal = VoteJournal(
+                journal_dir,
+                flush_interval_ms=options['flush_interval_ms'],
+                flush_batch_size=options['flush_batch_size'],
+            ).start()
+            try:
+                journaled = self._run(
+                    voter_pks[ballots:],
+                    options['threads'],
+                    lambda pk: journal_vote(journal, pk, candidate.id, candidate.constituency),
+                )
+                with Stopwatch() as drain:
+                    journal.stop()
+            finally:
+                shutil.rmtree(journal_dir, ignore_errors=True)
+            self._report('Group-commit journal', ballots, journaled)
+            self.stdout.write(f"  flusher drain after last ack: {drain.elapsed * 1000:.1f} ms")
+
+            votes = Vote.objects.count()
+            tally = CandidateTally.objects.get(candidate=candidate).votes
+            self.stdout.write(f"Votes stored: {votes}, tally: {tally} (expected {ballots * 2})")
+            if per_request['elapsed'] and journaled['elapsed']:
+                speedup = per_request['elapsed'] / journaled['elapsed']
+                self.stdout.write(self.style.SUCCESS(f"Journal speedup: {speedup:.1f}x"))
+
+    def _run(self, voter_pks, threads, submit):
+        latencies = []
+        errors = []
+        cursor = iter(voter_pks)
+        cursor_lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with cursor_lock:
+                        voter_pk = next(cursor, None)
+                    if voter_pk is None:
+                        return
+                    try:
+                        with Stopwatch() as timer:
+                            submit(voter_pk)
+                        latencies.append(timer.elapsed)
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        with Stopwatch() as total:
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        return {'elapsed': total.elapsed, 'latencies': latencies, 'errors': errors}
+
+    def _report(self, label, ballots, result):
+        rate = len(result['latencies']) / result['elapsed'] if result['elapsed'] else 0
+        latencies_ms = [latency * 1000 for latency in result['latencies']]
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f"  {len(result['latencies'])}/{ballots} ballots in {result['elapsed']:.2f}s "
+            f"= {rate:.0f} commits/sec"
+        )
+        self.stdout.write(
+            f"  latency p50={percentile(latencies_ms, 50):.2f}ms "
+            f"p95={percentile(latencies_ms, 95):.2f}ms p99={percentile(latencies_ms, 99):.2f}ms"
+        )
+        if result['errors']:
+            self.stdout.write(self.style.WARNING(
+                f"  {len(result['errors'])} errors, first: {result['errors'][0]}"
+            ))
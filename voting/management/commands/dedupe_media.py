@@ -0,0 +1,136 @@
+"""
+Move existing media into the content-addressed layout
+Every image field stored with ContentAddressedStorage is rewritten to
+point at <upload_to>/<xx>/<sha256><ext>; identical files collapse into one
+blob and the suffixed copies are removed once no row points at them, so
+an interrupted run never leaves a row without its file. StoredBlob
+reference counts are then recomputed from the rows, so the command also
+repairs counts that drifted (e.g. after files were replaced in the admin).
+"""
+
+from collections import Counter
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from voting.models import StoredBlob
+from voting.storage import ContentAddressedStorage, blob_name, content_hash, is_blob_name
+
+
+def media_fields():
+    """(model, field) for every voting file field on content-addressed storage"""
+    return [
+        (model, field)
+        for model in apps.get_app_config('voting').get_models()
+        for field in model._meta.fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Deduplicate media files into content-addressed storage and recount references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report savings without changing anything')
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='Delete files in managed directories that no row refers to')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        fields = media_fields()
+        if not fields:
+            self.stdout.write('No fields use content-addressed storage')
+            return
+        storage = fields[0][1].storage
+
+        renamed = {}  # old name -> blob name
+        references = Counter()
+        sizes = {}
+        bytes_before = 0
+        missing = 0
+
+        for model, field in fields:
+            rows = model.objects.exclude(**{field.attname: ''}).values_list('pk', field.attname)
+            for pk, name in rows.iterator():
+                if name not in renamed:
+                    if not storage.exists(name):
+                        missing += 1
+                        self.stdout.write(self.style.WARNING(f"{model.__name__} {pk} {field.name}: {name} is missing"))
+                        continue
+                    bytes_before += storage.size(name)
+                    if is_blob_name(name):
+                        renamed[name] = name
+                    else:
+                        with storage.open(name, 'rb') as content:
+                            digest, size = content_hash(content)
+                        renamed[name] = blob_name(name, digest)
+                    sizes[renamed[name]] = storage.size(name)
+                    if not dry_run:
+                        self._copy(storage, name, renamed[name])
+
+                target = renamed[name]
+                references[target] += 1
+                if target != name and not dry_run:
+                    model.objects.filter(pk=pk).update(**{field.attname: target})
+
+        bytes_after = sum(sizes.values())
+        if not dry_run:
+            self._recount(storage, references, sizes)
+            # Every row now points at its blob
+            for name, target in renamed.items():
+                if name != target:
+                    storage.delete_file(name)
+        orphans = self._orphans(storage, fields, set(renamed) | set(references), options['delete_orphans'] and not dry_run)
+
+        prefix = 'Would deduplicate' if dry_run else 'Deduplicated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {len(renamed)} files into {len(references)} blobs "
+            f"({sum(references.values())} references): {bytes_before / 2 ** 20:.2f} MiB -> "
+            f"{bytes_after / 2 ** 20:.2f} MiB"
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} references point at missing files"))
+        if orphans:
+            verb = 'Deleted' if options['delete_orphans'] and not dry_run else 'Found'
+            self.stdout.write(f"{verb} {len(orphans)} unreferenced files ({sum(orphans.values()) / 2 ** 20:.2f} MiB)")
+
+    def _copy(self, storage, name, target):
+        """Store the blob under its new name; the original stays until the rows are updated"""
+        if name == target or storage.exists(target):
+            return
+        with storage.open(name, 'rb') as content:
+            storage._write_blob(target, content)
+
+    def _recount(self, storage, references, sizes):
+        with transaction.atomic():
+            existing = {blob.name: blob for blob in StoredBlob.objects.all()}
+            StoredBlob.objects.exclude(name__in=list(references)).delete()
+            for name, count in references.items():
+                blob = existing.get(name)
+                if blob is None:
+                    StoredBlob.objects.create(
+                        name=name, sha256=os.path.splitext(os.path.basename(name))[0],
+                        size=sizes[name], refcount=count,
+                    )
+                elif blob.refcount != count:
+                    StoredBlob.objects.filter(pk=blob.pk).update(refcount=count)
+
+    def _orphans(self, storage, fields, referenced, delete):
+        """Files under the managed upload directories that no row refers to"""
+        orphans = {}
+        directories = {field.upload_to.rstrip('/') for model, field in fields if isinstance(field.upload_to, str)}
+        for directory in sorted(directories):
+            if not storage.exists(directory):
+                continue
+            for root, dirnames, filenames in os.walk(storage.path(directory)):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                    if name in referenced:
+                        continue
+                    orphans[name] = os.path.getsize(path)
+                    if delete:
+                        storage.delete_file(name)
+        return orphans
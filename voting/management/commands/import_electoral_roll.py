@@ -0,0 +1,86 @@
+"""
+Import an electoral roll (CSV or JSONL) into User, Voter and optionally RegisteredUser
+Streams the file in batches: workers validate batch N+1 while the main
+process inserts batch N, and only a bounded number of batches is in
+flight, so memory stays constant for rolls of millions of rows. Rejected
+rows are written with their line number and reason to a JSONL file.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from voting.electoral_roll import batches, get_writer, insert_batch, parse_batch, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import an electoral roll from CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Roll file (.csv, .jsonl)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Validation processes')
+        parser.add_argument('--registrations', action='store_true',
+                            help='Also create approved RegisteredUser rows (requires the registration columns)')
+        parser.add_argument('--rejects', help='Reject file (default: <path>.rejects.jsonl)')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        registrations = options['registrations']
+        writer = None if options['dry_run'] else get_writer(registrations, use_copy=not options['no_copy'])
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+        self.counts = {'read': 0, 'imported': 0, 'rejected': 0}
+        self.started = time.monotonic()
+        self.last_report = self.started
+        if writer is not None:
+            self.stdout.write(f"Importing {path} with {type(writer).__name__} ({connection.vendor})")
+
+        max_in_flight = options['workers'] * 2
+        with open(rejects_path, 'w') as rejects_file, ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            pending = set()
+            for batch in batches(read_rows(path, options['format']), options['batch_size']):
+                self.counts['read'] += len(batch)
+                pending.add(pool.submit(parse_batch, batch, registrations))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._store(done, writer, rejects_file)
+            self._store(pending, writer, rejects_file)
+
+        elapsed = time.monotonic() - self.started
+        rate = self.counts['read'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {self.counts['read']} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec): "
+            f"{self.counts['imported']} {'valid' if writer is None else 'imported'}, "
+            f"{self.counts['rejected']} rejected"
+        ))
+        if self.counts['rejected']:
+            self.stdout.write(f"Rejected rows written to {rejects_path}")
+
+    def _store(self, futures, writer, rejects_file):
+        for future in futures:
+            valid, rejects = future.result()
+            existing = insert_batch(writer, valid) if writer is not None else []
+            rejects += existing
+            self.counts['imported'] += len(valid) - len(existing)
+            self.counts['rejected'] += len(rejects)
+            for line_number, row, reason in rejects:
+                rejects_file.write(json.dumps({'line': line_number, 'reason': reason, 'row': row}, default=str) + '\n')
+        self._progress()
+
+    def _progress(self):
+        now = time.monotonic()
+        if now - self.last_report >= 10:
+            self.last_report = now
+            rate = self.counts['read'] / (now - self.started)
+            self.stdout.write(f"  {self.counts['read']:,} rows read, {self.counts['imported']:,} imported, "
+                              f"{rate:,.0f} rows/sec")
@@ -0,0 +1,123 @@
+"""
+Load test for the live results SSE endpoint
+Opens many idle connections against the in-process ASGI application,
+measures memory per connection and confirms the aggregator performs one
+database read per tick regardless of the number of clients
+"""
+
+import asyncio
+import resource
+import tracemalloc
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from voting import live_results
+from voting.benchmarking import isolated_database, seed_candidate, seed_voters
+from voting.tallies import record_vote
+
+
+class Command(BaseCommand):
+    help = 'Measure memory per idle connection on the live results stream'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--ticks', type=int, default=5, help='Ticks to observe once connected')
+        parser.add_argument('--tick-seconds', type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        config = {
+            'TICK_SECONDS': options['tick_seconds'],
+            'HEARTBEAT_SECONDS': 60,
+            'CLIENT_QUEUE_SIZE': 4,
+            'MAX_STREAM_SECONDS': 3600,
+        }
+        overrides = override_settings(LIVE_RESULTS=config, DEBUG=False, ALLOWED_HOSTS=['localhost'])
+        with isolated_database(on_disk=True), overrides:
+            candidate = seed_candidate()
+            voter_pks = seed_voters(options['ticks'] * 10)
+            live_results._aggregator = None
+            asyncio.run(self._run(options, candidate, voter_pks))
+
+    async def _run(self, options, candidate, voter_pks):
+        from asgiref.sync import sync_to_async
+
+        app = ASGIHandler()
+        path = reverse('live_results_stream')
+        connections = options['connections']
+        received = [0] * connections
+        first_chunk = [asyncio.Event() for _ in range(connections)]
+        closed = asyncio.Event()
+        failures = []
+
+        def client(index):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': b'', 'root_path': '', 'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 40000 + index % 20000), 'server': ('localhost', 80),
+            }
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await closed.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start' and message['status'] != 200:
+                    failures.append(message['status'])
+                    first_chunk[index].set()
+                if message['type'] == 'http.response.body' and message.get('body'):
+                    received[index] += 1
+                    if b'event: snapshot' in message['body']:
+                        first_chunk[index].set()
+
+            return app(scope, receive, send)
+
+        tracemalloc.start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        baseline = tracemalloc.take_snapshot()
+
+        tasks = [asyncio.create_task(client(i)) for i in range(connections)]
+        await asyncio.wait_for(asyncio.gather(*(event.wait() for event in first_chunk)), timeout=300)
+
+        if failures:
+            closed.set()
+            raise CommandError(f"{len(failures)} connections failed, first status {failures[0]}")
+
+        connected = tracemalloc.take_snapshot()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats = connected.compare_to(baseline, 'filename')
+        allocated = sum(stat.size_diff for stat in stats)
+
+        # Cast votes while everyone is connected: reads must track ticks, not clients
+        aggregator = live_results.get_aggregator()
+        reads_before = aggregator.reads
+        started = asyncio.get_running_loop().time()
+        for index, _ in enumerate(voter_pks, start=1):
+            await sync_to_async(record_vote, thread_sensitive=False)(candidate.id, candidate.constituency)
+            if index % 10 == 0:
+                await asyncio.sleep(options['tick_seconds'])
+        await asyncio.sleep(options['tick_seconds'] * 2)
+        reads = aggregator.reads - reads_before
+        ticks = (asyncio.get_running_loop().time() - started) / options['tick_seconds']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Live results stream'))
+        self.stdout.write(f"  connections:            {aggregator.subscriber_count}/{connections}")
+        self.stdout.write(f"  python heap growth:     {allocated / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"  heap per connection:    {allocated / connections / 1024:.1f} KiB")
+        self.stdout.write(f"  peak RSS growth:        {(rss_after - rss_before) / 1024:.1f} MiB")
+        self.stdout.write(f"  DB reads while loaded:  {reads} in {ticks:.1f} tick intervals")
+        self.stdout.write(f"  chunks per connection:  {sum(received) / connections:.1f}")
+
+        tracemalloc.stop()
+        closed.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,46 @@
+"""
+Create voter accounts for approved registrations
+Provisions every approved registration that has no linked voter yet, in
+batches, e.g. after approving registrations with a queryset update or
+restoring them from a backup.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from voting.models import RegisteredUser
+from voting.provisioning import provision_registrations
+
+
+class Command(BaseCommand):
+    help = 'Create and link User and Voter accounts for approved registrations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Registrations per transaction')
+        parser.add_argument('--approve', action='store_true',
+                            help='Also approve (and mark verified) registrations with a verified phone')
+
+    def handle(self, *args, **options):
+        if options['approve']:
+            approved = RegisteredUser.objects.filter(phone_verified=True, is_approved=False).update(
+                is_approved=True, documents_verified=True)
+            self.stdout.write(f"Approved {approved} registrations")
+
+        registration_ids = list(
+            RegisteredUser.objects.filter(is_approved=True, linked_voter__isnull=True)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        started = time.perf_counter()
+        stats = provision_registrations(registration_ids, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        if stats['conflicts']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['conflicts']} registrations skipped: username already belongs to another voter"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {stats['provisioned']} registrations ({stats['users_created']} users, "
+            f"{stats['voters_created']} voters created) in {elapsed:.1f}s "
+            f"({stats['provisioned'] / max(elapsed, 1e-9):.0f}/s)"
+        ))
@@ -0,0 +1,43 @@
+"""
+Rebuild the CandidateTally read model from the Vote table
+Run after restoring a backup or whenever tallies are suspected to have drifted
+"""
+
+from django.core.management.base import BaseCommand
+
+from voting.tallies import count_votes, rebuild_tallies, stored_tallies
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-candidate vote tallies from the Vote table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report differences without rewriting the tally table',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            counted = count_votes()
+            stored = stored_tallies()
+            mismatches = 0
+            for key in sorted(set(counted) | set(stored), key=str):
+                if counted.get(key, 0) != stored.get(key, 0):
+                    mismatches += 1
+                    candidate_id, constituency = key
+                    self.stdout.write(
+                        f"Candidate {candidate_id} in {constituency}: "
+                        f"tally={stored.get(key, 0)} votes={counted.get(key, 0)}"
+                    )
+            if mismatches:
+                self.stdout.write(self.style.WARNING(f"{mismatches} tally rows out of date"))
+            else:
+                self.stdout.write(self.style.SUCCESS('Tallies match the Vote table'))
+            return
+
+        result = rebuild_tallies()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {result['rows']} tally rows from {result['votes']} votes"
+        ))
@@ -0,0 +1,166 @@
+"""
+Independent parallel recount of the Vote table
+Splits Vote into primary-key ranges, counts each range in a process pool
+by streaming (candidate, constituency) pairs, merges the partial counts
+and compares them with the CandidateTally read model and the has_voted
+flags on Voter. Exits non-zero when anything disagrees.
+"""
+
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Max, Min
+
+from voting.models import Vote, Voter
+from voting.tallies import partition_ranges, replace_tallies, stored_tallies
+
+
+def _init_worker():
+    """Prepare a pool process: Django must be set up and own fresh connections"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def count_partition(low, high, chunk_size):
+    """
+    Count votes with low <= pk < high
+
+    Returns:
+        tuple: (Counter keyed by (candidate_id, constituency), rows read)
+    """
+    counts = Counter()
+    rows = (
+        Vote.objects
+        .filter(pk__gte=low, pk__lt=high)
+        .values_list('candidate_id', 'voter__constituency')
+        .iterator(chunk_size=chunk_size)
+    )
+    for key in rows:
+        counts[key] += 1
+    return counts, sum(counts.values())
+
+
+class Command(BaseCommand):
+    help = 'Recount the Vote table in parallel and verify stored tallies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Counting processes (0 counts in this process)',
+        )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=None,
+            help='Primary-key ranges to split Vote into (default: 4 per worker)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows fetched per round-trip')
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Overwrite CandidateTally with the recount when they differ',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            workers = 0  # Other processes cannot see an in-memory database
+
+        bounds = Vote.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        started = time.perf_counter()
+
+        if bounds['low'] is None:
+            counted, rows = Counter(), 0
+        else:
+            partitions = options['partitions'] or max(1, workers) * 4
+            ranges = partition_ranges(bounds['low'], bounds['high'], partitions)
+            counted, rows = self._count(ranges, workers, options['chunk_size'])
+
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Recounted {rows} votes in {elapsed:.2f}s ({rate:,.0f} rows/sec, "
+            f"{workers or 'no'} worker processes)"
+        )
+
+        tally_mismatches, marked_mismatches = self._report(counted, stored_tallies())
+
+        if not tally_mismatches and not marked_mismatches:
+            self.stdout.write(self.style.SUCCESS('Recount matches stored tallies'))
+            return
+
+        if tally_mismatches and options['fix']:
+            replace_tallies(counted)
+            self.stdout.write(self.style.SUCCESS('CandidateTally replaced with recount'))
+            tally_mismatches = 0
+
+        if tally_mismatches:
+            raise CommandError(f"{tally_mismatches} tally discrepancies found (rerun with --fix to repair tallies)")
+        if marked_mismatches:
+            # --fix only rewrites tallies; has_voted is not derived from the count
+            raise CommandError(f"{marked_mismatches} constituencies where voters_marked differs from the recount "
+                               f"(not repaired by --fix)")
+
+    def _count(self, ranges, workers, chunk_size):
+        counted = Counter()
+        rows = 0
+
+        if not workers:
+            for low, high in ranges:
+                partial, read = count_partition(low, high, chunk_size)
+                counted.update(partial)
+                rows += read
+            return counted, rows
+
+        # Children must not inherit this process's open connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(count_partition, low, high, chunk_size) for low, high in ranges]
+            for future in as_completed(futures):
+                partial, read = future.result()
+                counted.update(partial)
+                rows += read
+        return counted, rows
+
+    def _report(self, counted, stored):
+        voters_marked = dict(
+            Voter.objects
+            .filter(has_voted=True)
+            .values_list('constituency')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+
+        by_constituency = defaultdict(lambda: {'recount': 0, 'tally': 0, 'candidates': []})
+        for key in set(counted) | set(stored):
+            candidate_id, constituency = key
+            summary = by_constituency[constituency]
+            summary['recount'] += counted.get(key, 0)
+            summary['tally'] += stored.get(key, 0)
+            if counted.get(key, 0) != stored.get(key, 0):
+                summary['candidates'].append((candidate_id, counted.get(key, 0), stored.get(key, 0)))
+        for constituency in voters_marked:
+            by_constituency[constituency]
+
+        tally_mismatches = marked_mismatches = 0
+        for constituency in sorted(by_constituency):
+            summary = by_constituency[constituency]
+            marked = voters_marked.get(constituency, 0)
+            ok = not summary['candidates'] and marked == summary['recount']
+            line = (
+                f"{constituency}: recount={summary['recount']} tally={summary['tally']} "
+                f"voters_marked={marked}"
+            )
+            self.stdout.write(line if ok else self.style.WARNING(line))
+            for candidate_id, recount, tally in sorted(summary['candidates']):
+                self.stdout.write(f"    candidate {candidate_id}: recount={recount} tally={tally}")
+            tally_mismatches += len(summary['candidates'])
+            marked_mismatches += marked != summary['recount']
+        return tally_mismatches, marked_mismatches
@@ -0,0 +1,31 @@
+"""
+Replay vote journals left behind by crashed worker processes
+Safe to run at any time: journals owned by live workers are skipped and
+ballots that already reached the Vote table are not inserted twice
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voting.vote_journal import recover_orphaned_journals
+
+
+class Command(BaseCommand):
+    help = 'Apply unflushed ballots from orphaned vote journal files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            default=None,
+            help='Journal directory (defaults to VOTE_JOURNAL["DIRECTORY"])',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or getattr(settings, 'VOTE_JOURNAL', {}).get(
+            'DIRECTORY', settings.BASE_DIR / 'vote_journal'
+        )
+        read, inserted = recover_orphaned_journals(str(directory), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {read} journal entries, inserted {inserted} votes"
+        ))
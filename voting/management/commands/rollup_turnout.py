@@ -0,0 +1,30 @@
+"""
+Coarse-grain the turnout time series
+Folds minute buckets into hours and old hour buckets into days. Safe to
+run from cron every few minutes while voting is in progress.
+"""
+
+from django.core.management.base import BaseCommand
+
+from voting.turnout import rebuild_turnout, roll_up_turnout
+
+
+class Command(BaseCommand):
+    help = 'Roll up turnout buckets (minute -> hour -> day)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recreate minute buckets from the Vote table before rolling up',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            result = rebuild_turnout()
+            self.stdout.write(f"Rebuilt {result['buckets']} minute buckets from {result['votes']} votes")
+
+        folded = roll_up_turnout()
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {folded['minute']} minute buckets into hours and {folded['hour']} hour buckets into days"
+        ))
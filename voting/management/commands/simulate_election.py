@@ -0,0 +1,243 @@
+"""
+Election-day end-to-end load generator
+Simulates voters walking the full flow with the in-process test client:
+
+    user_register_submit -> send_otp -> verify_otp -> voter_auth -> vote_page -> submit_vote
+
+and reports p50/p95/p99 latency and database queries for every step.
+vote_page is reported as skipped when voting/vote.html is not installed.
+By default it runs against a throwaway copy of the database; pass
+--current-database to drive the configured database (e.g. a local
+Postgres loaded for capacity planning).
+"""
+
+from collections import defaultdict
+from io import BytesIO
+import random
+import shutil
+import tempfile
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from voting.ballot_cache import get_ballot
+from voting.benchmarking import Stopwatch, isolated_database, percentile, seed_candidate
+
+STEPS = ['user_register_submit', 'send_otp', 'verify_otp', 'voter_auth', 'vote_page', 'submit_vote']
+
+
+def _document_image():
+    """Small PNG standing in for an uploaded ID document"""
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (64, 40), (200, 200, 200)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Simulate voters going through registration, login and voting; report per-step latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--constituencies', type=int, default=4)
+        parser.add_argument('--candidates', type=int, default=5, help='Candidates per constituency')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--current-database',
+            action='store_true',
+            help='Run against the configured database instead of a throwaway copy',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.image = _document_image()
+        media_root = tempfile.mkdtemp(prefix='vote4all-loadgen-media-')
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            # Simulated voters read their code from the response instead of an SMS
+            OTP_SERVICE={**getattr(settings, 'OTP_SERVICE', {}), 'EXPOSE_CODES': True},
+            # Every simulated voter shares one client address
+            RATE_LIMIT={**getattr(settings, 'RATE_LIMIT', {}), 'ENABLED': False},
+        )
+
+        try:
+            with overrides:
+                if options['current_database']:
+                    self._simulate(options)
+                else:
+                    with isolated_database(on_disk=True):
+                        self._simulate(options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def _simulate(self, options):
+        # Pages without an installed template would only measure a 500
+        self.skipped = set()
+        try:
+            get_template('voting/vote.html')
+        except TemplateDoesNotExist:
+            self.skipped.add('vote_page')
+
+        run_id = uuid.uuid4().hex[:6].upper()
+        constituencies = [f'Loadgen {run_id} {i + 1}' for i in range(options['constituencies'])]
+        for constituency in constituencies:
+            for i in range(options['candidates']):
+                seed_candidate(constituency, name=f'Candidate {i + 1}')
+
+        samples = defaultdict(list)
+        errors = defaultdict(list)
+        completed = []
+        lock = threading.Lock()
+        next_voter = iter(range(options['voters']))
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        index = next(next_voter, None)
+                    if index is None:
+                        return
+                    constituency = constituencies[index % len(constituencies)]
+                    results, failures, finished = self._voter_journey(run_id, index, constituency)
+                    with lock:
+                        for step, elapsed, queries in results:
+                            samples[step].append((elapsed, queries))
+                        for step, reason in failures:
+                            errors[step].append(reason)
+                        if finished:
+                            completed.append(index)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        with Stopwatch() as total:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self._report(options, samples, errors, len(completed), total.elapsed)
+
+    def _voter_journey(self, run_id, index, constituency):
+        """
+        Walk one voter through every step
+
+        Returns:
+            tuple: ([(step, seconds, queries)], [(step, reason)], finished)
+        """
+        client = Client(raise_request_exception=False)
+        results = []
+        failures = []
+        epic = f'{run_id}{index:07d}'
+        phone = f'9{self.random.randrange(10 ** 9):09d}'
+        aadhaar = f'{self.random.randrange(10 ** 11, 10 ** 12)}'
+
+        def call(step, method, url, **kwargs):
+            with CaptureQueriesContext(connection) as queries, Stopwatch() as timer:
+                response = getattr(client, method)(url, **kwargs)
+            results.append((step, timer.elapsed, len(queries)))
+            return response
+
+        def failed(step, response):
+            reason = f'HTTP {response.status_code}'
+            if response.get('Content-Type', '').startswith('application/json'):
+                body = response.json()
+                reason = body.get('error') or body.get('message') or reason
+            failures.append((step, reason))
+            return results, failures, False
+
+        response = call('user_register_submit', 'post', reverse('user_register_submit'), data={
+            'full_name': f'Load Voter {index}',
+            'username': f'loadgen_{epic.lower()}',
+            'date_of_birth': '1990-01-01',
+            'gender': 'other',
+            'voter_id_epic': epic,
+            'aadhaar_number': aadhaar,
+            'guardian_name': 'Load Guardian',
+            'guardian_relation': 'father',
+            'phone_number': phone,
+            'address': 'Load test address',
+            'constituency': constituency,
+            'aadhaar_image': SimpleUploadedFile('aadhaar.png', self.image, 'image/png'),
+            'voter_id_image': SimpleUploadedFile('voter_id.png', self.image, 'image/png'),
+        })
+        if response.status_code != 200 or not response.json().get('success'):
+            return failed('user_register_submit', response)
+
+        response = call('send_otp', 'post', reverse('send_otp'), data='{}', content_type='application/json')
+        if response.status_code != 200 or not response.json().get('success'):
+            return failed('send_otp', response)
+        otp = response.json()['otp']
+
+        response = call('verify_otp', 'post', reverse('verify_otp'),
+                        data={'otp': otp}, content_type='application/json')
+        if response.status_code != 200 or not response.json().get('success'):
+            return failed('verify_otp', response)
+
+        response = call('voter_auth', 'post', reverse('voter_auth'),
+                        data={'voter_id': epic, 'phone': phone, 'otp': otp}, content_type='application/json')
+        if response.status_code != 200:
+            return failed('voter_auth', response)
+
+        # The page render is reported but does not end the journey: the
+        # ballot itself reaches clients as JSON
+        if 'vote_page' not in self.skipped:
+            response = call('vote_page', 'get', reverse('vote'))
+            if response.status_code != 200:
+                failed('vote_page', response)
+
+        candidate = self.random.choice(get_ballot(constituency).entries)
+        response = call('submit_vote', 'post', reverse('submit_vote'),
+                        data={'candidate_id': candidate['id']}, content_type='application/json')
+        if response.status_code != 200:
+            return failed('submit_vote', response)
+
+        return results, failures, True
+
+    def _report(self, options, samples, errors, completed, elapsed):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['voters']} voters, concurrency {options['concurrency']}, "
+            f"database: {connection.vendor}"
+        ))
+        self.stdout.write(
+            f"{'step':<22}{'ok':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'avg q':>8}{'max q':>7}"
+        )
+        for step in STEPS:
+            if step in self.skipped:
+                self.stdout.write(self.style.WARNING(f"{step:<22}skipped: template not installed"))
+                continue
+            timings = [elapsed_s * 1000 for elapsed_s, _ in samples[step]]
+            queries = [count for _, count in samples[step]]
+            failures = len(errors[step])
+            ok = len(timings) - failures
+            avg_queries = sum(queries) / len(queries) if queries else 0
+            self.stdout.write(
+                f"{step:<22}{ok:>7}{failures:>6}{percentile(timings, 50):>10.1f}"
+                f"{percentile(timings, 95):>10.1f}{percentile(timings, 99):>10.1f}"
+                f"{avg_queries:>8.1f}{max(queries, default=0):>7}"
+            )
+
+        rate = completed / elapsed if elapsed else 0
+        self.stdout.write(f"Completed journeys: {completed}/{options['voters']} in {elapsed:.1f}s ({rate:.1f} voters/sec)")
+
+        for step in STEPS:
+            if errors[step]:
+                reasons = defaultdict(int)
+                for reason in errors[step]:
+                    reasons[reason] += 1
+                summary = ', '.join(f'{reason} x{count}' for reason, count in reasons.items())
+                self.stdout.write(self.style.WARNING(f"  {step} failures: {summary}"))
@@ -0,0 +1,20 @@
+"""
+Delete expired and used OTP rows in batches
+Schedule every few minutes; each batch is a short transaction so the
+sweep never blocks OTP issue or verification for long.
+"""
+
+from django.core.management.base import BaseCommand
+
+from voting.otp_service import sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired and used one-time passwords'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired or used OTPs"))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0006_userliteracyprofile_simplifiedballotcontent_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('constituency', models.CharField(max_length=200)),
+                ('votes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='voting.candidate')),
+            ],
+            options={
+                'verbose_name': 'Candidate Tally',
+                'verbose_name_plural': 'Candidate Tallies',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='candidatetally',
+            index=models.Index(fields=['constituency'], name='voting_cand_constit_5f354e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='candidatetally',
+            unique_together={('candidate', 'constituency')},
+        ),
+    ]
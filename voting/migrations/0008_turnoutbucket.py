@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0007_candidatetally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TurnoutBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('constituency', models.CharField(max_length=200)),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], default='minute', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('votes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Turnout Bucket',
+                'verbose_name_plural': 'Turnout Buckets',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='turnoutbucket',
+            index=models.Index(fields=['granularity', 'bucket_start'], name='voting_turn_granula_541560_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='turnoutbucket',
+            unique_together={('constituency', 'granularity', 'bucket_start')},
+        ),
+    ]
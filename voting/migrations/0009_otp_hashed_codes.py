@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0008_turnoutbucket'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='otp',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='otp_code',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['phone_number', 'expires_at'], name='voting_otp_phone_n_847042_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['expires_at'], name='voting_otp_expires_4ba4b1_idx'),
+        ),
+    ]
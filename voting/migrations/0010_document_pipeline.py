@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0009_otp_hashed_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentProcessingLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=30)),
+                ('status', models.CharField(choices=[('processed', 'Processed'), ('rejected', 'Rejected'), ('failed', 'Failed')], max_length=10)),
+                ('original_format', models.CharField(blank=True, max_length=10)),
+                ('original_bytes', models.PositiveIntegerField(default=0)),
+                ('processed_bytes', models.PositiveIntegerField(default=0)),
+                ('thumbnail_bytes', models.PositiveIntegerField(default=0)),
+                ('original_size', models.CharField(blank=True, max_length=20)),
+                ('processed_size', models.CharField(blank=True, max_length=20)),
+                ('duration_ms', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('processed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document Processing Log',
+                'verbose_name_plural': 'Document Processing Logs',
+            },
+        ),
+        migrations.AddField(
+            model_name='registereduser',
+            name='aadhaar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='user_documents/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='registereduser',
+            name='voter_id_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='user_documents/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='documentprocessinglog',
+            name='registration',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_logs', to='voting.registereduser'),
+        ),
+        migrations.AddIndex(
+            model_name='documentprocessinglog',
+            index=models.Index(fields=['status', 'processed_at'], name='voting_docu_status_8bbd17_idx'),
+        ),
+    ]
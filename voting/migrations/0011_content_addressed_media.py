@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:08
+
+from django.db import migrations, models
+import voting.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0010_document_pipeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Blob',
+                'verbose_name_plural': 'Stored Blobs',
+            },
+        ),
+        migrations.AlterField(
+            model_name='candidate',
+            name='photo',
+            field=models.ImageField(max_length=255, storage=voting.storage.media_storage, upload_to='candidate_photos/'),
+        ),
+        migrations.AlterField(
+            model_name='party',
+            name='symbol',
+            field=models.ImageField(max_length=255, storage=voting.storage.media_storage, upload_to='party_symbols/'),
+        ),
+        migrations.AlterField(
+            model_name='registereduser',
+            name='aadhaar_image',
+            field=models.ImageField(help_text='Upload Aadhar card image', max_length=255, storage=voting.storage.media_storage, upload_to='user_documents/aadhaar/'),
+        ),
+        migrations.AlterField(
+            model_name='registereduser',
+            name='aadhaar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, storage=voting.storage.media_storage, upload_to='user_documents/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='registereduser',
+            name='voter_id_image',
+            field=models.ImageField(help_text='Upload Voter ID image', max_length=255, storage=voting.storage.media_storage, upload_to='user_documents/voter_id/'),
+        ),
+        migrations.AlterField(
+            model_name='registereduser',
+            name='voter_id_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, storage=voting.storage.media_storage, upload_to='user_documents/thumbnails/'),
+        ),
+    ]
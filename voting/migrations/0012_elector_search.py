@@ -0,0 +1,62 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+
+# Expression indexes for voting.elector_search: name and constituency
+# queries filter on UPPER(column) with pg_trgm's % operator and LIKE.
+# EPIC prefixes use the voter_id_like index Django already creates.
+TRIGRAM_INDEXES = {
+    'voting_voter_full_name_trgm': 'full_name',
+    'voting_voter_constituency_trgm': 'constituency',
+}
+
+
+def backfill_names(apps, schema_editor):
+    Voter = apps.get_model('voting', 'Voter')
+    RegisteredUser = apps.get_model('voting', 'RegisteredUser')
+    User = apps.get_model('auth', 'User')
+    registered_name = RegisteredUser.objects.filter(linked_voter=OuterRef('pk')).values('full_name')[:1]
+    account_name = User.objects.filter(pk=OuterRef('user_id')).annotate(
+        name=Trim(Concat('first_name', Value(' '), 'last_name')),
+    ).values('name')[:1]
+    Voter.objects.update(full_name=Coalesce(
+        NullIf(Subquery(registered_name), Value('')),
+        Subquery(account_name),
+        Value(''),
+    ))
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return  # Other databases use the in-process index
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON voting_voter USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0011_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='full_name',
+            field=models.CharField(blank=True, help_text='Name as on the electoral roll (searchable)', max_length=200),
+        ),
+        migrations.RunPython(backfill_names, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
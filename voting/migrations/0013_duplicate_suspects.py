@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0012_elector_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateSuspect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blocking_pass', models.CharField(help_text='Blocking key the pair was found under', max_length=20)),
+                ('score', models.FloatField()),
+                ('name_similarity', models.FloatField()),
+                ('guardian_similarity', models.FloatField()),
+                ('dob_similarity', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending review'), ('confirmed', 'Confirmed duplicate'), ('dismissed', 'Not a duplicate')], default='pending', max_length=10)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('registration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_suspects', to='voting.registereduser')),
+                ('similar_to', models.ForeignKey(help_text='The earlier registration', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='voting.registereduser')),
+            ],
+            options={
+                'verbose_name': 'Duplicate Suspect',
+                'verbose_name_plural': 'Duplicate Suspects',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='duplicatesuspect',
+            index=models.Index(fields=['status', '-score'], name='voting_dupl_status_7f25db_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='duplicatesuspect',
+            constraint=models.UniqueConstraint(fields=('registration', 'similar_to'), name='unique_duplicate_suspect_pair'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0013_duplicate_suspects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Wrong guesses, counted across workers'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0014_otp_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentprocessinglog',
+            name='image_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 
+from .storage import media_storage
+
 class RegisteredUser(models.Model):
     """Model for user registration with comprehensive voter information"""
     GENDER_CHOICES = [
@@ -40,8 +42,10 @@ class RegisteredUser(models.Model):
     constituency = models.CharField(max_length=200, help_text="Voting constituency")
     
     # Document Uploads
-    aadhaar_image = models.ImageField(upload_to='user_documents/aadhaar/', help_text="Upload Aadhar card image")
-    voter_id_image = models.ImageField(upload_to='user_documents/voter_id/', help_text="Upload Voter ID image")
+    aadhaar_image = models.ImageField(upload_to='user_documents/aadhaar/', storage=media_storage, max_length=255, help_text="Upload Aadhar card image")
+    voter_id_image = models.ImageField(upload_to='user_documents/voter_id/', storage=media_storage, max_length=255, help_text="Upload Voter ID image")
+    aadhaar_thumbnail = models.ImageField(upload_to='user_documents/thumbnails/', storage=media_storage, max_length=255, blank=True, editable=False)
+    voter_id_thumbnail = models.ImageField(upload_to='user_documents/thumbnails/', storage=media_storage, max_length=255, blank=True, editable=False)
     
     # Verification Status
     phone_verified = models.BooleanField(default=False)
@@ -62,9 +66,89 @@ class RegisteredUser(models.Model):
         verbose_name = "Registered User"
         verbose_name_plural = "Registered Users"
 
+class DocumentProcessingLog(models.Model):
+    """Outcome of the background pipeline for one uploaded document image"""
+    STATUS_CHOICES = [
+        ('processed', 'Processed'),
+        ('rejected', 'Rejected'),  # Not a valid or allowed image; original kept for review
+        ('failed', 'Failed'),
+    ]
+
+    registration = models.ForeignKey(RegisteredUser, on_delete=models.CASCADE, related_name='document_logs')
+    field = models.CharField(max_length=30)
+    image_name = models.CharField(max_length=255, blank=True)  # The upload read; rejected ones are not retried
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    original_format = models.CharField(max_length=10, blank=True)
+    original_bytes = models.PositiveIntegerField(default=0)
+    processed_bytes = models.PositiveIntegerField(default=0)
+    thumbnail_bytes = models.PositiveIntegerField(default=0)
+    original_size = models.CharField(max_length=20, blank=True)  # "WIDTHxHEIGHT"
+    processed_size = models.CharField(max_length=20, blank=True)
+    duration_ms = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.registration_id} {self.field}: {self.status}"
+
+    class Meta:
+        verbose_name = "Document Processing Log"
+        verbose_name_plural = "Document Processing Logs"
+        indexes = [
+            models.Index(fields=['status', 'processed_at']),
+        ]
+
+class DuplicateSuspect(models.Model):
+    """Two registrations that may be the same person (found by voting.duplicate_detection)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending review'),
+        ('confirmed', 'Confirmed duplicate'),
+        ('dismissed', 'Not a duplicate'),
+    ]
+
+    registration = models.ForeignKey(RegisteredUser, on_delete=models.CASCADE, related_name='duplicate_suspects')
+    similar_to = models.ForeignKey(RegisteredUser, on_delete=models.CASCADE, related_name='+',
+                                   help_text="The earlier registration")
+    blocking_pass = models.CharField(max_length=20, help_text="Blocking key the pair was found under")
+    score = models.FloatField()
+    name_similarity = models.FloatField()
+    guardian_similarity = models.FloatField()
+    dob_similarity = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    detected_at = models.DateTimeField(default=timezone.now)
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.registration_id} ~ {self.similar_to_id} ({self.score:.2f})"
+
+    class Meta:
+        verbose_name = "Duplicate Suspect"
+        verbose_name_plural = "Duplicate Suspects"
+        constraints = [
+            models.UniqueConstraint(fields=['registration', 'similar_to'], name='unique_duplicate_suspect_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score']),  # Review queue
+        ]
+
+class StoredBlob(models.Model):
+    """A content-addressed media file and how many fields refer to it (see voting.storage)"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+    class Meta:
+        verbose_name = "Stored Blob"
+        verbose_name_plural = "Stored Blobs"
+
 class Party(models.Model):
     name = models.CharField(max_length=200)
-    symbol = models.ImageField(upload_to='party_symbols/')
+    symbol = models.ImageField(upload_to='party_symbols/', storage=media_storage, max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -76,7 +160,7 @@ class Party(models.Model):
 class Candidate(models.Model):
     name = models.CharField(max_length=200)
     party = models.ForeignKey(Party, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to='candidate_photos/')
+    photo = models.ImageField(upload_to='candidate_photos/', storage=media_storage, max_length=255)
     constituency = models.CharField(max_length=200, default='Default Constituency')
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -86,6 +170,7 @@ class Candidate(models.Model):
 class Voter(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     voter_id = models.CharField(max_length=20, unique=True)
+    full_name = models.CharField(max_length=200, blank=True, help_text="Name as on the electoral roll (searchable)")
     constituency = models.CharField(max_length=200)
     phone_number = models.CharField(max_length=15, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
@@ -107,6 +192,48 @@ class Vote(models.Model):
     class Meta:
         unique_together = ['voter', 'candidate']
 
+class CandidateTally(models.Model):
+    """Running vote count per candidate and constituency, maintained alongside Vote"""
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='tallies')
+    constituency = models.CharField(max_length=200)
+    votes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.candidate.name} - {self.constituency}: {self.votes}"
+
+    class Meta:
+        verbose_name = "Candidate Tally"
+        verbose_name_plural = "Candidate Tallies"
+        unique_together = ['candidate', 'constituency']
+        indexes = [
+            models.Index(fields=['constituency']),
+        ]
+
+class TurnoutBucket(models.Model):
+    """Votes cast per constituency in one time bucket, rolled up minute -> hour -> day"""
+    GRANULARITIES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    constituency = models.CharField(max_length=200)
+    granularity = models.CharField(max_length=10, choices=GRANULARITIES, default='minute')
+    bucket_start = models.DateTimeField()
+    votes = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.constituency} {self.granularity} {self.bucket_start}: {self.votes}"
+
+    class Meta:
+        verbose_name = "Turnout Bucket"
+        verbose_name_plural = "Turnout Buckets"
+        unique_together = ['constituency', 'granularity', 'bucket_start']
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+
 class LoginSession(models.Model):
     LOGIN_TYPES = [
         ('digilocker', 'Digilocker'),
@@ -124,13 +251,14 @@ class LoginSession(models.Model):
         return f"{self.voter.voter_id} - {self.login_type} - {self.login_time}"
 
 class OTP(models.Model):
-    """Model to store OTP for phone verification"""
+    """Model to store OTP for phone verification (codes are stored HMAC-hashed, see voting.otp_service)"""
     phone_number = models.CharField(max_length=15)
-    otp_code = models.CharField(max_length=6)
+    otp_code = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_verified = models.BooleanField(default=False)
     is_used = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Wrong guesses, counted across workers")
     
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -141,10 +269,14 @@ class OTP(models.Model):
         return timezone.now() > self.expires_at
     
     def __str__(self):
-        return f"OTP for {self.phone_number} - {self.otp_code}"
+        return f"OTP for {self.phone_number}"
     
     class Meta:
-        ordering = ['-created_at']
+        # No default ordering: lookups go through the index below and never need a sort
+        indexes = [
+            models.Index(fields=['phone_number', 'expires_at']),
+            models.Index(fields=['expires_at']),  # Expiry sweeper
+        ]
 
 
 # ============================================================
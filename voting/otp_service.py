@@ -0,0 +1,173 @@
+"""
+OTP service
+Issues and verifies one-time codes. Codes are never stored in clear: the
+cache entry and the optional OTP row hold an HMAC of (purpose, phone,
+code), so a leaked table or cache dump does not reveal live codes and a
+registration code cannot be replayed on the login flow.
+
+The cache entry is the fast path. With DB_WRITE_THROUGH the OTP row is
+the authority: it counts wrong guesses for every worker, and a code only
+verifies through one indexed UPDATE on (phone_number, expires_at) that
+also checks the count, so guesses are limited whichever worker (or
+evicted cache) they land on. Without it, CACHE_ALIAS must name a cache
+shared by all workers. sweep_expired() keeps the table bounded.
+"""
+
+from datetime import timedelta
+import hashlib
+import hmac
+import logging
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OTP
+from .sms_dispatch import send_sms
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'OTP_SERVICE', {})
+
+
+def _cache():
+    return caches[_config().get('CACHE_ALIAS', 'default')]
+
+
+def _cache_key(phone_number, purpose):
+    return f'otp:{purpose}:{phone_number}'
+
+
+def expose_codes():
+    """Whether codes may be echoed in API responses (development only)"""
+    return _config().get('EXPOSE_CODES', False)
+
+
+def hash_code(phone_number, code, purpose):
+    """HMAC-SHA256 of the code, bound to the phone number and purpose"""
+    secret = (_config().get('SECRET') or settings.SECRET_KEY).encode()
+    message = f'{purpose}:{phone_number}:{code}'.encode()
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+
+def generate_code(length=None):
+    length = length or _config().get('CODE_LENGTH', 6)
+    return f'{secrets.randbelow(10 ** length):0{length}d}'
+
+
+def issue(phone_number, purpose='registration'):
+    """
+    Create a new code for the phone number, replacing any earlier one
+
+    Args:
+        phone_number: destination phone number
+        purpose: 'registration' or 'login'; codes only verify for the same purpose
+
+    Returns:
+        str: the plain code, to be delivered to the user and then forgotten
+    """
+    config = _config()
+    ttl = config.get('TTL_SECONDS', 300)
+    code = generate_code()
+    code_hash = hash_code(phone_number, code, purpose)
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+
+    _cache().set(_cache_key(phone_number, purpose), {'hash': code_hash, 'attempts': 0}, ttl)
+
+    if config.get('DB_WRITE_THROUGH', True):
+        # Earlier codes for the number stop working
+        OTP.objects.filter(phone_number=phone_number, expires_at__gt=timezone.now(), is_used=False).update(is_used=True)
+        OTP.objects.create(phone_number=phone_number, otp_code=code_hash, expires_at=expires_at)
+
+    logger.info(f"Issued {purpose} OTP for {phone_number}, valid for {ttl}s")
+    return code
+
+
+def deliver(phone_number, code):
+    """
+    Queue the code for delivery by SMS; never blocks on the gateway
+
+    Returns:
+        bool: False if the dispatch queue is full
+    """
+    minutes = max(1, _config().get('TTL_SECONDS', 300) // 60)
+    return send_sms(phone_number, f"Your Vote4All verification code is {code}. It expires in {minutes} minutes.")
+
+
+def verify(phone_number, code, purpose='registration'):
+    """
+    Check a submitted code and consume it on success
+
+    Returns:
+        bool: True if the code is valid, unexpired and unused
+    """
+    if not code or not code.isdigit():
+        return False
+
+    config = _config()
+    cache = _cache()
+    key = _cache_key(phone_number, purpose)
+    code_hash = hash_code(phone_number, code, purpose)
+    max_attempts = config.get('MAX_ATTEMPTS', 5)
+    write_through = config.get('DB_WRITE_THROUGH', True)
+    entry = cache.get(key)
+
+    if entry is not None:
+        if entry['attempts'] >= max_attempts:
+            logger.warning(f"OTP for {phone_number} locked after too many attempts")
+            return False
+        if not hmac.compare_digest(entry['hash'], code_hash):
+            entry['attempts'] += 1
+            cache.set(key, entry, config.get('TTL_SECONDS', 300))
+            if write_through:
+                _count_attempt(phone_number)
+            return False
+        cache.delete(key)
+        # Guesses made on other workers count too
+        return _consume_row(phone_number, code_hash, max_attempts) if write_through else True
+
+    # Cache miss: another worker issued it, or the entry was evicted
+    if not write_through:
+        return False
+    if _consume_row(phone_number, code_hash, max_attempts):
+        return True
+    _count_attempt(phone_number)
+    return False
+
+
+def _consume_row(phone_number, code_hash, max_attempts):
+    """Mark the matching live row used: one UPDATE on the (phone_number, expires_at) index"""
+    return OTP.objects.filter(
+        phone_number=phone_number,
+        expires_at__gt=timezone.now(),
+        otp_code=code_hash,
+        is_used=False,
+        attempts__lt=max_attempts,
+    ).update(is_used=True, is_verified=True) == 1
+
+
+def _count_attempt(phone_number):
+    OTP.objects.filter(
+        phone_number=phone_number, expires_at__gt=timezone.now(), is_used=False,
+    ).update(attempts=F('attempts') + 1)
+
+
+def sweep_expired(batch_size=5000):
+    """
+    Delete expired and used OTP rows in batches
+
+    Returns:
+        int: number of rows deleted
+    """
+    stale = Q(expires_at__lt=timezone.now()) | Q(is_used=True)
+    deleted = 0
+    while True:
+        ids = list(OTP.objects.filter(stale).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        OTP.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
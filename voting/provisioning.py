@@ -0,0 +1,135 @@
+"""
+Voter account provisioning
+An approved registration becomes a Django User plus a Voter, linked back
+through RegisteredUser.linked_voter. Accounts are created for a batch of
+registrations at a time with bulk_create, and linked with one bulk
+update, so approving a hundred thousand registrations is one job rather
+than a hundred thousand requests.
+
+Voters log in with OTP, so their accounts get an unusable password and
+nothing is hashed. Existing users and voters (matched on username and
+EPIC number) are reused, as the OTP flow always did.
+"""
+
+import logging
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import RegisteredUser, Voter
+
+logger = logging.getLogger(__name__)
+
+
+def split_name(full_name):
+    """First and last name for a User from a full name"""
+    parts = full_name.split()
+    return (parts[0] if parts else ''), ' '.join(parts[1:])
+
+
+def _new_user(registration, password):
+    first_name, last_name = split_name(registration.full_name)
+    return User(
+        username=registration.username,
+        first_name=first_name[:150],
+        last_name=last_name[:150],
+        email=registration.email or '',
+        password=password,
+        is_active=True,
+    )
+
+
+def _create_users(registrations, password):
+    """Users for the registrations, creating the missing ones; keyed by username"""
+    usernames = [registration.username for registration in registrations]
+    users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+    missing = [_new_user(registration, password) for registration in registrations
+               if registration.username not in users]
+    created = User.objects.bulk_create(missing)
+    if created and created[0].pk is None:
+        # Backends that cannot return ids from a bulk insert
+        created = User.objects.filter(username__in=[user.username for user in missing])
+    users.update((user.username, user) for user in created)
+    return users, len(missing)
+
+
+def _provision_chunk(registration_ids, password):
+    stats = {'provisioned': 0, 'users_created': 0, 'voters_created': 0, 'conflicts': 0}
+    with transaction.atomic():
+        registrations = list(
+            RegisteredUser.objects.select_for_update()
+            .filter(pk__in=registration_ids, is_approved=True, linked_voter__isnull=True)
+            .order_by('pk')
+        )
+        if not registrations:
+            return stats
+
+        epics = set(Voter.objects.filter(
+            voter_id__in=[registration.voter_id_epic for registration in registrations]
+        ).values_list('voter_id', flat=True))
+        pending = [registration for registration in registrations if registration.voter_id_epic not in epics]
+        users, stats['users_created'] = _create_users(pending, password)
+
+        # A reused user may already own a voter under another EPIC number
+        users_with_voters = set(Voter.objects.filter(
+            user__in=[user.pk for user in users.values()]).values_list('user_id', flat=True))
+        new_voters = []
+        for registration in pending:
+            user = users[registration.username]
+            if user.pk in users_with_voters:
+                stats['conflicts'] += 1
+                logger.warning(f"Not provisioning registration {registration.pk}: user "
+                               f"{registration.username} already has a voter account")
+                continue
+            users_with_voters.add(user.pk)
+            new_voters.append(Voter(
+                user=user,
+                voter_id=registration.voter_id_epic,
+                full_name=registration.full_name,
+                constituency=registration.constituency,
+                phone_number=registration.phone_number,
+                date_of_birth=registration.date_of_birth,
+            ))
+        Voter.objects.bulk_create(new_voters)
+        epics.update(voter.voter_id for voter in new_voters)
+        stats['voters_created'] = len(new_voters)
+
+        # One UPDATE joins each registration to its voter by EPIC number;
+        # bulk_update() would send a CASE arm per row instead
+        linked_ids = [registration.pk for registration in registrations if registration.voter_id_epic in epics]
+        stats['provisioned'] = RegisteredUser.objects.filter(pk__in=linked_ids).update(
+            linked_voter=Subquery(Voter.objects.filter(voter_id=OuterRef('voter_id_epic')).values('pk')[:1]),
+            updated_at=timezone.now(),
+        )
+    return stats
+
+
+def provision_registrations(registration_ids, batch_size=1000):
+    """
+    Create and link voter accounts for approved registrations
+
+    Registrations that are not approved or already have a voter are
+    skipped, so the same ids can safely be provisioned twice.
+
+    Args:
+        registration_ids: RegisteredUser primary keys
+        batch_size: registrations per transaction
+
+    Returns:
+        dict: provisioned, users_created, voters_created and conflicts counts
+    """
+    registration_ids = list(registration_ids)
+    # Voters sign in with OTP; one unusable password serves every account
+    password = make_password(None)
+    totals = {'provisioned': 0, 'users_created': 0, 'voters_created': 0, 'conflicts': 0}
+    for start in range(0, len(registration_ids), batch_size):
+        stats = _provision_chunk(registration_ids[start:start + batch_size], password)
+        for name, count in stats.items():
+            totals[name] += count
+    if totals['provisioned'] or totals['conflicts']:
+        logger.info(f"Provisioned {totals['provisioned']} voters ({totals['voters_created']} new, "
+                    f"{totals['conflicts']} conflicts)")
+    return totals
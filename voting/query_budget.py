@@ -0,0 +1,206 @@
+"""
+Per-view query budgets
+Records the number of queries and the database time spent by every view,
+compares them with a declared budget and detects N+1 patterns (the same
+query shape executed over and over within one request).
+
+Budgets come from the `query_budget` decorator on the view or, failing
+that, from settings.QUERY_BUDGETS['VIEWS'] keyed by URL name. Under the
+test runner a violation raises QueryBudgetExceeded so the offending test
+fails; in production it is logged as a warning.
+"""
+
+from collections import Counter
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Literals and IN lists vary between otherwise identical queries
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+class QueryBudgetExceeded(Exception):
+    """A view issued more queries than its budget allows"""
+
+
+def _config():
+    return getattr(settings, 'QUERY_BUDGETS', {})
+
+
+def query_budget(queries=None, db_ms=None, repeats=None):
+    """
+    Declare the query budget of a view
+
+    Args:
+        queries: maximum number of queries per request
+        db_ms: maximum database time per request in milliseconds
+        repeats: how often one query shape may run before it is reported as N+1
+
+    Example:
+        @query_budget(queries=4)
+        def voter_info(request): ...
+    """
+    def decorator(view_func):
+        view_func.query_budget = {'queries': queries, 'db_ms': db_ms, 'repeats': repeats}
+        return view_func
+    return decorator
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape so repeated lookups compare equal"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """execute_wrapper that counts queries, time and shapes for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+
+    @property
+    def db_ms(self):
+        return self.seconds * 1000
+
+    def repeated(self, threshold):
+        """Query shapes executed at least `threshold` times"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class ViewStats:
+    """Running per-view totals, kept per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, recorder):
+        with self._lock:
+            stats = self._views.setdefault(view_name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'violations': 0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            stats['db_ms'] += recorder.db_ms
+
+    def violation(self, view_name):
+        with self._lock:
+            if view_name in self._views:
+                self._views[view_name]['violations'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+def resolve_budget(resolver_match):
+    """
+    Budget for the resolved view: decorator first, then settings, then default
+
+    Returns:
+        dict with 'queries', 'db_ms' and 'repeats' (values may be None)
+    """
+    config = _config()
+    budget = {
+        'queries': None,
+        'db_ms': config.get('DEFAULT_DB_MS'),
+        'repeats': config.get('REPEAT_THRESHOLD', 5),
+    }
+
+    declared = getattr(resolver_match.func, 'query_budget', None)
+    if declared is None:
+        declared = config.get('VIEWS', {}).get(resolver_match.url_name, config.get('DEFAULT_QUERIES'))
+    if not isinstance(declared, dict):
+        declared = {'queries': declared}
+
+    budget.update({key: value for key, value in declared.items() if value is not None})
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Measure queries per request and enforce the view's budget
+
+    DB time is only ever logged: it depends on the machine, so it would
+    make tests flaky. Query counts and N+1 shapes are deterministic and
+    fail tests when QUERY_BUDGETS['STRICT'] is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _config().get('ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        wrappers = [connection.execute_wrapper(recorder) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            self.check(request, resolver_match, recorder)
+        return response
+
+    def check(self, request, resolver_match, recorder):
+        view_name = resolver_match.url_name or resolver_match.view_name
+        view_stats.record(view_name, recorder)
+        budget = resolve_budget(resolver_match)
+
+        problems = []
+        if budget['queries'] is not None and recorder.count > budget['queries']:
+            problems.append(f"{recorder.count} queries (budget {budget['queries']})")
+        if budget['repeats']:
+            for shape, count in recorder.repeated(budget['repeats']):
+                problems.append(f"N+1: {count}x {shape[:200]}")
+
+        slow = budget['db_ms'] is not None and recorder.db_ms > budget['db_ms']
+        if slow:
+            logger.warning(
+                f"{view_name} spent {recorder.db_ms:.1f} ms in the database "
+                f"(budget {budget['db_ms']} ms) for {request.method} {request.path}"
+            )
+
+        if not problems:
+            return
+
+        view_stats.violation(view_name)
+        message = f"{view_name} exceeded its query budget: " + '; '.join(problems)
+        if _config().get('STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(f"{message} for {request.method} {request.path}")
@@ -0,0 +1,336 @@
+"""
+Sliding-window rate limiting and lockout
+Routes opt in from voting/urls.py by wrapping their view:
+
+    path('api/verify-biometric/', rate_limit(views_federated.verify_biometric_api,
+                                             scope='biometric', keys=['voter_id', 'ip']), ...)
+
+RateLimitMiddleware then, for every key of the request (voter id, phone,
+client IP, session):
+
+    - rejects it with 429 while any key is locked out, before the view
+      runs, so brute-force traffic never reaches the ORM or Fernet;
+    - counts requests and failed attempts in a sliding window and locks a
+      key out for LOCKOUT_DURATION once it reaches MAX_ATTEMPTS failures.
+
+Views acting for many voters at once (the kiosk batch verification)
+check and count each voter's key in a scope with locked_values() and
+record_failures().
+
+Defaults come from settings.BIOMETRIC_VERIFICATION; counters live in
+process memory or, with RATE_LIMIT['BACKEND'] = 'cache', in a shared cache.
+"""
+
+from collections import OrderedDict, deque
+from functools import wraps
+import json
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'RATE_LIMIT', {})
+
+
+def _defaults():
+    biometric = getattr(settings, 'BIOMETRIC_VERIFICATION', {})
+    return {
+        'max_attempts': biometric.get('MAX_ATTEMPTS', 3),
+        'lockout': biometric.get('LOCKOUT_DURATION', 900),
+        'window': _config().get('WINDOW_SECONDS', biometric.get('LOCKOUT_DURATION', 900)),
+        'max_requests': _config().get('MAX_REQUESTS'),
+    }
+
+
+def _scaled(limit, kind):
+    # Many voters can share one address (NAT, polling booth kiosks)
+    if limit and kind == 'ip':
+        return limit * _config().get('IP_FACTOR', 10)
+    return limit
+
+
+class MemoryBackend:
+    """
+    Exact sliding windows kept in this process
+
+    At most max_keys windows and max_keys lockouts are kept; beyond that
+    the least recently hit window (and the oldest lockout) is evicted.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._events = OrderedDict()  # Least recently hit first
+        self._locked_until = OrderedDict()  # Oldest lockout first
+
+    def hit(self, key, window, now):
+        """Record an event and return how many fall inside the window"""
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                while len(self._events) >= self.max_keys:
+                    self._events.popitem(last=False)
+                events = self._events[key] = deque()
+            else:
+                self._events.move_to_end(key)
+            while events and events[0] <= now - window:
+                events.popleft()
+            events.append(now)
+            return len(events)
+
+    def locked_for(self, key, now):
+        with self._lock:
+            until = self._locked_until.get(key, 0)
+        return max(0.0, until - now)
+
+    def lock(self, key, seconds, now):
+        with self._lock:
+            self._locked_until.pop(key, None)
+            if len(self._locked_until) >= self.max_keys:
+                for expired in [key for key, until in self._locked_until.items() if until <= now]:
+                    del self._locked_until[expired]
+            while len(self._locked_until) >= self.max_keys:
+                self._locked_until.popitem(last=False)
+            self._locked_until[key] = now + seconds
+            self._events.pop(key, None)
+
+
+class CacheBackend:
+    """
+    Sliding windows approximated from two fixed-window counters in a
+    shared cache, so every worker sees the same counts and lockouts
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def hit(self, key, window, now):
+        index = int(now // window)
+        current_key = f'ratelimit:{key}:{index}'
+        self.cache.add(current_key, 0, int(window * 2))
+        current = self.cache.incr(current_key)
+        previous = self.cache.get(f'ratelimit:{key}:{index - 1}', 0)
+        elapsed = (now % window) / window
+        return current + math.floor(previous * (1 - elapsed))
+
+    def locked_for(self, key, now):
+        until = self.cache.get(f'ratelimit-lock:{key}')
+        return max(0.0, until - now) if until else 0.0
+
+    def lock(self, key, seconds, now):
+        self.cache.set(f'ratelimit-lock:{key}', now + seconds, int(math.ceil(seconds)))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    config = _config()
+    signature = (config.get('BACKEND', 'memory'), config.get('CACHE_ALIAS', 'default'))
+    with _backend_lock:
+        if _backend is None or _backend.signature != signature:
+            if signature[0] == 'cache':
+                _backend = CacheBackend(signature[1])
+            else:
+                _backend = MemoryBackend()
+            _backend.signature = signature
+        return _backend
+
+
+def client_ip(request):
+    """
+    Address of the client, as far as it can be trusted
+
+    X-Forwarded-For is set by the client unless a proxy replaces it, so it
+    is only read with TRUSTED_PROXY_COUNT proxies in front of the app: the
+    address that many hops from the right was appended by the outermost
+    trusted proxy. Anything further left could be forged.
+    """
+    trusted = _config().get('TRUSTED_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR') if trusted else None
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        if len(hops) >= trusted and hops[-trusted]:
+            return hops[-trusted]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _json_body(request):
+    if request.content_type != 'application/json':
+        return {}
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _session_value(request, entry, field):
+    session = getattr(request, 'session', None)
+    value = session.get(entry) if session is not None else None
+    return value.get(field) if isinstance(value, dict) else None
+
+
+def request_keys(request, kinds):
+    """
+    Identify the caller without touching the database
+
+    Returns:
+        list of (kind, value) for every kind that could be determined
+    """
+    body = None
+    keys = []
+    for kind in kinds:
+        if kind == 'ip':
+            value = client_ip(request)
+        elif kind == 'session':
+            session = getattr(request, 'session', None)
+            value = session.session_key if session is not None else None
+        elif kind == 'voter_id':
+            body = _json_body(request) if body is None else body
+            value = body.get('voter_id') or _session_value(request, 'user_details', 'voter_id')
+        elif kind == 'phone':
+            body = _json_body(request) if body is None else body
+            value = (
+                body.get('phone')
+                or body.get('phone_number')
+                or _session_value(request, 'login_attempt', 'phone')
+            )
+        else:
+            raise ValueError(f"Unknown rate limit key: {kind}")
+        if value:
+            keys.append((kind, str(value)))
+    return keys
+
+
+def _record_failures(backend, keys, limits):
+    now = time.time()
+    for kind, key in keys:
+        failures = backend.hit(f'failures:{key}', limits['window'], now)
+        if failures >= _scaled(limits['max_attempts'], kind):
+            backend.lock(key, limits['lockout'], now)
+            logger.warning(f"Locked out {key} for {limits['lockout']}s after {failures} failed attempts")
+
+
+def locked_values(scope, kind, values):
+    """
+    Which of many values are locked out in a scope, e.g. the voter ids of
+    a batch request, which the middleware cannot see as request keys
+
+    Returns:
+        set of the locked out values
+    """
+    if not _config().get('ENABLED', True):
+        return set()
+    backend = get_backend()
+    now = time.time()
+    return {value for value in values if backend.locked_for(f"{scope}:{kind}:{value}", now)}
+
+
+def record_failures(scope, kind, values):
+    """Count a failed attempt for each value, as the middleware does for a failed request"""
+    if not _config().get('ENABLED', True) or not values:
+        return
+    _record_failures(get_backend(), [(kind, f"{scope}:{kind}:{value}") for value in values], _defaults())
+
+
+def attempt_failed(response):
+    """Default failure test: client errors or an explicit negative result"""
+    if response.status_code in (400, 401, 403, 404):
+        return True
+    if response.status_code != 200 or not response.get('Content-Type', '').startswith('application/json'):
+        return False
+    try:
+        data = json.loads(response.content)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and (data.get('success') is False or data.get('verified') is False)
+
+
+def rate_limit(view_func, scope, keys=('ip',), max_attempts=None, lockout=None, window=None, max_requests=None):
+    """
+    Apply rate limiting and lockout to a route (use in urls.py)
+
+    Args:
+        view_func: the view to protect
+        scope: counters and lockouts are shared by routes with the same scope
+        keys: any of 'voter_id', 'phone', 'ip', 'session'
+        max_attempts: failed attempts per window before lockout (default MAX_ATTEMPTS)
+        lockout: lockout duration in seconds (default LOCKOUT_DURATION)
+        window: sliding window length in seconds
+        max_requests: requests per window regardless of outcome (optional)
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return view_func(request, *args, **kwargs)
+
+    wrapper.rate_limit = {
+        'scope': scope,
+        'keys': tuple(keys),
+        'max_attempts': max_attempts,
+        'lockout': lockout,
+        'window': window,
+        'max_requests': max_requests,
+    }
+    return wrapper
+
+
+class RateLimitMiddleware:
+    """Enforce the limits declared with rate_limit() in urls.py"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, '_rate_limit', None)
+        if state is not None and attempt_failed(response):
+            self.record_failure(*state)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        declared = getattr(view_func, 'rate_limit', None)
+        if declared is None or not _config().get('ENABLED', True):
+            return None
+
+        limits = _defaults()
+        limits.update({name: value for name, value in declared.items() if value is not None})
+        keys = [(kind, f"{limits['scope']}:{kind}:{value}") for kind, value in request_keys(request, limits['keys'])]
+        if not keys:
+            return None
+
+        backend = get_backend()
+        now = time.time()
+        locked_for = max(backend.locked_for(key, now) for kind, key in keys)
+        if locked_for:
+            return self.reject(request, locked_for)
+
+        if limits['max_requests']:
+            for kind, key in keys:
+                if backend.hit(f'requests:{key}', limits['window'], now) > _scaled(limits['max_requests'], kind):
+                    logger.warning(f"Rate limit exceeded for {key} on {request.path}")
+                    return self.reject(request, limits['window'])
+
+        request._rate_limit = (backend, keys, limits)
+        return None
+
+    def record_failure(self, backend, keys, limits):
+        _record_failures(backend, keys, limits)
+
+    def reject(self, request, retry_after):
+        response = JsonResponse({
+            'success': False,
+            'error': 'Too many attempts. Please try again later.'
+        }, status=429)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
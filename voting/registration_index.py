@@ -0,0 +1,193 @@
+"""
+Registration uniqueness index
+Registration must reject a username, EPIC number, Aadhaar number or phone
+number that is already taken. Each of those fields gets an in-memory
+Bloom filter, so the common case (nothing collides) is answered without
+touching the database. Only fields whose filter reports a possible match
+are checked, in a single OR query that also tells which fields collide.
+
+Filters are warmed from the table in a background thread on first use
+and updated on every insert (voting.signals). They only say "maybe"
+for values this process has seen; rows inserted by other processes are
+caught by the unique constraints, and the view maps the IntegrityError
+back to the colliding field with the same query.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import RegisteredUser
+
+logger = logging.getLogger(__name__)
+
+# Unique fields in the order their errors are reported
+UNIQUE_FIELDS = {
+    'username': 'Username already exists',
+    'voter_id_epic': 'Voter ID already registered',
+    'aadhaar_number': 'Aadhaar number already registered',
+    'phone_number': 'Phone number already registered',
+}
+
+
+def _config():
+    return getattr(settings, 'REGISTRATION_INDEX', {})
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on BLAKE2b)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+def find_collisions(values, fields=None):
+    """
+    Which unique fields already hold the given values (one query)
+
+    Args:
+        values: dict of field name -> submitted value
+        fields: subset of fields to check (default: all unique fields)
+
+    Returns:
+        list of colliding field names, in UNIQUE_FIELDS order
+    """
+    fields = [field for field in (fields or UNIQUE_FIELDS) if values.get(field)]
+    if not fields:
+        return []
+
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{field: values[field]})
+    rows = RegisteredUser.objects.filter(condition).values_list(*fields)[:len(fields)]
+
+    taken = set()
+    for row in rows:
+        taken.update(field for field, value in zip(fields, row) if value == values[field])
+    return [field for field in UNIQUE_FIELDS if field in taken]
+
+
+class RegistrationIndex:
+    """Bloom filters over every unique registration field"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.filters = {field: BloomFilter(capacity, error_rate) for field in UNIQUE_FIELDS}
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def add(self, values):
+        with self._lock:
+            for field, bloom in self.filters.items():
+                if values.get(field):
+                    bloom.add(values[field])
+
+    def warm(self, chunk_size=10000):
+        """Load every existing registration; returns the number of rows read"""
+        rows = 0
+        queryset = RegisteredUser.objects.values_list(*UNIQUE_FIELDS).order_by()
+        for row in queryset.iterator(chunk_size=chunk_size):
+            self.add(dict(zip(UNIQUE_FIELDS, row)))
+            rows += 1
+        self.ready = True
+        logger.info(f"Registration index warmed with {rows} registrations")
+        capacity = next(iter(self.filters.values())).capacity
+        if rows > capacity:
+            logger.warning(f"{rows} registrations exceed REGISTRATION_INDEX['CAPACITY'] ({capacity}); "
+                           f"false positives will send more checks to the database")
+        return rows
+
+    def maybe_taken(self, values):
+        """Fields whose value might already exist; all of them until warmed"""
+        if not self.ready:
+            return list(UNIQUE_FIELDS)
+        with self._lock:
+            return [
+                field for field, bloom in self.filters.items()
+                if values.get(field) and values[field] in bloom
+            ]
+
+    def collisions(self, values):
+        """
+        Colliding fields for a new registration
+
+        Returns:
+            list of field names; empty without a query when every filter says no
+        """
+        fields = self.maybe_taken(values)
+        return find_collisions(values, fields) if fields else []
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Per-process index; the first call starts warming it"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            config = _config()
+            _index = RegistrationIndex(config.get('CAPACITY', 1000000), config.get('ERROR_RATE', 0.01))
+            chunk_size = config.get('WARM_CHUNK_SIZE', 10000)
+            if config.get('WARM_IN_BACKGROUND', True):
+                threading.Thread(
+                    target=_warm, args=(_index, chunk_size), name='registration-index-warm', daemon=True,
+                ).start()
+            else:
+                _index.warm(chunk_size)
+        return _index
+
+
+def _warm(index, chunk_size):
+    from django.db import connection
+    try:
+        index.warm(chunk_size)
+    except Exception as e:
+        logger.error(f"Registration index warm-up failed, checking the database instead: {str(e)}")
+    finally:
+        connection.close()
+
+
+def index_registration(instance):
+    """Add a saved registration to the index if this process has one"""
+    if _index is not None:
+        _index.add({field: getattr(instance, field) for field in UNIQUE_FIELDS})
+
+
+def check_unique(values):
+    """
+    Colliding unique fields for a new registration
+
+    Returns:
+        list of field names (empty if the registration can be inserted)
+    """
+    if not _config().get('ENABLED', True):
+        return find_collisions(values)
+    return get_index().collisions(values)
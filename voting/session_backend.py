@@ -0,0 +1,58 @@
+"""
+Cache-backed session engine with write coalescing
+Sessions are read from a cache shared by every worker on the host
+(settings.SESSION_CACHE_ALIAS, a file cache by default) and fall back to
+django_session on a miss. Saves whose data is identical to what was
+loaded are skipped entirely, so flows that re-set the same values no
+longer cost an UPDATE; expired rows are swept in batches.
+"""
+
+import hashlib
+
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+
+
+class SessionStore(CachedDBStore):
+    """cached_db session store that only writes when the data changed"""
+
+    cache_key_prefix = 'voting.session.'
+
+    def _digest(self, data):
+        # The serializer output is deterministic, unlike the signed encoding
+        return hashlib.blake2b(self.serializer().dumps(data), digest_size=16).digest()
+
+    def load(self):
+        data = super().load()
+        self._saved_digest = self._digest(data)
+        return data
+
+    def save(self, must_create=False):
+        digest = self._digest(self._get_session(no_load=must_create))
+        if not must_create and self.session_key is not None and digest == getattr(self, '_saved_digest', None):
+            return
+        super().save(must_create)
+        self._saved_digest = digest
+
+    @classmethod
+    def clear_expired(cls, batch_size=5000):
+        """
+        Delete expired sessions in batches so the sweep never holds a long
+        lock on django_session. Cached copies expire with their TTL.
+
+        Returns:
+            int: number of sessions deleted
+        """
+        model = cls.get_model_class()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                model.objects
+                .filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return deleted
+            model.objects.filter(session_key__in=keys).delete()
+            deleted += len(keys)
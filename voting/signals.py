@@ -0,0 +1,75 @@
+"""
+Signal handlers keeping derived caches in step with the models
+Connected in VotingConfig.ready()
+"""
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .ballot_cache import invalidate_ballots
+from .document_pipeline import schedule as schedule_document_processing
+from .elector_search import index_voter, unindex_voter
+from .embedding_cache import invalidate as invalidate_embedding
+from .models import BiometricEmbedding, Candidate, Party, RegisteredUser, Voter
+from .registration_index import index_registration
+from .storage import ContentAddressedStorage
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+@receiver(post_save, sender=Party)
+@receiver(post_delete, sender=Party)
+def invalidate_ballot_cache(sender, **kwargs):
+    """Any candidate or party edit can change what a ballot shows"""
+    invalidate_ballots()
+
+
+@receiver(post_save, sender=RegisteredUser)
+def add_registration_to_index(sender, instance, created, **kwargs):
+    """New registrations must show up as taken in the uniqueness filters"""
+    if created:
+        index_registration(instance)
+
+
+@receiver(post_save, sender=RegisteredUser)
+def process_registration_documents(sender, instance, created, **kwargs):
+    """Validate, shrink and thumbnail the uploads once the registration commits"""
+    if created:
+        schedule_document_processing(instance.pk)
+
+
+@receiver(post_save, sender=BiometricEmbedding)
+@receiver(post_delete, sender=BiometricEmbedding)
+def invalidate_embedding_cache(sender, instance, **kwargs):
+    """Registered, deactivated or deleted embeddings must not be verified against from cache"""
+    try:
+        voter_id = instance.voter.voter_id
+    except Voter.DoesNotExist:
+        return  # Deleted along with the voter; nothing can verify as them
+    # After commit, so no process can re-cache the old row under the new generation
+    transaction.on_commit(lambda: invalidate_embedding(voter_id))
+
+
+@receiver(post_save, sender=Voter)
+def add_voter_to_search_index(sender, instance, **kwargs):
+    """Renamed or moved voters are found under their new details"""
+    index_voter(instance)
+
+
+@receiver(post_delete, sender=Voter)
+def remove_voter_from_search_index(sender, instance, **kwargs):
+    unindex_voter(instance)
+
+
+@receiver(post_delete, sender=Candidate)
+@receiver(post_delete, sender=Party)
+@receiver(post_delete, sender=RegisteredUser)
+def release_media_references(sender, instance, **kwargs):
+    """Deleted rows drop their references to content-addressed files"""
+    for field in instance._meta.fields:
+        if not isinstance(field, models.FileField):
+            continue
+        file = getattr(instance, field.attname)
+        if file and isinstance(file.storage, ContentAddressedStorage):
+            transaction.on_commit(lambda storage=file.storage, name=file.name: storage.delete(name))
@@ -0,0 +1,310 @@
+"""
+Asynchronous SMS dispatch
+Request threads enqueue messages and return immediately; worker threads
+drain the queue, hand messages to the configured gateway in batches and
+retry failed deliveries with exponential backoff. The gateway is
+pluggable (settings.SMS_DISPATCH['GATEWAY']):
+
+    ConsoleGateway   logs messages with codes masked (development)
+    FileGateway      appends JSON lines to a file (staging, manual testing)
+    LoopbackGateway  keeps messages in memory (tests)
+
+A real provider only needs to implement SMSGateway.send_batch. There is
+no default: without a GATEWAY (settings only default to the console with
+DEBUG on) sending raises ImproperlyConfigured instead of losing codes.
+"""
+
+from collections import deque
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'SMS_DISPATCH', {})
+
+
+class SMSMessage:
+    __slots__ = ('phone_number', 'body', 'enqueued_at', 'attempts')
+
+    def __init__(self, phone_number, body):
+        self.phone_number = phone_number
+        self.body = body
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"SMSMessage({self.phone_number!r})"
+
+
+class SMSGateway:
+    """Interface for SMS providers"""
+
+    # Largest batch the provider accepts in one call
+    max_batch_size = 100
+
+    def send_batch(self, messages):
+        """
+        Deliver a batch of messages
+
+        Args:
+            messages: list of SMSMessage
+
+        Returns:
+            list of SMSMessage that failed and should be retried; raising
+            an exception retries the whole batch
+        """
+        raise NotImplementedError
+
+
+CODE = re.compile(r'\d{4,}')
+
+
+def mask_codes(body):
+    """Replace runs of four or more digits (OTP codes) with asterisks"""
+    return CODE.sub(lambda match: '*' * len(match.group()), body)
+
+
+class ConsoleGateway(SMSGateway):
+    """Log messages, with codes masked, instead of sending them (development)"""
+
+    def send_batch(self, messages):
+        for message in messages:
+            logger.info(f"SMS to {message.phone_number}: {mask_codes(message.body)}")
+        return []
+
+
+class FileGateway(SMSGateway):
+    """Append one JSON line per message to a local file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        lines = ''.join(
+            json.dumps({'to': message.phone_number, 'body': message.body, 'sent_at': time.time()}) + '\n'
+            for message in messages
+        )
+        with self._lock, open(self.path, 'a') as outbox:
+            outbox.write(lines)
+        return []
+
+
+class LoopbackGateway(SMSGateway):
+    """Keep messages in memory; `fail_next` simulates provider errors"""
+
+    def __init__(self):
+        self.outbox = []
+        self.batches = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        with self._lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                raise ConnectionError('loopback gateway failure')
+            self.batches.append(len(messages))
+            self.outbox.extend(messages)
+        return []
+
+
+class SMSDispatcher:
+    """Bounded queue drained by worker threads that batch gateway calls"""
+
+    def __init__(self, gateway, workers=2, batch_size=50, batch_wait_ms=20, max_retries=5,
+                 backoff_base_ms=200, backoff_max_ms=10000, max_queue=10000):
+        self.gateway = gateway
+        self.batch_size = min(batch_size, gateway.max_batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base_ms / 1000
+        self.backoff_max = backoff_max_ms / 1000
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (due, sequence, message)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._latencies = deque(maxlen=1000)
+        self.counters = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'rejected': 0, 'batches': 0}
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f'sms-dispatch-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, phone_number, body):
+        """
+        Queue a message for delivery without waiting for the gateway
+
+        Returns:
+            bool: False if the queue is full and the message was dropped
+        """
+        try:
+            self._queue.put_nowait(SMSMessage(phone_number, body))
+        except queue.Full:
+            self._count('rejected')
+            logger.error(f"SMS queue full, dropped message to {phone_number}")
+            return False
+        self._count('enqueued')
+        return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _due_retries(self, limit):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now and len(due) < limit:
+                due.append(heapq.heappop(self._retries)[2])
+            next_due = self._retries[0][0] - now if self._retries else None
+        return due, next_due
+
+    def _next_batch(self):
+        batch, next_due = self._due_retries(self.batch_size)
+        if not batch:
+            timeout = 0.5 if next_due is None else max(0.0, min(next_due, 0.5))
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                return batch
+
+        # Give concurrent requests a moment to join this gateway call
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.depth() == 0):
+            batch = self._next_batch()
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch):
+        for message in batch:
+            message.attempts += 1
+        try:
+            failed = list(self.gateway.send_batch(batch))
+        except Exception as e:
+            logger.warning(f"SMS gateway call failed for {len(batch)} messages: {str(e)}")
+            failed = batch
+
+        delivered_at = time.monotonic()
+        failed_ids = {id(message) for message in failed}
+        delivered = [message for message in batch if id(message) not in failed_ids]
+        with self._lock:
+            self.counters['batches'] += 1
+            self.counters['sent'] += len(delivered)
+            self._latencies.extend(delivered_at - message.enqueued_at for message in delivered)
+
+        for message in failed:
+            self._retry(message)
+
+    def _retry(self, message):
+        if message.attempts > self.max_retries:
+            self._count('failed')
+            logger.error(f"Giving up on SMS to {message.phone_number} after {message.attempts} attempts")
+            return
+        # Exponential backoff with jitter so retries from a gateway outage spread out
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (message.attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        with self._lock:
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), message))
+            self.counters['retried'] += 1
+
+    def depth(self):
+        """Messages waiting for delivery, including scheduled retries"""
+        with self._lock:
+            return self._queue.qsize() + len(self._retries)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self.counters)
+            retrying = len(self._retries)
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 1)
+
+        return {
+            **counters,
+            'queued': self._queue.qsize(),
+            'retrying': retrying,
+            'latency_p50_ms': pct(50),
+            'latency_p95_ms': pct(95),
+            'latency_max_ms': pct(100),
+        }
+
+    def stop(self, timeout=5.0):
+        """Stop accepting work once the queue drains, waiting up to `timeout` seconds"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Per-process dispatcher built from settings.SMS_DISPATCH"""
+    global _dispatcher
+    config = _config()
+    signature = repr(sorted(config.items()))
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher.signature != signature:
+            if not config.get('GATEWAY'):
+                raise ImproperlyConfigured("SMS_DISPATCH['GATEWAY'] must name an SMS provider gateway")
+            if _dispatcher is not None:
+                _dispatcher.stop(timeout=0)
+            gateway_class = import_string(config['GATEWAY'])
+            _dispatcher = SMSDispatcher(
+                gateway_class(**config.get('GATEWAY_OPTIONS', {})),
+                workers=config.get('WORKERS', 2),
+                batch_size=config.get('BATCH_SIZE', 50),
+                batch_wait_ms=config.get('BATCH_WAIT_MS', 20),
+                max_retries=config.get('MAX_RETRIES', 5),
+                backoff_base_ms=config.get('BACKOFF_BASE_MS', 200),
+                backoff_max_ms=config.get('BACKOFF_MAX_MS', 10000),
+                max_queue=config.get('MAX_QUEUE', 10000),
+            )
+            _dispatcher.signature = signature
+        return _dispatcher
+
+
+def send_sms(phone_number, body):
+    """Queue an SMS; returns False when the queue is full"""
+    return get_dispatcher().enqueue(phone_number, body)
+
+
+@atexit.register
+def _drain_on_exit():
+    if _dispatcher is not None:
+        _dispatcher.stop(timeout=_config().get('SHUTDOWN_TIMEOUT', 5.0))
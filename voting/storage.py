@@ -0,0 +1,155 @@
+"""
+Content-addressed media storage
+Uploaded images are stored under the SHA-256 of their bytes:
+
+    <upload_to>/<first two hex digits>/<sha256><extension>
+
+so the same candidate placeholder or document uploaded ten times is one
+file on disk (and one entry in the OS page cache) instead of ten suffixed
+copies. StoredBlob counts the references to each file: saving increments
+it, delete() decrements it and removes the file when nothing refers to
+it any more. The dedupe_media command moves existing files into this
+layout and recomputes the counts from the models.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, 'MEDIA_STORAGE', {})
+
+
+def _blob_model():
+    # Imported lazily: voting.models imports this module for its fields
+    return apps.get_model('voting', 'StoredBlob')
+
+
+def content_hash(content, chunk_size=64 * 1024):
+    """SHA-256 hex digest and size of a file-like object, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in iter(lambda: content.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(name, digest):
+    """Storage name of the blob for a file uploaded as `name`"""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(directory, digest[:2], f'{digest}{extension}').replace(os.sep, '/')
+
+
+def is_blob_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    parent = os.path.basename(os.path.dirname(name))
+    return len(stem) == 64 and parent == stem[:2]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each distinct content once, with reference counts"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen from the content in _save
+        return name
+
+    def _save(self, name, content):
+        digest, size = content_hash(content)
+        name = blob_name(name, digest)
+        StoredBlob = _blob_model()
+
+        updated = StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(name=name, sha256=digest, size=size, refcount=1)
+            except IntegrityError:
+                # Another request stored the same content first
+                StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+        # The reference is recorded before the file is checked, so a
+        # concurrent delete of the last reference cannot remove it under us
+        if super().exists(name):
+            logger.debug(f"Reusing stored blob {name}")
+        elif not self._write_blob(name, content):
+            logger.debug(f"Blob {name} was stored by a concurrent writer")
+        return name
+
+    def _write_blob(self, name, content):
+        """
+        Write a blob to a temporary file and link it into place, so readers
+        never see a partial file and concurrent writers of the same content
+        cannot clobber (or, through get_available_name, outwait) each other
+
+        Returns:
+            bool: False if another writer stored the blob first
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        if self.directory_permissions_mode is not None:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            # mkstemp creates files readable by the owner only
+            os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+            os.link(temp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(temp_path)
+
+    def delete(self, name):
+        """Drop one reference; the file goes when the last reference does"""
+        if not name:
+            return
+        StoredBlob = _blob_model()
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Not tracked (stored before this backend was enabled)
+                super().delete(name)
+                return
+            if blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+    def delete_file(self, name):
+        """Remove a file regardless of references (maintenance commands only)"""
+        super().delete(name)
+
+
+_storage = None
+
+
+def media_storage():
+    """Storage for the voting app's ImageFields (settings.MEDIA_STORAGE)"""
+    global _storage
+    if not _config().get('CONTENT_ADDRESSED', True):
+        return default_storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
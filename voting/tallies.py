@@ -0,0 +1,161 @@
+"""
+Vote tally read model
+Keeps CandidateTally in step with the Vote table so results and turnout
+are read from one row per candidate instead of aggregating every ballot
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import CandidateTally, Vote
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def record_votes(counts):
+    """
+    Add votes to the tally table. Must be called inside the transaction
+    that creates the corresponding Vote rows.
+
+    Args:
+        counts: mapping of (candidate_id, constituency) -> number of new votes
+    """
+    for (candidate_id, constituency), increment in counts.items():
+        if not increment:
+            continue
+        updated = CandidateTally.objects.filter(
+            candidate_id=candidate_id,
+            constituency=constituency
+        ).update(votes=F('votes') + increment)
+
+        if updated:
+            continue
+
+        # First vote for this candidate in this constituency
+        try:
+            with transaction.atomic():
+                CandidateTally.objects.create(
+                    candidate_id=candidate_id,
+                    constituency=constituency,
+                    votes=increment
+                )
+        except IntegrityError:
+            # Another request created the row first
+            CandidateTally.objects.filter(
+                candidate_id=candidate_id,
+                constituency=constituency
+            ).update(votes=F('votes') + increment)
+
+
+def record_vote(candidate_id, constituency):
+    """Add a single vote to the tally table"""
+    record_votes({(candidate_id, constituency): 1})
+
+
+def count_votes():
+    """
+    Count the Vote table from scratch
+
+    Returns:
+        Counter keyed by (candidate_id, constituency)
+    """
+    rows = (
+        Vote.objects
+        .values('candidate_id', 'voter__constituency')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    return Counter({
+        (row['candidate_id'], row['voter__constituency']): row['total']
+        for row in rows
+    })
+
+
+def stored_tallies():
+    """
+    Current tally table contents
+
+    Returns:
+        dict keyed by (candidate_id, constituency) -> votes
+    """
+    return {
+        (row['candidate_id'], row['constituency']): row['votes']
+        for row in CandidateTally.objects.values('candidate_id', 'constituency', 'votes')
+    }
+
+
+@transaction.atomic
+def replace_tallies(counts):
+    """
+    Overwrite the tally table with the given counts
+
+    Args:
+        counts: mapping of (candidate_id, constituency) -> votes
+    """
+    CandidateTally.objects.all().delete()
+    CandidateTally.objects.bulk_create([
+        CandidateTally(candidate_id=candidate_id, constituency=constituency, votes=total)
+        for (candidate_id, constituency), total in counts.items()
+    ])
+
+
+def partition_ranges(low, high, partitions):
+    """Split [low, high] into at most `partitions` contiguous half-open ranges"""
+    span = high - low + 1
+    size = max(1, -(-span // partitions))
+    return [(start, min(start + size, high + 1)) for start in range(low, high + 1, size)]
+
+
+@transaction.atomic
+def rebuild_tallies():
+    """
+    Replace the tally table with counts derived from Vote
+
+    Returns:
+        dict: number of tally rows written and total votes counted
+    """
+    counts = count_votes()
+    replace_tallies(counts)
+
+    total_votes = sum(counts.values())
+    logger.info(f"Rebuilt {len(counts)} tally rows from {total_votes} votes")
+    return {'rows': len(counts), 'votes': total_votes}
+
+
+def constituency_results(constituency):
+    """
+    Results for one constituency, highest first
+
+    Returns:
+        list of dicts with candidate id, name, party and votes
+    """
+    return list(
+        CandidateTally.objects
+        .filter(constituency=constituency)
+        .order_by('-votes', 'candidate__name')
+        .values(
+            'candidate_id',
+            'votes',
+            candidate_name=F('candidate__name'),
+            party_name=F('candidate__party__name'),
+        )
+    )
+
+
+def turnout_by_constituency():
+    """
+    Total votes cast per constituency
+
+    Returns:
+        dict mapping constituency -> votes cast
+    """
+    rows = (
+        CandidateTally.objects
+        .values('constituency')
+        .annotate(total=Sum('votes'))
+        .order_by('constituency')
+    )
+    return {row['constituency']: row['total'] for row in rows}
@@ -0,0 +1,30 @@
+"""
+Test runner applying the settings the suite depends on
+Settings describe production; TEST_OVERRIDES holds what differs under
+test (merged into the named settings dicts), so nothing needs to guess
+whether it is running under a test from sys.argv.
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_OVERRIDES = {
+    'QUERY_BUDGETS': {'STRICT': True},  # Raise instead of logging
+    'REGISTRATION_INDEX': {'WARM_IN_BACKGROUND': False},  # Deterministic query counts
+    'ELECTOR_SEARCH': {'WARM_IN_BACKGROUND': False},
+    'DOCUMENT_PIPELINE': {'ASYNC': False},  # Process inline after commit
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._overrides = override_settings(**{
+            name: {**getattr(settings, name, {}), **values} for name, values in TEST_OVERRIDES.items()
+        })
+        self._overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._overrides.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1805 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection
+from django.db.models import CharField, F
+from django.db.models.functions import Upper
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils import timezone
+import numpy as np
+
+from .admission import admission_controlled, admission_metrics
+from .ballot_cache import get_ballot
+from .checks import check_ballot_cache, check_embedding_cache, check_idempotency_cache
+from .benchmarking import registration_values, seed_registrations
+from .db_router import ReadReplicaRouter, ReplicaPool, read_only_view
+from .duplicate_detection import PASSES, blocking_keys, compare_blocks, normalize_name, phonetic_name
+from .federated_auth import BiometricAuthLog, BiometricEmbedding, FederatedAuthenticationManager
+from .live_results import LiveResultsAggregator
+from . import otp_service
+from .models import (
+    OTP, Candidate, CandidateTally, DocumentProcessingLog, DuplicateSuspect, Party, RegisteredUser, StoredBlob,
+    TurnoutBucket, Vote, Voter,
+)
+from .sms_dispatch import ConsoleGateway, LoopbackGateway, SMSDispatcher, SMSMessage, get_dispatcher
+from .session_backend import SessionStore as CachedSessionStore
+from .storage import blob_name
+from . import document_pipeline, elector_search, embedding_cache, rate_limit, registration_index
+from .provisioning import provision_registrations
+from .query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, normalize_sql, query_budget
+from .views import journal_vote, submit_vote
+from .tallies import count_votes, partition_ranges, record_vote, record_votes, stored_tallies
+from .turnout import record_turnout, roll_up_turnout, turnout_curve
+from .vote_journal import VoteJournal, recover_orphaned_journals, replay_journal
+
+
+def create_ballot(constituency='Default Constituency'):
+    party = Party.objects.create(name='Test Party', symbol='party_symbols/test.png')
+    return Candidate.objects.create(
+        name='Test Candidate',
+        party=party,
+        photo='candidate_photos/test.png',
+        constituency=constituency,
+    )
+
+
+def create_voter(voter_id, constituency='Default Constituency'):
+    user = User.objects.create(username=f'user_{voter_id}')
+    return Voter.objects.create(user=user, voter_id=voter_id, constituency=constituency)
+
+
+def vote_request(voter, candidate, payload=None):
+    request = RequestFactory().post(
+        '/vote',
+        data=json.dumps(payload or {'candidate': candidate.name, 'party': candidate.party.name}),
+        content_type='application/json',
+    )
+    request.session = SessionStore()
+    request.session['user_details'] = {
+        'voter_id': voter.voter_id,
+        'voter_pk': voter.pk,
+        'constituency': voter.constituency,
+    }
+    return request
+
+
+class SubmitVoteTests(TestCase):
+    def setUp(self):
+        self.candidate = create_ballot()
+        self.voter = create_voter('ABC1234567')
+
+    def test_vote_claims_voter_and_updates_tally(self):
+        response = submit_vote(vote_request(self.voter, self.candidate))
+
+        self.assertEqual(response.status_code, 200)
+        self.voter.refresh_from_db()
+        self.assertTrue(self.voter.has_voted)
+        self.assertEqual(Vote.objects.get().candidate, self.candidate)
+        tally = CandidateTally.objects.get(candidate=self.candidate)
+        self.assertEqual((tally.constituency, tally.votes), ('Default Constituency', 1))
+
+    def test_second_vote_is_rejected(self):
+        submit_vote(vote_request(self.voter, self.candidate))
+        response = submit_vote(vote_request(self.voter, self.candidate))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(CandidateTally.objects.get().votes, 1)
+
+    def test_session_without_voter_pk_falls_back_to_lookup(self):
+        request = vote_request(self.voter, self.candidate)
+        del request.session['user_details']['voter_pk']
+
+        response = submit_vote(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Vote.objects.get().voter, self.voter)
+
+    def test_unknown_voter(self):
+        request = vote_request(self.voter, self.candidate)
+        request.session['user_details']['voter_pk'] = self.voter.pk + 1000
+
+        response = submit_vote(request)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_vote_by_candidate_id(self):
+        response = submit_vote(vote_request(self.voter, self.candidate, {'candidate_id': self.candidate.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Vote.objects.get().candidate, self.candidate)
+
+    def test_candidate_from_another_constituency_is_rejected(self):
+        other = Candidate.objects.create(
+            name='Elsewhere',
+            party=self.candidate.party,
+            photo='candidate_photos/test.png',
+            constituency='Other Constituency',
+        )
+
+        response = submit_vote(vote_request(self.voter, other, {'candidate_id': other.pk}))
+
+        self.assertEqual(response.status_code, 404)
+        self.voter.refresh_from_db()
+        self.assertFalse(self.voter.has_voted)
+
+
+class TallyTests(TestCase):
+    def setUp(self):
+        self.candidate = create_ballot()
+
+    def cast(self, voter_id, constituency='Default Constituency'):
+        voter = create_voter(voter_id, constituency)
+        Voter.objects.filter(pk=voter.pk).update(has_voted=True)
+        Vote.objects.create(voter=voter, candidate=self.candidate)
+        record_vote(self.candidate.pk, constituency)
+
+    def test_votes_increment_one_row_per_candidate_and_constituency(self):
+        self.cast('ABC0000001')
+        self.cast('ABC0000002')
+        # The key is the voter's constituency, not the candidate's
+        self.cast('ABC0000003', constituency='Other Constituency')
+
+        self.assertEqual(stored_tallies(), {
+            (self.candidate.pk, 'Default Constituency'): 2,
+            (self.candidate.pk, 'Other Constituency'): 1,
+        })
+        self.assertEqual(count_votes(), stored_tallies())
+
+    def test_record_votes_skips_empty_increments(self):
+        record_votes({(self.candidate.pk, 'Default Constituency'): 0})
+
+        self.assertFalse(CandidateTally.objects.exists())
+
+    def test_rebuild_tallies_command_repairs_drift(self):
+        self.cast('ABC0000001')
+        self.cast('ABC0000002', constituency='Other Constituency')
+        CandidateTally.objects.filter(constituency='Default Constituency').update(votes=7)
+        CandidateTally.objects.filter(constituency='Other Constituency').delete()
+
+        out = io.StringIO()
+        call_command('rebuild_tallies', '--dry-run', stdout=out)
+        self.assertIn('2 tally rows out of date', out.getvalue())
+        self.assertEqual(CandidateTally.objects.get().votes, 7)
+
+        call_command('rebuild_tallies', stdout=io.StringIO())
+        self.assertEqual(stored_tallies(), count_votes())
+        self.assertEqual(CandidateTally.objects.count(), 2)
+
+    def test_partition_ranges_cover_every_key_once(self):
+        for low, high, partitions in [(1, 10, 3), (5, 5, 4), (1, 3, 8), (100, 1099, 7)]:
+            ranges = partition_ranges(low, high, partitions)
+            self.assertLessEqual(len(ranges), partitions)
+            self.assertEqual(ranges[0][0], low)
+            self.assertEqual(ranges[-1][1], high + 1)
+            self.assertTrue(all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:])))
+
+    def test_recount_detects_and_repairs_a_corrupt_tally(self):
+        for index in range(10):
+            self.cast(f'ABC{index:07d}', constituency=['North', 'South'][index % 2])
+        CandidateTally.objects.filter(constituency='North').update(votes=F('votes') + 3)
+
+        with self.assertRaisesMessage(CommandError, '1 tally discrepancies'):
+            call_command('recount_votes', '--partitions', '4', '--chunk-size', '2', stdout=io.StringIO())
+        self.assertEqual(stored_tallies()[(self.candidate.pk, 'North')], 8)
+
+        call_command('recount_votes', '--partitions', '4', '--fix', stdout=io.StringIO())
+        self.assertEqual(stored_tallies(), {(self.candidate.pk, 'North'): 5, (self.candidate.pk, 'South'): 5})
+        out = io.StringIO()
+        call_command('recount_votes', '--partitions', '4', stdout=out)
+        self.assertIn('Recounted 10 votes', out.getvalue())
+        self.assertIn('Recount matches stored tallies', out.getvalue())
+
+    def test_recount_fix_does_not_claim_to_repair_has_voted(self):
+        self.cast('ABC0000001')
+        Voter.objects.update(has_voted=False)
+
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 constituencies where voters_marked differs'):
+            call_command('recount_votes', '--fix', stdout=out)
+        self.assertNotIn('CandidateTally replaced', out.getvalue())
+
+
+class SimulateElectionTests(TransactionTestCase):
+    def setUp(self):
+        rate_limit._backend = None
+
+    # Run inline, the document pipeline would count against the registration request's budget
+    @override_settings(DOCUMENT_PIPELINE={**settings.DOCUMENT_PIPELINE, 'ENABLED': False})
+    def test_a_few_voters_complete_the_journey(self):
+        out = io.StringIO()
+        # The test database already is a throwaway one
+        call_command('simulate_election', '--voters', '3', '--concurrency', '1', '--constituencies', '1',
+                     '--candidates', '2', '--seed', '1', '--current-database', stdout=out)
+
+        report = out.getvalue()
+        self.assertIn('Completed journeys: 3/3', report)
+        self.assertNotIn('failures:', report)
+        self.assertRegex(report, r'submit_vote +3 +0 ')
+
+
+class BallotCacheTests(TestCase):
+    def setUp(self):
+        self.candidate = create_ballot()
+
+    def test_ballot_is_cached(self):
+        get_ballot('Default Constituency')
+
+        with self.assertNumQueries(0):
+            ballot = get_ballot('Default Constituency')
+        self.assertEqual(ballot.resolve(candidate_id=self.candidate.pk)['name'], 'Test Candidate')
+        self.assertEqual(json.loads(ballot.json)[0]['party'], 'Test Party')
+
+    def test_party_and_candidate_edits_invalidate_ballot(self):
+        get_ballot('Default Constituency')
+
+        self.candidate.party.name = 'Renamed Party'
+        self.candidate.party.save()
+        self.assertEqual(get_ballot('Default Constituency').entries[0]['party'], 'Renamed Party')
+
+        self.candidate.constituency = 'Other Constituency'
+        self.candidate.save()
+        self.assertEqual(len(get_ballot('Default Constituency')), 0)
+
+    def test_edits_in_another_worker_invalidate_through_the_shared_generation(self):
+        get_ballot('Default Constituency')
+        # Another process renames the party; only the shared counter is common
+        Party.objects.filter(pk=self.candidate.party_id).update(name='Renamed Party')
+        caches['shared'].incr('ballot:generation')
+
+        self.assertEqual(get_ballot('Default Constituency').entries[0]['party'], 'Renamed Party')
+
+    def test_process_local_generation_cache_is_rejected(self):
+        with override_settings(BALLOT_CACHE={'GENERATION_ALIAS': 'default'}):
+            errors = check_ballot_cache(None)
+        self.assertEqual([error.id for error in errors], ['voting.E001'])
+        self.assertEqual(check_ballot_cache(None), [])
+
+
+class ConcurrentSubmitVoteTests(TransactionTestCase):
+    THREADS = 16
+
+    def test_one_voter_many_threads(self):
+        candidate = create_ballot()
+        voter = create_voter('ABC1234567')
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def cast():
+            request = vote_request(voter, candidate)
+            barrier.wait()
+            try:
+                statuses.append(submit_vote(request).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=cast) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Exactly one request wins; the rest are refused (or, on SQLite,
+        # may lose the table lock outright) but never record a second vote
+        self.assertEqual(statuses.count(200), 1)
+        self.assertEqual(len(statuses), self.THREADS)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(CandidateTally.objects.get().votes, 1)
+        voter.refresh_from_db()
+        self.assertTrue(voter.has_voted)
+
+
+class VoteJournalTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.candidate = create_ballot()
+        self.voters = [create_voter(f'JRN{i:07d}') for i in range(3)]
+
+    def journal_entry(self, voter):
+        return json.dumps({
+            'voter_pk': voter.pk,
+            'candidate_id': self.candidate.pk,
+            'constituency': voter.constituency,
+            'ip_address': None,
+        }) + '\n'
+
+    def test_replay_is_idempotent_and_ignores_torn_write(self):
+        path = os.path.join(self.directory, 'votes-1.log')
+        with open(path, 'w') as journal_file:
+            journal_file.write(self.journal_entry(self.voters[0]))
+            journal_file.write(self.journal_entry(self.voters[0]))
+            journal_file.write(self.journal_entry(self.voters[1]))
+            journal_file.write(self.journal_entry(self.voters[2])[:20])
+
+        self.assertEqual(replay_journal(path, batch_size=2), (3, 2))
+        os.remove(path + '.checkpoint')
+        self.assertEqual(replay_journal(path), (3, 0))
+
+        self.assertEqual(recover_orphaned_journals(self.directory), (0, 0))
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(CandidateTally.objects.get().votes, 2)
+        self.assertEqual(Voter.objects.filter(has_voted=True).count(), 2)
+
+    def test_appended_ballots_are_flushed_to_vote_table(self):
+        journal = VoteJournal(self.directory, flush_interval_ms=5, apply_interval_ms=5).start()
+        self.assertTrue(journal.append(self.voters[0].pk, self.candidate.pk, 'Default Constituency'))
+        self.assertFalse(journal.append(self.voters[0].pk, self.candidate.pk, 'Default Constituency'))
+        self.assertTrue(journal.append(self.voters[1].pk, self.candidate.pk, 'Default Constituency'))
+        journal.stop()
+
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(CandidateTally.objects.get().votes, 2)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_a_voter_is_claimed_once_across_worker_journals(self):
+        other_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_directory, ignore_errors=True)
+        # Two workers, each with its own journal. Ballots are applied at stop(), so
+        # no flusher writes to the in-memory test database while the voter is claimed
+        journals = [VoteJournal(directory, flush_interval_ms=5, apply_interval_ms=60000).start()
+                    for directory in (self.directory, other_directory)]
+        voter = self.voters[0]
+
+        accepted = [journal_vote(journal, voter.pk, self.candidate.pk, voter.constituency) for journal in journals]
+        for journal in journals:
+            journal.stop()
+
+        self.assertEqual(accepted, [True, False])
+        self.assertEqual(Vote.objects.get().voter_id, voter.pk)
+        self.assertEqual(CandidateTally.objects.get().votes, 1)
+
+
+class LiveResultsAggregatorTests(TransactionTestCase):
+    def test_clients_share_one_read_per_tick(self):
+        candidate = create_ballot()
+        record_vote(candidate.pk, 'Default Constituency')
+        aggregator = LiveResultsAggregator(tick_seconds=0.05, heartbeat_seconds=60)
+
+        async def scenario():
+            queues = [await aggregator.subscribe() for _ in range(50)]
+            snapshots = [queue.get_nowait() for queue in queues]
+            reads_before = aggregator.reads
+
+            from asgiref.sync import sync_to_async
+            await sync_to_async(record_vote, thread_sensitive=False)(candidate.pk, 'Default Constituency')
+            deltas = [await asyncio.wait_for(queue.get(), 2) for queue in queues]
+            for queue in queues:
+                aggregator.unsubscribe(queue)
+            return snapshots, deltas, aggregator.reads - reads_before
+
+        snapshots, deltas, reads = asyncio.run(scenario())
+
+        self.assertEqual(snapshots[0].name, 'snapshot')
+        self.assertIn(b'"turnout":{"Default Constituency":1}', snapshots[0].render())
+        self.assertTrue(all(delta is deltas[0] for delta in deltas))
+        self.assertEqual(deltas[0].tallies, {'Default Constituency': {candidate.pk: 2}})
+        self.assertIsNone(deltas[0].render('Other Constituency'))
+        self.assertLessEqual(reads, 3)
+
+    def test_delta_turnout_counts_every_candidate(self):
+        aggregator = LiveResultsAggregator(tick_seconds=0.05, heartbeat_seconds=60)
+        aggregator._ready = asyncio.Event()
+        queue = asyncio.Queue()
+        aggregator._subscribers.add(queue)
+
+        aggregator._publish({'North': {1: 10, 2: 20, 3: 30}, 'South': {4: 5}})
+        aggregator._publish({'North': {1: 10, 2: 21, 3: 30}, 'South': {4: 5}})
+
+        delta = queue.get_nowait()
+        self.assertEqual(delta.tallies, {'North': {2: 21}})
+        data = json.loads(delta.render().decode().split('data: ')[1])
+        self.assertEqual(data['turnout'], {'North': 61})
+        self.assertIn(b'"turnout":{"North":61}', delta.render('North'))
+
+
+class QueryBudgetTests(TestCase):
+    def run_view(self, path, queries, config=None):
+        """Pass a request for `path` through the middleware while running `queries`"""
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+
+        def get_response(request):
+            for voter_id in queries:
+                list(Voter.objects.filter(voter_id=voter_id))
+            return HttpResponse()
+
+        settings = {'ENABLED': True, 'STRICT': True, 'REPEAT_THRESHOLD': 5, 'VIEWS': {'landing': 2}}
+        settings.update(config or {})
+        with override_settings(QUERY_BUDGETS=settings):
+            return QueryBudgetMiddleware(get_response)(request)
+
+    def test_suite_runs_with_strict_budgets(self):
+        self.assertTrue(settings.QUERY_BUDGETS['STRICT'])
+
+    def test_within_budget(self):
+        self.assertEqual(self.run_view('/', ['A', 'B']).status_code, 200)
+
+    def test_over_budget_fails_in_strict_mode(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '3 queries (budget 2)'):
+            self.run_view('/', ['A', 'B', 'C'])
+
+    def test_over_budget_only_warns_otherwise(self):
+        with self.assertLogs('voting.query_budget', 'WARNING') as logs:
+            response = self.run_view('/', ['A', 'B', 'C'], {'STRICT': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('landing exceeded its query budget', logs.output[0])
+
+    def test_repeated_query_shape_is_reported(self):
+        config = {'VIEWS': {'landing': 100}}
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'N+1: 5x'):
+            self.run_view('/', ['A', 'B', 'C', 'D', 'E'], config)
+
+    def test_decorator_takes_precedence_over_settings(self):
+        match = resolve('/')
+        original = getattr(match.func, 'query_budget', None)
+        query_budget(queries=5)(match.func)
+        try:
+            self.assertEqual(self.run_view('/', ['A', 'B', 'C']).status_code, 200)
+        finally:
+            if original is None:
+                del match.func.query_budget
+            else:
+                match.func.query_budget = original
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s)  AND name = 'y' LIMIT 1"),
+        )
+
+
+class TurnoutTests(TestCase):
+    def moment(self, hour, minute=0, day=1):
+        return timezone.make_aware(datetime(2024, 6, day, hour, minute))
+
+    def test_vote_lands_in_minute_bucket(self):
+        candidate = create_ballot()
+        voter = create_voter('ABC1234567')
+
+        submit_vote(vote_request(voter, candidate))
+
+        bucket = TurnoutBucket.objects.get()
+        self.assertEqual((bucket.constituency, bucket.granularity, bucket.votes), ('Default Constituency', 'minute', 1))
+        self.assertEqual(bucket.bucket_start.second, 0)
+
+    def test_rollup_folds_minutes_into_local_hours(self):
+        record_turnout({
+            ('North', self.moment(7, 5)): 2,
+            ('North', self.moment(7, 59)): 1,
+            ('North', self.moment(8, 0)): 4,
+        })
+
+        roll_up_turnout(now=self.moment(20))
+
+        hours = TurnoutBucket.objects.filter(granularity='hour').order_by('bucket_start')
+        self.assertEqual([bucket.votes for bucket in hours], [3, 4])
+        self.assertEqual(timezone.localtime(hours[0].bucket_start).hour, 7)
+        self.assertFalse(TurnoutBucket.objects.filter(granularity='minute').exists())
+
+        # A late ballot for an hour already rolled up is added on the next run
+        record_turnout({('North', self.moment(7, 30)): 1})
+        roll_up_turnout(now=self.moment(20))
+        self.assertEqual(hours.all()[0].votes, 4)
+
+    def test_curve_keeps_coarse_buckets_and_accumulates(self):
+        record_turnout({('North', self.moment(9, 15, day=1)): 5})
+        roll_up_turnout(now=self.moment(9, day=30))
+        record_turnout({
+            ('North', self.moment(7, 10, day=30)): 1,
+            ('North', self.moment(7, 40, day=30)): 2,
+            ('South', self.moment(8, 0, day=30)): 3,
+        })
+
+        curves = turnout_curve(granularity='hour')
+
+        self.assertEqual(
+            [(point['granularity'], point['votes'], point['cumulative']) for point in curves['North']],
+            [('day', 5, 5), ('hour', 3, 8)],
+        )
+        self.assertEqual(curves['South'][0]['votes'], 3)
+        self.assertEqual(list(turnout_curve(constituency='South')), ['South'])
+
+
+class ReadReplicaRouterTests(TransactionTestCase):
+    def make_router(self, aliases, down=()):
+        router = ReadReplicaRouter()
+        self.checks = []
+
+        def check(alias):
+            self.checks.append(alias)
+            if alias in down:
+                raise ConnectionError('replica unreachable')
+
+        router.pool = ReplicaPool(aliases, check_seconds=60, retry_seconds=60, check=check)
+        return router
+
+    def read_db(self, router, model=Voter):
+        return read_only_view(lambda: router.db_for_read(model))()
+
+    def test_reads_outside_read_only_views_use_primary(self):
+        router = self.make_router(['replica1'])
+        self.assertIsNone(router.db_for_read(Voter))
+        self.assertEqual(self.read_db(router), 'replica1')
+
+    def test_round_robin_and_cached_health(self):
+        router = self.make_router(['replica1', 'replica2'])
+        self.assertEqual([self.read_db(router) for _ in range(4)], ['replica1', 'replica2', 'replica1', 'replica2'])
+        self.assertEqual(self.checks, ['replica1', 'replica2'])
+
+    def test_unhealthy_replica_is_skipped(self):
+        router = self.make_router(['replica1', 'replica2'], down={'replica1'})
+        self.assertEqual([self.read_db(router) for _ in range(3)], ['replica2'] * 3)
+
+        router = self.make_router(['replica1'], down={'replica1'})
+        with self.assertLogs('voting.db_router', 'WARNING'):
+            self.assertIsNone(self.read_db(router))
+
+    def test_writes_sessions_and_transactions_stay_on_primary(self):
+        from django.contrib.sessions.models import Session
+        from django.db import transaction
+
+        router = self.make_router(['replica1'])
+        self.assertEqual(router.db_for_write(Voter), 'default')
+        self.assertIsNone(self.read_db(router, Session))
+        with transaction.atomic():
+            self.assertIsNone(self.read_db(router))
+        self.assertFalse(router.allow_migrate('replica1', 'voting'))
+
+
+class IdempotencyTests(TransactionTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.candidate = create_ballot()
+        self.voter = create_voter('ABC1234567')
+
+    def voter_client(self):
+        client = Client()
+        session = client.session
+        session['user_details'] = {
+            'voter_id': self.voter.voter_id,
+            'voter_pk': self.voter.pk,
+            'constituency': self.voter.constituency,
+        }
+        session.save()
+        return client
+
+    def retry_client(self, client):
+        """A client resending the cookie `client` holds now, as a retry after a lost response would"""
+        retry = Client()
+        retry.cookies['sessionid'] = client.cookies['sessionid'].value
+        return retry
+
+    def post_vote(self, client, key, candidate_id=None):
+        return client.post(
+            '/vote',
+            data=json.dumps({'candidate_id': candidate_id or self.candidate.pk}),
+            content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_concurrent_duplicates_run_the_view_once(self):
+        original = self.voter_client()
+        responses = []
+        lock = threading.Lock()
+        start = threading.Barrier(8)
+
+        def retry():
+            client = self.retry_client(original)
+            start.wait()
+            response = self.post_vote(client, 'retry-1')
+            with lock:
+                responses.append(response)
+            connection.close()
+
+        threads = [threading.Thread(target=retry) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        replayed = [response for response in responses if response.get('Idempotent-Replayed')]
+        self.assertEqual(len(replayed), 7)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_replay_skips_the_database(self):
+        client = self.voter_client()
+        retry = self.retry_client(client)
+        first = self.post_vote(client, 'retry-2')
+
+        with self.assertNumQueries(0):
+            replay = self.post_vote(retry, 'retry-2')
+
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        client = self.voter_client()
+        retry = self.retry_client(client)
+        self.post_vote(client, 'retry-3')
+
+        response = self.post_vote(retry, 'retry-3', candidate_id=self.candidate.pk + 1)
+        self.assertEqual(response.status_code, 422)
+
+    def test_process_local_cache_is_rejected(self):
+        with override_settings(IDEMPOTENCY={**settings.IDEMPOTENCY, 'CACHE_ALIAS': 'default'}):
+            self.assertEqual([error.id for error in check_idempotency_cache(None)], ['voting.E003'])
+        self.assertEqual(check_idempotency_cache(None), [])
+
+    def test_registration_replay_restores_session_cookie(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+
+        def register():
+            return Client().post('/register-submit/', data={
+                'full_name': 'Asha Rao', 'username': 'asha', 'date_of_birth': '1990-01-01',
+                'gender': 'female', 'voter_id_epic': 'XYZ7654321', 'aadhaar_number': '123412341234',
+                'guardian_name': 'Ravi Rao', 'guardian_relation': 'father', 'phone_number': '9876543210',
+                'address': 'Bengaluru', 'constituency': 'Default Constituency',
+                'aadhaar_image': SimpleUploadedFile('a.png', b'png', 'image/png'),
+                'voter_id_image': SimpleUploadedFile('v.png', b'png', 'image/png'),
+            }, HTTP_IDEMPOTENCY_KEY='register-1')
+
+        with override_settings(MEDIA_ROOT=media_root):
+            first = register()
+            replay = register()
+
+        self.assertTrue(first.json()['success'])
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay.cookies['sessionid'].value, first.cookies['sessionid'].value)
+        self.assertEqual(RegisteredUser.objects.count(), 1)
+
+
+class AdmissionControlTests(TestCase):
+    def settings_for(self, **group):
+        config = {'RATE': 1000, 'BURST': 1000, 'MAX_CONCURRENT': 4, 'MAX_QUEUE': 4, 'TARGET_QUEUE_MS': 50}
+        config.update(group)
+        return override_settings(ADMISSION={'ENABLED': True, 'GROUPS': {'test': config}})
+
+    def request(self, constituency='North'):
+        request = RequestFactory().post('/vote')
+        request.session = SessionStore()
+        request.session['user_details'] = {'constituency': constituency}
+        return request
+
+    def test_token_bucket_is_per_constituency(self):
+        view = admission_controlled('test')(lambda request: HttpResponse())
+        with self.settings_for(RATE=0.5, BURST=2):
+            statuses = [view(self.request()).status_code for _ in range(3)]
+            other = view(self.request('South'))
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(admission_metrics()['test']['shed_rate'], 1)
+
+    def test_requests_beyond_the_latency_target_are_shed(self):
+        release = threading.Event()
+        entered = threading.Event()
+
+        @admission_controlled('test')
+        def slow_view(request):
+            entered.set()
+            release.wait(5)
+            return HttpResponse()
+
+        with self.settings_for(MAX_CONCURRENT=1, TARGET_QUEUE_MS=50):
+            holder = threading.Thread(target=slow_view, args=(self.request(),))
+            holder.start()
+            entered.wait(5)
+            shed = slow_view(self.request())
+            release.set()
+            holder.join()
+
+        self.assertEqual(shed.status_code, 429)
+        self.assertGreaterEqual(int(shed['Retry-After']), 1)
+        metrics = admission_metrics()['test']
+        self.assertEqual((metrics['admitted'], metrics['shed_timeout'], metrics['active']), (1, 1, 0))
+
+    def test_full_queue_is_shed_without_waiting(self):
+        release = threading.Event()
+        entered = threading.Event()
+
+        @admission_controlled('test')
+        def slow_view(request):
+            entered.set()
+            release.wait(5)
+            return HttpResponse()
+
+        with self.settings_for(MAX_CONCURRENT=1, MAX_QUEUE=0, TARGET_QUEUE_MS=5000):
+            holder = threading.Thread(target=slow_view, args=(self.request(),))
+            holder.start()
+            entered.wait(5)
+            started = time.monotonic()
+            shed = slow_view(self.request())
+            elapsed = time.monotonic() - started
+            release.set()
+            holder.join()
+
+        self.assertEqual(shed.status_code, 429)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(admission_metrics()['test']['shed_queue_full'], 1)
+
+
+class SessionBackendTests(TestCase):
+    def saved_session(self, **data):
+        session = CachedSessionStore()
+        session.update(data)
+        session.save()
+        return session.session_key
+
+    def test_reads_come_from_the_cache(self):
+        key = self.saved_session(user_details={'voter_id': 'ABC1234567'})
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedSessionStore(key)['user_details'], {'voter_id': 'ABC1234567'})
+
+    def test_unchanged_session_is_not_written(self):
+        key = self.saved_session(step='otp')
+        session = CachedSessionStore(key)
+        session['step'] = 'otp'
+        with self.assertNumQueries(0):
+            session.save()
+
+        session['step'] = 'vote'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(sum('UPDATE "django_session"' in query['sql'] for query in queries), 1)
+        session._cache.clear()
+        self.assertEqual(CachedSessionStore(key)['step'], 'vote')
+
+    def test_clear_expired_sweeps_in_batches(self):
+        from django.contrib.sessions.models import Session
+
+        live = self.saved_session(step='otp')
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i:025d}', session_data='', expire_date=expired)
+            for i in range(7)
+        ])
+
+        self.assertEqual(CachedSessionStore.clear_expired(batch_size=3), 7)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [live])
+
+
+class OTPServiceTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        rate_limit._backend = None
+
+    def test_codes_are_stored_hashed_and_single_use(self):
+        code = otp_service.issue('9876543210')
+
+        row = OTP.objects.get()
+        self.assertNotIn(code, row.otp_code)
+        self.assertFalse(otp_service.verify('9876543210', code, purpose='login'))
+        self.assertTrue(otp_service.verify('9876543210', code))
+        self.assertFalse(otp_service.verify('9876543210', code))
+        self.assertTrue(OTP.objects.get().is_used)
+
+    def test_too_many_wrong_guesses_lock_the_code(self):
+        code = otp_service.issue('9876543210')
+        wrong = f'{(int(code) + 1) % 1000000:06d}'
+        for _ in range(5):
+            self.assertFalse(otp_service.verify('9876543210', wrong))
+        self.assertFalse(otp_service.verify('9876543210', code))
+
+    def test_wrong_guesses_are_counted_across_workers(self):
+        from django.core.cache import cache
+
+        code = otp_service.issue('9876543210')
+        wrong = f'{(int(code) + 1) % 1000000:06d}'
+        for _ in range(5):
+            cache.clear()  # Each guess lands on a worker without the cache entry
+            self.assertFalse(otp_service.verify('9876543210', wrong))
+        self.assertEqual(OTP.objects.get().attempts, 5)
+        self.assertFalse(otp_service.verify('9876543210', code))
+
+    def test_issuing_a_code_retires_earlier_ones(self):
+        first = otp_service.issue('9876543210')
+        second = otp_service.issue('9876543210')
+
+        self.assertFalse(otp_service.verify('9876543210', first))
+        self.assertTrue(otp_service.verify('9876543210', second))
+
+    def test_cache_miss_verifies_with_one_indexed_update(self):
+        from django.core.cache import cache
+
+        code = otp_service.issue('9876543210')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(otp_service.verify('9876543210', code))
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE'])
+
+    def test_sweep_removes_expired_and_used_rows(self):
+        live = otp_service.issue('9000000001')
+        used = otp_service.issue('9000000002')
+        otp_service.verify('9000000002', used)
+        OTP.objects.bulk_create([
+            OTP(phone_number='9000000003', otp_code='x', expires_at=timezone.now() - timedelta(minutes=1))
+            for _ in range(4)
+        ])
+
+        self.assertEqual(otp_service.sweep_expired(batch_size=2), 5)
+        self.assertTrue(otp_service.verify('9000000001', live))
+
+    def test_login_requires_the_issued_code(self):
+        client = Client()
+        with override_settings(OTP_SERVICE={'EXPOSE_CODES': True}):
+            sent = client.post('/login-send-otp/', data={'method': 'voter_id', 'phone': '9876543210'},
+                               content_type='application/json').json()
+        wrong = f'{(int(sent["otp"]) + 1) % 1000000:06d}'
+
+        rejected = client.post('/login-verify-otp/', data={'otp': wrong}, content_type='application/json')
+        accepted = client.post('/login-verify-otp/', data={'otp': sent['otp']}, content_type='application/json')
+
+        self.assertFalse(rejected.json()['success'])
+        self.assertTrue(accepted.json()['success'])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        rate_limit._backend = None
+
+    def verify(self, voter_id, embedding=None):
+        return self.client.post('/api/verify-biometric/', data={
+            'voter_id': voter_id, 'encrypted_embedding': embedding, 'confidence': 0.9,
+        }, content_type='application/json')
+
+    def test_memory_backend_evicts_least_recently_hit_keys(self):
+        backend = rate_limit.MemoryBackend(max_keys=3)
+        for key in ('a', 'b', 'c'):
+            backend.hit(key, window=60, now=100)
+        backend.hit('a', window=60, now=101)  # Every window is still live
+
+        self.assertEqual(backend.hit('d', window=60, now=102), 1)
+        self.assertEqual(list(backend._events), ['c', 'a', 'd'])
+        for key in ('a', 'b', 'c', 'd'):
+            backend.lock(key, seconds=900, now=103)
+        self.assertEqual(len(backend._locked_until), 3)
+        self.assertEqual(backend.locked_for('a', now=104), 0)
+        self.assertGreater(backend.locked_for('d', now=104), 0)
+
+    def test_failed_attempts_lock_out_the_voter_before_any_queries(self):
+        for _ in range(3):
+            self.assertEqual(self.verify('ABC1234567').status_code, 400)
+
+        with CaptureQueriesContext(connection) as queries:
+            locked = self.verify('ABC1234567', embedding=[1, 2, 3])
+        self.assertEqual(locked.status_code, 429)
+        self.assertGreater(int(locked['Retry-After']), 800)
+        self.assertEqual(len(queries), 0)
+
+        # The shared address is not locked out by one voter's failures
+        self.assertEqual(self.verify('XYZ7654321').status_code, 400)
+
+    def test_forwarded_for_is_only_trusted_behind_configured_proxies(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.7')
+        self.assertEqual(rate_limit.client_ip(request), '10.0.0.2')
+        with override_settings(RATE_LIMIT={'TRUSTED_PROXY_COUNT': 1}):
+            self.assertEqual(rate_limit.client_ip(request), '203.0.113.7')
+        with override_settings(RATE_LIMIT={'TRUSTED_PROXY_COUNT': 3}):
+            self.assertEqual(rate_limit.client_ip(request), '10.0.0.2')  # Header shorter than the proxy chain
+
+    def test_rotating_forwarded_for_does_not_escape_the_ip_lockout(self):
+        for i in range(30):
+            self.client.post('/api/verify-biometric/', data={'voter_id': f'ROT{i:07d}', 'confidence': 0.9},
+                             content_type='application/json', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}')
+        response = self.client.post('/api/verify-biometric/', data={'voter_id': 'ROT9999999', 'confidence': 0.9},
+                                    content_type='application/json', HTTP_X_FORWARDED_FOR='198.51.100.250')
+        self.assertEqual(response.status_code, 429)
+
+    def test_request_cap_applies_per_phone(self):
+        send = lambda phone: self.client.post('/login-send-otp/', data={'method': 'voter_id', 'phone': phone},
+                                              content_type='application/json')
+        statuses = [send('9876543210').status_code for _ in range(6)]
+
+        self.assertEqual(statuses, [200] * 5 + [429])
+        self.assertEqual(send('9123456789').status_code, 200)
+
+    def test_cache_backend_counts_a_sliding_window(self):
+        from django.core.cache import cache
+        cache.clear()
+        backend = rate_limit.CacheBackend()
+
+        for _ in range(4):
+            backend.hit('key', 60, 1200.0)
+        # Halfway through the next window half of the previous count still applies
+        self.assertEqual(backend.hit('key', 60, 1290.0), 3)
+
+        backend.lock('key', 30, 1000.0)
+        self.assertEqual(backend.locked_for('key', 1010.0), 20.0)
+
+
+class RegistrationIndexTests(TestCase):
+    def setUp(self):
+        registration_index._index = None
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def register(self, **fields):
+        data = {
+            'full_name': 'Asha Rao', 'username': 'asha', 'date_of_birth': '1990-01-01',
+            'gender': 'female', 'voter_id_epic': 'XYZ7654321', 'aadhaar_number': '123412341234',
+            'guardian_name': 'Ravi Rao', 'guardian_relation': 'father', 'phone_number': '9876543210',
+            'address': 'Bengaluru', 'constituency': 'Default Constituency',
+            'aadhaar_image': SimpleUploadedFile('a.png', b'png', 'image/png'),
+            'voter_id_image': SimpleUploadedFile('v.png', b'png', 'image/png'),
+        }
+        data.update(fields)
+        return Client().post('/register-submit/', data=data).json()
+
+    def registration_queries(self, queries):
+        return [query['sql'] for query in queries if 'voting_registereduser' in query['sql']]
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = registration_index.BloomFilter(1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add(f'EPIC{number}')
+
+        self.assertTrue(all(f'EPIC{number}' in bloom for number in range(1000)))
+        false_positives = sum(f'OTHER{number}' in bloom for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_new_registration_skips_the_uniqueness_query(self):
+        self.assertTrue(self.register()['success'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register(username='ravi', voter_id_epic='PQR1111111',
+                                     aadhaar_number='999988887777', phone_number='9123456789')
+        self.assertTrue(response['success'])
+        self.assertEqual([sql.split()[0] for sql in self.registration_queries(queries)], ['INSERT'])
+
+    def test_collisions_are_reported_from_one_query(self):
+        self.register()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register(voter_id_epic='PQR1111111', aadhaar_number='999988887777')
+        self.assertFalse(response['success'])
+        self.assertEqual(response['message'], 'Username already exists')
+        self.assertEqual(response['conflicts'], ['username', 'phone_number'])
+        self.assertEqual(len(self.registration_queries(queries)), 1)
+
+    def test_rows_from_other_processes_are_caught_by_the_constraint(self):
+        registration_index.get_index()
+        # bulk_create sends no signals, like an insert made by another worker
+        RegisteredUser.objects.bulk_create([RegisteredUser(
+            full_name='Other', username='other', date_of_birth='1980-01-01', gender='male',
+            voter_id_epic='XYZ7654321', aadhaar_number='111122223333', guardian_name='G',
+            guardian_relation='father', phone_number='9000000000', address='A', constituency='C',
+        )])
+
+        response = self.register()
+        self.assertFalse(response['success'])
+        self.assertEqual(response['message'], 'Voter ID already registered')
+        self.assertEqual(RegisteredUser.objects.count(), 1)
+
+
+def image_bytes(size=(3000, 2000), image_format='PNG', **save_options):
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.linear_gradient('L').resize(size).convert('RGB').save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+
+class DocumentPipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def register(self, aadhaar, voter_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = Client().post('/register-submit/', data={
+                'full_name': 'Asha Rao', 'username': 'asha', 'date_of_birth': '1990-01-01',
+                'gender': 'female', 'voter_id_epic': 'XYZ7654321', 'aadhaar_number': '123412341234',
+                'guardian_name': 'Ravi Rao', 'guardian_relation': 'father', 'phone_number': '9876543210',
+                'address': 'Bengaluru', 'constituency': 'Default Constituency',
+                'aadhaar_image': SimpleUploadedFile('aadhaar.png', aadhaar, 'image/png'),
+                'voter_id_image': SimpleUploadedFile('voter.jpg', voter_id, 'image/jpeg'),
+            })
+        self.assertTrue(response.json()['success'])
+        return RegisteredUser.objects.get()
+
+    def test_images_are_downscaled_and_stripped_of_metadata(self):
+        from io import BytesIO
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        original = image_bytes(image_format='JPEG', exif=exif.tobytes())
+        processed, thumbnail, info = document_pipeline.process_image(original)
+
+        with Image.open(BytesIO(processed)) as image:
+            self.assertEqual(max(image.size), 1280)
+            self.assertFalse(image.getexif())
+        with Image.open(BytesIO(thumbnail)) as image:
+            self.assertEqual(max(image.size), 240)
+        self.assertEqual(info['original_size'], '3000x2000')
+
+    def test_registration_documents_are_processed_after_commit(self):
+        registration = self.register(image_bytes(), image_bytes(image_format='JPEG'))
+
+        storage = registration.aadhaar_image.storage
+        self.assertTrue(registration.aadhaar_image.name.endswith('.webp'))
+        self.assertTrue(registration.voter_id_thumbnail.name.startswith('user_documents/thumbnails/'))
+        # Only the processed copy remains
+        stored = [name for root, dirs, names in os.walk(storage.path('user_documents/aadhaar')) for name in names]
+        self.assertEqual(stored, [os.path.basename(registration.aadhaar_image.name)])
+        self.assertEqual(StoredBlob.objects.filter(name__startswith='user_documents/aadhaar/').count(), 1)
+
+        logs = {log.field: log for log in DocumentProcessingLog.objects.all()}
+        self.assertEqual({log.status for log in logs.values()}, {'processed'})
+        self.assertEqual(logs['aadhaar_image'].original_format, 'PNG')
+        self.assertLess(logs['aadhaar_image'].processed_bytes, logs['aadhaar_image'].original_bytes)
+
+    def test_concurrent_change_wins_over_a_stale_run(self):
+        registration = self.register(image_bytes(), image_bytes(image_format='JPEG'))
+        process_field = document_pipeline._process_field
+
+        def edited_meanwhile(registration, field):
+            result = process_field(registration, field)
+            RegisteredUser.objects.filter(pk=registration.pk).update(aadhaar_image='user_documents/aadhaar/edited.png')
+            return result
+
+        with mock.patch.object(document_pipeline, '_process_field', side_effect=edited_meanwhile):
+            self.assertEqual(document_pipeline.process_registration_documents(registration.pk, force=True), [])
+
+        registration.refresh_from_db()
+        self.assertEqual(registration.aadhaar_image.name, 'user_documents/aadhaar/edited.png')
+        self.assertEqual(DocumentProcessingLog.objects.count(), 2)  # Only the first run's
+
+    def test_drain_waits_for_scheduled_jobs(self):
+        processed = []
+
+        def slow(registration_id):
+            time.sleep(0.1)
+            processed.append(registration_id)
+
+        with mock.patch.object(document_pipeline, 'process_registration_documents', side_effect=slow):
+            document_pipeline._submit(1)
+            document_pipeline._submit(2)
+            self.assertTrue(document_pipeline.drain(timeout=5))
+        self.assertEqual(sorted(processed), [1, 2])
+
+    def test_invalid_upload_is_kept_and_logged_as_rejected(self):
+        registration = self.register(b'not an image', image_bytes(image_format='JPEG'))
+
+        self.assertTrue(registration.aadhaar_image.name.endswith('.png'))
+        self.assertTrue(registration.aadhaar_image.storage.exists(registration.aadhaar_image.name))
+        self.assertFalse(registration.aadhaar_thumbnail)
+        rejected = DocumentProcessingLog.objects.get(field='aadhaar_image')
+        self.assertEqual(rejected.status, 'rejected')
+
+    def test_rejected_uploads_are_not_retried_until_replaced(self):
+        registration = self.register(b'not an image', image_bytes(image_format='JPEG'))
+        self.assertFalse(document_pipeline.pending_registrations().exists())
+
+        call_command('process_documents', '--workers', '1', stdout=open(os.devnull, 'w'))
+        self.assertEqual(DocumentProcessingLog.objects.filter(status='rejected').count(), 1)
+
+        storage = registration.aadhaar_image.storage
+        replacement = storage.save('user_documents/aadhaar/replacement.png', ContentFile(image_bytes()))
+        RegisteredUser.objects.filter(pk=registration.pk).update(aadhaar_image=replacement)
+        self.assertEqual(list(document_pipeline.pending_registrations()), [registration])
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.party = Party.objects.create(name='Test Party', symbol='party_symbols/test.png')
+
+    def candidate(self, name, content):
+        candidate = Candidate(name=name, party=self.party, constituency='Default Constituency')
+        candidate.photo.save('placeholder.png', ContentFile(content), save=False)
+        candidate.save()
+        return candidate
+
+    def test_identical_uploads_share_one_reference_counted_file(self):
+        first = self.candidate('First', b'same bytes')
+        second = self.candidate('Second', b'same bytes')
+        other = self.candidate('Other', b'other bytes')
+
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertNotEqual(first.photo.name, other.photo.name)
+        self.assertEqual(StoredBlob.objects.get(name=first.photo.name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(second.photo.storage.exists(second.photo.name))
+        self.assertEqual(StoredBlob.objects.get(name=second.photo.name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(second.photo.storage.exists(second.photo.name))
+        self.assertFalse(StoredBlob.objects.filter(name=second.photo.name).exists())
+
+    def test_concurrent_writers_of_the_same_content_store_one_file(self):
+        storage = Candidate._meta.get_field('photo').storage
+        content = b'same bytes' * 1000
+        name = blob_name('candidate_photos/placeholder.png', hashlib.sha256(content).hexdigest())
+        barrier = threading.Barrier(8)
+        written = []
+
+        def write():
+            barrier.wait()
+            written.append(storage._write_blob(name, ContentFile(content)))
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(sorted(written), [False] * 7 + [True])
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(name))), [os.path.basename(name)])
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), content)
+
+        # A writer that checked before the file appeared finishes instead of looping
+        with mock.patch.object(FileSystemStorage, 'exists', return_value=False):
+            self.assertEqual(storage.save('candidate_photos/placeholder.png', ContentFile(content)), name)
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+
+    def test_dedupe_media_collapses_existing_copies(self):
+        storage = Candidate._meta.get_field('photo').storage
+        os.makedirs(storage.path('candidate_photos'))
+        for suffix in ('', '_a1', '_b2'):
+            with open(storage.path(f'candidate_photos/placeholder{suffix}.png'), 'wb') as legacy:
+                legacy.write(b'placeholder image')
+        for suffix in ('', '_a1', '_b2'):
+            Candidate.objects.create(name=f'Candidate{suffix}', party=self.party, constituency='Default Constituency')
+            Candidate.objects.filter(name=f'Candidate{suffix}').update(photo=f'candidate_photos/placeholder{suffix}.png')
+
+        call_command('dedupe_media', stdout=open(os.devnull, 'w'))
+
+        names = set(Candidate.objects.values_list('photo', flat=True))
+        self.assertEqual(len(names), 1)
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.name, blob.refcount), (names.pop(), 3))
+        self.assertEqual(storage.listdir('candidate_photos')[1], [])
+
+    def test_interrupted_dedupe_media_keeps_every_referenced_file(self):
+        storage = Candidate._meta.get_field('photo').storage
+        os.makedirs(storage.path('candidate_photos'))
+        for suffix in ('', '_a1'):
+            with open(storage.path(f'candidate_photos/placeholder{suffix}.png'), 'wb') as legacy:
+                legacy.write(b'placeholder image')
+            Candidate.objects.create(name=f'Candidate{suffix}', party=self.party, constituency='Default Constituency')
+            Candidate.objects.filter(name=f'Candidate{suffix}').update(photo=f'candidate_photos/placeholder{suffix}.png')
+
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError('connection lost')):
+            with self.assertRaises(DatabaseError):
+                call_command('dedupe_media', stdout=open(os.devnull, 'w'))
+        for name in Candidate.objects.values_list('photo', flat=True):
+            self.assertTrue(storage.exists(name))
+
+        call_command('dedupe_media', stdout=open(os.devnull, 'w'))
+        name, = set(Candidate.objects.values_list('photo', flat=True))
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(storage.listdir('candidate_photos')[1], [])
+
+
+class ElectoralRollImportTests(TestCase):
+    def write_roll(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, name)
+        with open(path, 'w') as roll:
+            roll.write(content)
+        return path
+
+    def import_roll(self, path, *args):
+        call_command('import_electoral_roll', path, '--workers', '1', '--batch-size', '2', *args,
+                     stdout=open(os.devnull, 'w'))
+        with open(f'{path}.rejects.jsonl') as rejects:
+            return [json.loads(line) for line in rejects]
+
+    def test_csv_rows_are_imported_and_bad_rows_rejected(self):
+        create_voter('ABC1234567')
+        path = self.write_roll('roll.csv', (
+            'epic,name,constituency,phone,dob\n'
+            'xyz7654321,Asha Rao,North,+91 98765 43210,15/08/1980\n'
+            'PQR1111111,Ravi Rao,North,,\n'
+            'ABC1234567,Already There,North,,\n'
+            'bad id!,Nobody,North,,\n'
+            'PQR2222222,,North,,\n'
+        ))
+
+        rejects = self.import_roll(path)
+
+        voter = Voter.objects.select_related('user').get(voter_id='XYZ7654321')
+        self.assertEqual((voter.phone_number, str(voter.date_of_birth)), ('9876543210', '1980-08-15'))
+        self.assertFalse(voter.user.has_usable_password())
+        self.assertTrue(Voter.objects.filter(voter_id='PQR1111111').exists())
+        self.assertEqual(Voter.objects.count(), 3)
+        self.assertEqual(sorted((reject['line'], reject['reason']) for reject in rejects), [
+            (4, 'voter_id ABC1234567 already exists'),
+            (5, "invalid voter_id 'bad id!'"),
+            (6, 'missing full_name'),
+        ])
+
+    def test_overlong_values_and_bad_emails_reject_their_row_only(self):
+        path = self.write_roll('roll.csv', (
+            'epic,name,constituency,email\n'
+            f'PQR1111111,{"A" * 201},North,\n'
+            'PQR2222222,Ravi Rao,North,not-an-email\n'
+            'PQR3333333,Asha Rao,North,asha@example.com\n'
+        ))
+
+        rejects = self.import_roll(path)
+
+        self.assertEqual(list(Voter.objects.values_list('voter_id', flat=True)), ['PQR3333333'])
+        self.assertEqual(sorted((reject['line'], reject['reason']) for reject in rejects), [
+            (2, 'full_name longer than 200 characters'),
+            (3, "invalid email 'not-an-email'"),
+        ])
+
+    def test_jsonl_registrations_are_linked_to_new_voters(self):
+        row = {'voter_id': 'XYZ7654321', 'full_name': 'Asha Rao', 'constituency': 'North', 'phone': '9876543210',
+               'dob': '1980-08-15', 'gender': 'F', 'guardian_name': 'Ravi Rao', 'guardian_relation': 'father',
+               'aadhaar': '123412341234', 'address': 'Bengaluru'}
+        path = self.write_roll('roll.jsonl', '\n'.join([
+            json.dumps(row),
+            '{not json',
+            json.dumps({**row, 'voter_id': 'PQR1111111'}),  # Same Aadhaar and phone in one batch
+        ]) + '\n')
+
+        rejects = self.import_roll(path, '--registrations')
+
+        registration = RegisteredUser.objects.select_related('linked_voter').get()
+        self.assertEqual(registration.linked_voter.voter_id, 'XYZ7654321')
+        self.assertEqual((registration.gender, registration.is_approved), ('female', True))
+        self.assertEqual([reject['reason'] for reject in rejects], [
+            'malformed line', 'aadhaar_number already registered',
+        ])
+
+
+class ProvisioningTests(TestCase):
+    def setUp(self):
+        rate_limit._backend = None
+
+    def registrations(self, count, approved=True):
+        seed_registrations(count)
+        registrations = RegisteredUser.objects.order_by('pk')
+        registrations.update(is_approved=approved)
+        return list(registrations.values_list('pk', flat=True))
+
+    def test_approved_registrations_get_linked_accounts(self):
+        registration_ids = self.registrations(3)
+        RegisteredUser.objects.filter(pk=registration_ids[2]).update(is_approved=False)
+
+        stats = provision_registrations(registration_ids)
+
+        self.assertEqual((stats['provisioned'], stats['voters_created']), (2, 2))
+        for registration in RegisteredUser.objects.filter(is_approved=True).select_related('linked_voter__user'):
+            self.assertEqual(registration.linked_voter.voter_id, registration.voter_id_epic)
+            self.assertEqual(registration.linked_voter.user.username, registration.username)
+            self.assertFalse(registration.linked_voter.user.has_usable_password())
+        self.assertIsNone(RegisteredUser.objects.get(pk=registration_ids[2]).linked_voter)
+        self.assertEqual(provision_registrations(registration_ids)['provisioned'], 0)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        registration_ids = self.registrations(40)
+
+        with CaptureQueriesContext(connection) as small:
+            provision_registrations(registration_ids[:2])
+        with CaptureQueriesContext(connection) as large:
+            provision_registrations(registration_ids[2:])
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Voter.objects.count(), 40)
+
+    def test_existing_voter_is_reused(self):
+        registration_id, = self.registrations(1)
+        registration = RegisteredUser.objects.get(pk=registration_id)
+        voter = create_voter(registration.voter_id_epic)
+
+        stats = provision_registrations([registration_id])
+
+        self.assertEqual((stats['provisioned'], stats['voters_created']), (1, 0))
+        self.assertEqual(RegisteredUser.objects.get(pk=registration_id).linked_voter, voter)
+
+    def test_otp_verification_provisions_the_voter(self):
+        registration_id, = self.registrations(1, approved=False)
+        registration = RegisteredUser.objects.get(pk=registration_id)
+        client = Client()
+        session = client.session
+        session['pending_registration_id'] = registration_id
+        session.save()
+        code = otp_service.issue(registration.phone_number, purpose='registration')
+
+        response = client.post('/verify-otp/', data={'otp': code}, content_type='application/json')
+
+        self.assertTrue(response.json()['success'])
+        registration.refresh_from_db()
+        self.assertTrue(registration.is_approved)
+        self.assertFalse(registration.linked_voter.user.has_usable_password())
+
+    def test_failed_provisioning_leaves_the_registration_pending(self):
+        registration_id, = self.registrations(1, approved=False)
+        registration = RegisteredUser.objects.get(pk=registration_id)
+        # The username already belongs to a voter under another EPIC number
+        user = User.objects.create(username=registration.username)
+        Voter.objects.create(user=user, voter_id='OTHER00001')
+        client = Client()
+        session = client.session
+        session['pending_registration_id'] = registration_id
+        session.save()
+        code = otp_service.issue(registration.phone_number, purpose='registration')
+
+        response = client.post('/verify-otp/', data={'otp': code}, content_type='application/json')
+
+        self.assertFalse(response.json()['success'])
+        registration.refresh_from_db()
+        self.assertFalse(registration.is_approved)
+        self.assertIsNone(registration.linked_voter)
+        self.assertEqual(client.session['pending_registration_id'], registration_id)
+
+    def test_admin_action_approves_and_provisions(self):
+        self.registrations(2, approved=False)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin_user)
+
+        client.post('/admin/voting/registereduser/', data={
+            'action': 'approve_registration',
+            '_selected_action': list(RegisteredUser.objects.values_list('pk', flat=True)),
+        })
+
+        self.assertEqual(RegisteredUser.objects.filter(is_approved=True, linked_voter__isnull=False).count(), 2)
+
+    def test_large_admin_approval_leaves_provisioning_to_the_command(self):
+        self.registrations(3, approved=False)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin_user)
+
+        with mock.patch('voting.admin.ADMIN_PROVISION_LIMIT', 2):
+            client.post('/admin/voting/registereduser/', data={
+                'action': 'approve_registration',
+                '_selected_action': list(RegisteredUser.objects.values_list('pk', flat=True)),
+            })
+
+        self.assertEqual(RegisteredUser.objects.filter(is_approved=True).count(), 3)
+        self.assertFalse(Voter.objects.exists())
+        call_command('provision_voters', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Voter.objects.count(), 3)
+
+
+class ElectorSearchTests(TestCase):
+    def setUp(self):
+        elector_search._index = None
+        rate_limit._backend = None
+        self.addCleanup(setattr, elector_search, '_index', None)
+        for voter_id, name, constituency in [
+            ('ABC1234567', 'Asha Rao', 'Varanasi'),
+            ('ABC7654321', 'Ravi Kumar', 'Varanasi'),
+            ('XYZ1111111', 'Ravi Kumar', 'Amethi'),
+            ('XYZ2222222', 'Meena Iyer', 'Amethi'),
+        ]:
+            voter = create_voter(voter_id, constituency)
+            voter.full_name = name
+            voter.save()
+
+    def voter_ids(self, query, **options):
+        return [result['voter_id'] for result in elector_search.search(query, **options)['results']]
+
+    def test_prefix_matches_on_any_field_come_first(self):
+        self.assertEqual(self.voter_ids('asha r'), ['ABC1234567'])
+        self.assertEqual(self.voter_ids('ABC'), [])  # No digits: not an EPIC number
+        self.assertEqual(self.voter_ids('abc'), [])
+        self.assertEqual(self.voter_ids('ABC1'), ['ABC1234567'])
+        self.assertEqual(self.voter_ids('xyz2222222'), ['XYZ2222222'])
+        self.assertEqual(self.voter_ids('kum'), ['ABC7654321', 'XYZ1111111'])
+        self.assertEqual(self.voter_ids('amet')[:2], ['XYZ1111111', 'XYZ2222222'])
+
+    def test_misspelled_names_are_found(self):
+        self.assertEqual(self.voter_ids('Ravi Kumaar'), ['ABC7654321', 'XYZ1111111'])
+        self.assertEqual(self.voter_ids('Ravi Kumaar', constituency='amethi'), ['XYZ1111111'])
+        self.assertEqual(self.voter_ids('Zubin Mehta'), [])
+
+    def test_keyset_pages_cover_every_match_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = elector_search.search('a', limit=1, cursor=cursor)
+            seen.extend(result['voter_id'] for result in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.voter_ids('a', limit=10))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_index_follows_inserts_renames_and_deletes(self):
+        self.voter_ids('asha')  # Warm the index
+        user = User.objects.create(username='bulk')
+        Voter.objects.bulk_create([Voter(user=user, voter_id='NEW0000001', full_name='Asha Bhosle', constituency='Pune')])
+        renamed = Voter.objects.get(voter_id='XYZ2222222')
+        renamed.full_name = 'Meena Rao'
+        renamed.save()
+        Voter.objects.filter(voter_id='ABC1234567').delete()
+
+        self.assertEqual(self.voter_ids('asha'), ['NEW0000001'])
+        self.assertEqual(self.voter_ids('meena rao'), ['XYZ2222222'])
+
+    def test_epic_prefix_pages_rank_the_exact_number_first(self):
+        create_voter('XYZ22222220')
+        create_voter('XYZ22222221')
+        first = elector_search.search('XYZ2222222', limit=2)
+        second = elector_search.search('XYZ2222222', limit=2, cursor=first['next_cursor'])
+
+        self.assertEqual([result['voter_id'] for result in first['results']], ['XYZ2222222', 'XYZ22222220'])
+        self.assertEqual([result['voter_id'] for result in second['results']], ['XYZ22222221'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_database_prefix_search_matches_the_index(self):
+        rows = elector_search.search_database('RAVI', fuzzy=False)
+        self.assertEqual([row[1] for row in rows], self.voter_ids('ravi'))
+
+    def test_trigram_match_is_not_registered_project_wide(self):
+        self.assertNotIn('trigram_match', CharField.get_lookups())
+        voters = Voter.objects.alias(upper_full_name=Upper('full_name')).filter(
+            elector_search.TrigramMatch(F('upper_full_name'), 'RAVI'))
+        sql, params = voters.query.sql_with_params()
+        self.assertIn('UPPER("voting_voter"."full_name") %% ', sql)
+        self.assertEqual(params, ('RAVI',))
+
+    def test_api_validates_and_stays_within_budget(self):
+        client = Client()
+        self.assertEqual(client.get('/api/electors/search/', {'q': 'a'}).status_code, 400)
+        self.assertEqual(client.get('/api/electors/search/', {'q': 'ravi', 'cursor': 'nope'}).status_code, 400)
+
+        response = client.get('/api/electors/search/', {'q': 'ravi kumar', 'limit': 1})
+        data = response.json()
+        self.assertEqual([result['full_name'] for result in data['results']], ['Ravi Kumar'])
+        following = client.get('/api/electors/search/', {'q': 'ravi kumar', 'cursor': data['next_cursor']}).json()
+        self.assertEqual([result['voter_id'] for result in following['results']], ['XYZ1111111'])
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        rate_limit._backend = None
+        self.next_registration = 0
+
+    def register(self, full_name, date_of_birth='1990-04-12', guardian_name='Mohan Lal'):
+        self.next_registration += 1
+        return RegisteredUser.objects.create(
+            full_name=full_name, date_of_birth=date_of_birth, gender='male', guardian_name=guardian_name,
+            guardian_relation='father', address='Address', constituency='Varanasi',
+            **registration_values(self.next_registration),
+        )
+
+    def detect(self):
+        call_command('detect_duplicates', '--workers', '0', stdout=open(os.devnull, 'w'))
+        return {(s.registration_id, s.similar_to_id): s for s in DuplicateSuspect.objects.all()}
+
+    def test_spelling_variants_share_blocking_keys(self):
+        self.assertEqual(phonetic_name('Ravi Kumar'), phonetic_name('Kumaar Ravee'))
+        self.assertEqual(phonetic_name('Suresh Sharma'), phonetic_name('Sursh Sarma'))
+        self.assertEqual(phonetic_name('Coomar'), phonetic_name('Kumar'))
+        self.assertNotEqual(phonetic_name('Ravi Kumar'), phonetic_name('Ramesh Kumar'))
+        self.assertEqual(blocking_keys('Asha Rao', None, 'Mohan Lal'), [None, None, 'AS R|L MN'])
+
+    def test_typos_in_any_one_field_are_found(self):
+        original = self.register('Ravi Kumar')
+        misspelt = self.register('Ravi Kumaar')
+        other_dob = self.register('Ravi Kumar', date_of_birth='1990-12-04', guardian_name='Mohan Lal')
+        other_name = self.register('Ravi Kunar', guardian_name='Mohan Lal')
+        self.register('Ramesh Kumar', date_of_birth='1975-01-30', guardian_name='Suresh Nair')
+        self.register('Asha Rao')
+
+        suspects = self.detect()
+
+        self.assertIn((misspelt.pk, original.pk), suspects)
+        self.assertIn((other_dob.pk, original.pk), suspects)  # Day and month swapped
+        self.assertIn((other_name.pk, original.pk), suspects)  # A wrong consonant changes the phonetic key
+        self.assertEqual(suspects[(misspelt.pk, original.pk)].blocking_pass, 'name_dob')
+        self.assertEqual(suspects[(other_name.pk, original.pk)].blocking_pass, 'dob_guardian')
+        self.assertTrue(all(suspect.score >= 0.9 for suspect in suspects.values()))
+        involved = {pk for pair in suspects for pk in pair}
+        self.assertEqual(involved, {original.pk, misspelt.pk, other_dob.pk, other_name.pk})
+
+    def test_reruns_keep_reviews_and_drop_stale_pairs(self):
+        original = self.register('Meena Iyer')
+        reviewed = self.register('Meena Iyyer')
+        corrected = self.register('Meenaa Iyer')
+        self.detect()
+        DuplicateSuspect.objects.filter(registration=reviewed).update(status='dismissed')
+        RegisteredUser.objects.filter(pk=corrected.pk).update(full_name='Priya Nair', guardian_name='Arun Nair')
+
+        suspects = self.detect()
+
+        self.assertEqual(suspects[(reviewed.pk, original.pk)].status, 'dismissed')
+        self.assertNotIn((corrected.pk, original.pk), suspects)
+
+    @override_settings(DUPLICATE_DETECTION={'MIN_SCORE': 0, 'MAX_BLOCK_SIZE': 5, 'WINDOW': 1})
+    def test_oversized_blocks_compare_name_neighbours(self):
+        # One dob_guardian block of six: five neighbour pairs instead of fifteen
+        registrations = [self.register(name) for name in [
+            'Rahul Varma', 'Anita Das', 'Neha Shetty', 'Deepak Joshi', 'Geeta Bose', 'Sanjay Gupta',
+        ]]
+
+        suspects = self.detect()
+
+        by_name = sorted(registrations, key=lambda registration: normalize_name(registration.full_name))
+        neighbours = {tuple(sorted((a.pk, b.pk), reverse=True)) for a, b in zip(by_name, by_name[1:])}
+        self.assertEqual(set(suspects), neighbours)
+
+    def test_large_blocks_are_read_in_batches(self):
+        registrations = [self.register(name) for name in [
+            'Ravi Kumar', 'Ravi Kumaar', 'Ravee Kumar', 'Asha Rao', 'Ravi Kumarr',
+        ]]
+        block = (PASSES.index('dob_guardian'), [registration.pk for registration in registrations])
+
+        with mock.patch('voting.duplicate_detection.READ_BATCH_SIZE', 2), \
+                CaptureQueriesContext(connection) as queries:
+            suspects = compare_blocks([block])
+
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len({(suspect[0], suspect[1]) for suspect in suspects}), 6)  # Every pair of the four Ravis
+
+    def test_admin_review(self):
+        self.register('Ravi Kumar')
+        self.register('Ravi Kumaar')
+        self.detect()
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin_user)
+
+        self.assertEqual(client.get('/admin/voting/duplicatesuspect/').status_code, 200)
+        client.post('/admin/voting/duplicatesuspect/', data={
+            'action': 'mark_confirmed',
+            '_selected_action': list(DuplicateSuspect.objects.values_list('pk', flat=True)),
+        })
+
+        suspect = DuplicateSuspect.objects.get()
+        self.assertEqual(suspect.status, 'confirmed')
+        self.assertIsNotNone(suspect.reviewed_at)
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        embedding_cache._cache = None
+        caches['default'].clear()
+        self.addCleanup(setattr, embedding_cache, '_cache', None)
+        self.voter = create_voter('ABC1234567')
+        self.vector = np.random.default_rng(1).standard_normal(128).astype(np.float32)
+        self.register(self.vector)
+
+    def register(self, vector):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FederatedAuthenticationManager.register_biometric_embedding(self.voter, vector, 0.9, 'v1.0.0')
+
+    def verify(self, vector):
+        return FederatedAuthenticationManager.verify_biometric('ABC1234567', vector)
+
+    def test_repeat_verification_is_served_from_cache(self):
+        self.assertTrue(self.verify(self.vector * 2)[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            verified, similarity, message = self.verify(self.vector)
+
+        self.assertTrue(verified)
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+        self.assertEqual(len(queries), 1)  # The audit log row; last_used was just written
+        self.assertFalse(self.verify(-self.vector)[0])
+        self.assertEqual(BiometricAuthLog.objects.filter(success=True).count(), 2)
+
+    def test_registering_or_removing_embeddings_invalidates(self):
+        self.verify(self.vector)
+        replacement = np.random.default_rng(2).standard_normal(128).astype(np.float32)
+        self.register(replacement)
+        self.assertFalse(self.verify(self.vector)[0])
+        self.assertTrue(self.verify(replacement)[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BiometricEmbedding.objects.get(is_active=True).deactivate()
+        self.assertEqual(self.verify(replacement)[2], "No biometric data registered")
+
+        self.register(self.vector)
+        self.verify(self.vector)
+        self.client.force_login(self.voter.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/delete-biometric/')
+        self.assertEqual(self.verify(self.vector)[2], "No biometric data registered")
+
+    def test_other_processes_see_invalidation_through_the_generation(self):
+        self.verify(self.vector)
+        # Another process deactivates without touching this process's LRU
+        BiometricEmbedding.objects.update(is_active=False)
+        caches['shared'].incr('biometric:generation:ABC1234567')  # Set when setUp registered
+
+        self.assertEqual(self.verify(self.vector)[2], "No biometric data registered")
+
+    def test_evicted_and_expired_vectors_are_zeroed(self):
+        cache = embedding_cache.EmbeddingCache(max_entries=1, ttl=300)
+        first = embedding_cache.CachedEmbedding(1, 1, 'v1', embedding_cache.normalize(self.vector), None, 0, time.monotonic() + 300)
+        cache.put('A', first)
+        cache.put('B', embedding_cache.CachedEmbedding(2, 2, 'v1', embedding_cache.normalize(self.vector), None, 0, time.monotonic() - 1))
+
+        self.assertFalse(first.vector.any())
+        self.assertIsNone(cache.score('B', 0, self.vector))  # Expired
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_is_not_used_without_a_shared_generation_counter(self):
+        with override_settings(BIOMETRIC_EMBEDDING_CACHE={'CACHE_ALIAS': 'default'}):
+            self.assertEqual([error.id for error in check_embedding_cache(None)], ['voting.E002'])
+            self.verify(self.vector)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.verify(self.vector)[0])
+        self.assertEqual(len(embedding_cache.get_cache()), 0)
+        self.assertEqual(len(queries), 3)  # Voter, embedding, audit row
+
+
+class BatchBiometricVerificationTests(TestCase):
+    def setUp(self):
+        embedding_cache._cache = None
+        rate_limit._backend = None
+        caches['default'].clear()
+        self.addCleanup(setattr, embedding_cache, '_cache', None)
+        rng = np.random.default_rng(3)
+        self.vectors = {}
+        for voter_id in ['BAT0000001', 'BAT0000002', 'BAT0000003']:
+            self.vectors[voter_id] = rng.standard_normal(128).astype(np.float32)
+            voter = create_voter(voter_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                FederatedAuthenticationManager.register_biometric_embedding(voter, self.vectors[voter_id], 0.9, 'v1.0.0')
+        create_voter('BAT0000004')  # No embedding registered
+
+    def test_batch_matches_single_verification_in_one_query_per_step(self):
+        items = [
+            ('BAT0000001', self.vectors['BAT0000001']),
+            ('BAT0000002', -self.vectors['BAT0000002']),
+            ('BAT0000003', self.vectors['BAT0000003'] * 3),
+            ('BAT0000004', self.vectors['BAT0000001']),
+            ('NOSUCHVOTER', self.vectors['BAT0000001']),
+            ('BAT0000001', np.zeros(128, dtype=np.float32)),
+        ]
+        FederatedAuthenticationManager.verify_biometric('BAT0000003', self.vectors['BAT0000003'])  # Cached
+
+        with CaptureQueriesContext(connection) as queries:
+            results = FederatedAuthenticationManager.verify_biometric_batch(items, ip_address='10.0.0.1')
+
+        # Embeddings, voters without one, last_used, audit rows
+        self.assertEqual(len(queries), 4)
+        self.assertEqual([result[0] for result in results], [True, False, True, False, False, False])
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertAlmostEqual(results[1][1], -1.0, places=5)
+        self.assertEqual(results[3][2], "No biometric data registered")
+        self.assertEqual(results[4][2], "Voter not found")
+        self.assertEqual(results[5][1], 0.0)
+        self.assertEqual(BiometricAuthLog.objects.filter(ip_address='10.0.0.1').count(), 5)
+        self.assertEqual(len(embedding_cache.get_cache()), 3)
+        single = FederatedAuthenticationManager.verify_biometric('BAT0000002', -self.vectors['BAT0000002'])
+        self.assertAlmostEqual(single[1], results[1][1], places=5)
+
+    def test_kiosk_endpoint_applies_per_voter_lockouts(self):
+        self.client.force_login(User.objects.create_superuser('officer', 'officer@example.com', 'password'))
+        for _ in range(3):  # Lock BAT0000002 out through the single endpoint
+            self.client.post('/api/verify-biometric/', data={'voter_id': 'BAT0000002', 'confidence': 0.9},
+                             content_type='application/json')
+
+        response = self.client.post('/api/verify-biometric/batch/', data={'items': [
+            {'voter_id': 'BAT0000001', 'embedding': self.vectors['BAT0000001'].tolist(), 'confidence': 0.9},
+            {'voter_id': 'BAT0000002', 'embedding': self.vectors['BAT0000002'].tolist(), 'confidence': 0.9},
+            {'voter_id': 'BAT0000003', 'embedding': self.vectors['BAT0000003'].tolist(), 'confidence': 0.1},
+            {'voter_id': 'BAT0000004', 'embedding': [1, 2, 3], 'confidence': 0.9},
+        ]}, content_type='application/json')
+
+        results = response.json()['results']
+        self.assertEqual([result['verified'] for result in results], [True, False, False, False])
+        self.assertIn('Too many attempts', results[1]['error'])
+        self.assertEqual(results[2]['error'], 'Face detection confidence too low')
+        self.assertEqual(results[3]['error'], 'Invalid embedding')
+        self.assertEqual(rate_limit.locked_values('biometric', 'voter_id', ['BAT0000001', 'BAT0000002']),
+                         {'BAT0000002'})
+
+        self.client.logout()
+        self.assertEqual(self.client.post('/api/verify-biometric/batch/', data={'items': []},
+                                          content_type='application/json').status_code, 302)
+
+
+class SMSDispatchTests(TestCase):
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('timed out waiting for the dispatcher')
+            time.sleep(0.01)
+
+    def test_messages_are_batched_per_gateway_call(self):
+        gateway = LoopbackGateway()
+        dispatcher = SMSDispatcher(gateway, workers=1, batch_size=10, batch_wait_ms=100)
+        self.addCleanup(dispatcher.stop)
+
+        for i in range(25):
+            self.assertTrue(dispatcher.enqueue(f'90000000{i:02d}', 'code'))
+        self.wait_for(lambda: len(gateway.outbox) == 25)
+
+        self.assertLess(len(gateway.batches), 25)
+        self.assertLessEqual(max(gateway.batches), 10)
+        metrics = dispatcher.metrics()
+        self.assertEqual((metrics['sent'], metrics['queued']), (25, 0))
+
+    def test_failed_batches_are_retried_with_backoff(self):
+        gateway = LoopbackGateway()
+        gateway.fail_next = 2
+        dispatcher = SMSDispatcher(gateway, workers=1, backoff_base_ms=20, max_retries=3)
+        self.addCleanup(dispatcher.stop)
+
+        dispatcher.enqueue('9000000001', 'code')
+        self.wait_for(lambda: gateway.outbox)
+
+        metrics = dispatcher.metrics()
+        self.assertEqual((metrics['retried'], metrics['sent'], metrics['failed']), (2, 1, 0))
+        self.assertEqual(gateway.outbox[0].attempts, 3)
+
+    def test_console_gateway_masks_codes_and_a_gateway_is_required(self):
+        with self.assertLogs('voting.sms_dispatch', 'INFO') as logs:
+            ConsoleGateway().send_batch([SMSMessage('9876543210', 'Your Vote4All verification code is 123456.')])
+        self.assertIn('code is ******.', logs.output[0])
+        self.assertNotIn('123456', logs.output[0])
+
+        with override_settings(SMS_DISPATCH={'GATEWAY': None}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_dispatcher()
+
+    def test_full_queue_rejects_instead_of_blocking(self):
+        gateway = LoopbackGateway()
+        dispatcher = SMSDispatcher(gateway, workers=0, max_queue=1)
+
+        self.assertTrue(dispatcher.enqueue('9000000001', 'first'))
+        self.assertFalse(dispatcher.enqueue('9000000002', 'second'))
+        self.assertEqual(dispatcher.metrics()['rejected'], 1)
+
+    def test_send_otp_returns_before_delivery(self):
+        rate_limit._backend = None
+        client = Client()
+        config = {'GATEWAY': 'voting.sms_dispatch.LoopbackGateway', 'WORKERS': 1}
+        with override_settings(SMS_DISPATCH=config, OTP_SERVICE={'EXPOSE_CODES': False}):
+            response = client.post('/login-send-otp/', data={'method': 'voter_id', 'phone': '9876543210'},
+                                   content_type='application/json')
+            gateway = get_dispatcher().gateway
+            self.wait_for(lambda: gateway.outbox)
+
+        self.assertTrue(response.json()['success'])
+        self.assertNotIn('otp', response.json())
+        self.assertEqual(gateway.outbox[0].phone_number, '9876543210')
+        self.assertRegex(gateway.outbox[0].body, r'code is \d{6}')
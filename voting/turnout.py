@@ -0,0 +1,225 @@
+"""
+Turnout time series
+Maintains TurnoutBucket rows next to the Vote table: every committed
+ballot adds one to its constituency's minute bucket, and a periodic
+rollup folds closed minute buckets into hours and old hours into days.
+Turnout curves are then read from a handful of bucket rows instead of a
+GROUP BY over every Vote.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TurnoutBucket, Vote
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ['minute', 'hour', 'day']
+
+
+def _config():
+    return getattr(settings, 'TURNOUT', {})
+
+
+def bucket_start(moment, granularity='minute'):
+    """
+    Start of the bucket containing `moment`
+
+    Hours and days are cut in the local time zone, so polling-day curves
+    line up with the clock on the wall (Asia/Kolkata is not a whole-hour
+    offset from UTC).
+    """
+    local = timezone.localtime(moment)
+    if granularity == 'minute':
+        local = local.replace(second=0, microsecond=0)
+    elif granularity == 'hour':
+        local = local.replace(minute=0, second=0, microsecond=0)
+    elif granularity == 'day':
+        local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return local
+
+
+def add_to_buckets(granularity, counts):
+    """
+    Add votes to buckets of one granularity. Must run inside the caller's transaction.
+
+    Args:
+        granularity: 'minute', 'hour' or 'day'
+        counts: mapping of (constituency, bucket_start) -> votes to add
+    """
+    for (constituency, start), increment in counts.items():
+        if not increment:
+            continue
+        updated = TurnoutBucket.objects.filter(
+            constituency=constituency,
+            granularity=granularity,
+            bucket_start=start
+        ).update(votes=F('votes') + increment)
+
+        if updated:
+            continue
+
+        # First vote in this bucket
+        try:
+            with transaction.atomic():
+                TurnoutBucket.objects.create(
+                    constituency=constituency,
+                    granularity=granularity,
+                    bucket_start=start,
+                    votes=increment
+                )
+        except IntegrityError:
+            # Another request created the bucket first
+            TurnoutBucket.objects.filter(
+                constituency=constituency,
+                granularity=granularity,
+                bucket_start=start
+            ).update(votes=F('votes') + increment)
+
+
+def record_turnout(counts):
+    """
+    Add votes to minute buckets. Must be called inside the transaction
+    that creates the corresponding Vote rows.
+
+    Args:
+        counts: mapping of (constituency, cast_at) -> number of new votes
+    """
+    minutes = Counter()
+    for (constituency, cast_at), increment in counts.items():
+        minutes[(constituency, bucket_start(cast_at))] += increment
+    add_to_buckets('minute', minutes)
+
+
+def record_voter_turnout(constituency, cast_at=None):
+    """Add a single vote to its minute bucket"""
+    record_turnout({(constituency, cast_at or timezone.now()): 1})
+
+
+def roll_up(source, target, older_than):
+    """
+    Fold `source` buckets that started before `older_than` into `target` buckets
+
+    A ballot replayed late can still land in a minute bucket that was
+    already rolled up; the next run simply adds it to the coarser bucket.
+
+    Returns:
+        int: number of source buckets folded
+    """
+    with transaction.atomic():
+        rows = list(
+            TurnoutBucket.objects
+            .select_for_update()
+            .filter(granularity=source, bucket_start__lt=older_than)
+            .values_list('pk', 'constituency', 'bucket_start', 'votes')
+        )
+        counts = Counter()
+        for _, constituency, start, votes in rows:
+            counts[(constituency, bucket_start(start, target))] += votes
+
+        add_to_buckets(target, counts)
+        TurnoutBucket.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+    if rows:
+        logger.info(f"Rolled {len(rows)} {source} buckets into {len(counts)} {target} buckets")
+    return len(rows)
+
+
+def roll_up_turnout(now=None):
+    """
+    Coarse-grain the time series according to settings.TURNOUT
+
+    Minute buckets are kept for MINUTE_RETENTION_HOURS, hour buckets for
+    HOUR_RETENTION_DAYS. Only whole hours and days are folded, so a
+    partially elapsed hour is never split between resolutions.
+
+    Returns:
+        dict: buckets folded per source granularity
+    """
+    now = now or timezone.now()
+    config = _config()
+    minute_cutoff = bucket_start(now - timedelta(hours=config.get('MINUTE_RETENTION_HOURS', 6)), 'hour')
+    hour_cutoff = bucket_start(now - timedelta(days=config.get('HOUR_RETENTION_DAYS', 14)), 'day')
+    return {
+        'minute': roll_up('minute', 'hour', minute_cutoff),
+        'hour': roll_up('hour', 'day', hour_cutoff),
+    }
+
+
+@transaction.atomic
+def rebuild_turnout():
+    """
+    Replace the time series with minute buckets derived from Vote.timestamp
+
+    Returns:
+        dict: number of buckets written and votes counted
+    """
+    counts = Counter()
+    rows = Vote.objects.values_list('voter__constituency', 'timestamp').iterator(chunk_size=5000)
+    for constituency, timestamp in rows:
+        counts[(constituency, bucket_start(timestamp))] += 1
+
+    TurnoutBucket.objects.all().delete()
+    TurnoutBucket.objects.bulk_create([
+        TurnoutBucket(constituency=constituency, granularity='minute', bucket_start=start, votes=votes)
+        for (constituency, start), votes in counts.items()
+    ], batch_size=1000)
+
+    total_votes = sum(counts.values())
+    logger.info(f"Rebuilt {len(counts)} turnout buckets from {total_votes} votes")
+    return {'buckets': len(counts), 'votes': total_votes}
+
+
+def turnout_curve(constituency=None, granularity='hour', since=None, until=None):
+    """
+    Turnout curve per constituency
+
+    Buckets finer than `granularity` are merged into it; buckets that have
+    already been rolled up to something coarser are returned at their own
+    resolution, so the curve never invents a distribution inside them.
+
+    Args:
+        constituency: limit to one constituency (optional)
+        granularity: 'minute', 'hour' or 'day'
+        since, until: aware datetimes bounding bucket_start (optional)
+
+    Returns:
+        dict mapping constituency -> list of points ordered by start, each
+        {'start', 'granularity', 'votes', 'cumulative'}
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    buckets = TurnoutBucket.objects.all()
+    if constituency:
+        buckets = buckets.filter(constituency=constituency)
+    if since:
+        buckets = buckets.filter(bucket_start__gte=since)
+    if until:
+        buckets = buckets.filter(bucket_start__lt=until)
+
+    level = GRANULARITIES.index(granularity)
+    points = Counter()
+    for name, source, start, votes in buckets.values_list('constituency', 'granularity', 'bucket_start', 'votes'):
+        resolution = source if GRANULARITIES.index(source) > level else granularity
+        points[(name, bucket_start(start, resolution), resolution)] += votes
+
+    curves = {}
+    for (name, start, resolution), votes in sorted(points.items()):
+        curve = curves.setdefault(name, [])
+        cumulative = (curve[-1]['cumulative'] if curve else 0) + votes
+        curve.append({
+            'start': start.isoformat(),
+            'granularity': resolution,
+            'votes': votes,
+            'cumulative': cumulative,
+        })
+    return curves
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .rate_limit import rate_limit
 
 urlpatterns = [
     path('', views.landing, name='landing'),  # Start with landing page
@@ -11,14 +12,18 @@ urlpatterns = [
     path('register/', views.user_register, name='user_register'),
     path('register-submit/', views.user_register_submit, name='user_register_submit'),
     path('send-otp/', views.send_otp_page, name='send_otp_page'),
-    path('send-otp-api/', views.send_otp, name='send_otp'),
-    path('verify-otp/', views.verify_otp, name='verify_otp'),
+    path('send-otp-api/', rate_limit(views.send_otp, scope='otp-send', keys=['session', 'ip'],
+                                     max_requests=5), name='send_otp'),
+    path('verify-otp/', rate_limit(views.verify_otp, scope='otp-verify', keys=['session', 'ip'],
+                                   max_attempts=5), name='verify_otp'),
     path('registration-success/', views.registration_success, name='registration_success'),
     
     # New Login System
     path('login/', views.login_page, name='login_page'),
-    path('login-send-otp/', views.login_send_otp, name='login_send_otp'),
-    path('login-verify-otp/', views.login_verify_otp, name='login_verify_otp'),
+    path('login-send-otp/', rate_limit(views.login_send_otp, scope='login-send', keys=['phone', 'ip'],
+                                       max_requests=5), name='login_send_otp'),
+    path('login-verify-otp/', rate_limit(views.login_verify_otp, scope='login-verify', keys=['phone', 'ip'],
+                                         max_attempts=5), name='login_verify_otp'),
     
     # Legacy routes (can be removed later)
     path('digilocker-login/', views.user_register, name='digilocker_login'),  # Redirect to register
@@ -27,7 +32,8 @@ urlpatterns = [
     path('digilocker-signup-auth/', views.user_register_submit, name='digilocker_signup_auth'),  # Redirect to register
     
     path('voter-login/', views.voter_login, name='voter_login'),
-    path('voter-auth/', views.voter_auth, name='voter_auth'),
+    path('voter-auth/', rate_limit(views.voter_auth, scope='voter-auth', keys=['voter_id', 'ip']),
+         name='voter_auth'),
     path('voter-info/', views.voter_info, name='voter_info'),
     path('vote/', views.vote_page, name='vote'),
     path('vote', views.submit_vote, name='submit_vote'),  # For the original JS fetch call
@@ -51,7 +57,12 @@ from . import views_federated
 urlpatterns += [
     # Biometric Registration & Verification
     path('api/register-biometric/', views_federated.register_biometric_api, name='register_biometric_api'),
-    path('api/verify-biometric/', views_federated.verify_biometric_api, name='verify_biometric_api'),
+    path('api/verify-biometric/', rate_limit(views_federated.verify_biometric_api, scope='biometric',
+                                             keys=['voter_id', 'ip']), name='verify_biometric_api'),
+    # Booth kiosks; per-voter lockouts are applied by the view
+    path('api/verify-biometric/batch/', rate_limit(views_federated.verify_biometric_batch_api,
+                                                   scope='biometric-batch', keys=['ip']),
+         name='verify_biometric_batch_api'),
     
     # Federated Learning Coordination
     path('api/federated-model-info/', views_federated.federated_model_info_api, name='federated_model_info'),
@@ -64,3 +75,33 @@ urlpatterns += [
     # Public Statistics (no personal data)
     path('api/federated-stats/', views_federated.federated_learning_stats, name='federated_stats'),
 ]
+
+# Live results streaming (served by the ASGI application)
+from . import views_live
+
+urlpatterns += [
+    path('api/live-results/', views_live.live_results_stream, name='live_results_stream'),
+]
+
+# Turnout time series
+from . import views_turnout
+
+urlpatterns += [
+    path('api/turnout/', views_turnout.turnout_api, name='turnout_api'),
+]
+
+# Elector search
+from . import views_search
+
+urlpatterns += [
+    path('api/electors/search/', rate_limit(views_search.elector_search_api, scope='elector-search', keys=['ip'],
+                                            max_requests=120), name='elector_search'),
+]
+
+# Operator metrics
+from . import views_admission
+
+urlpatterns += [
+    path('api/admission-metrics/', views_admission.admission_metrics_api, name='admission_metrics'),
+    path('api/sms-metrics/', views_admission.sms_dispatch_metrics_api, name='sms_dispatch_metrics'),
+]
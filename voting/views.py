@@ -1,19 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponseRedirect
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
 import json
 import logging
-import random
 from datetime import datetime
 
 from .models import Voter, Candidate, Party, Vote, LoginSession, RegisteredUser, OTP
+from .admission import admission_controlled
+from .ballot_cache import get_ballot
+from .db_router import read_only_view
+from .idempotency import idempotent
+from .rate_limit import client_ip
+from . import otp_service, provisioning, registration_index
+from .tallies import record_vote
+from .turnout import record_voter_turnout
+from .vote_journal import get_vote_journal
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +44,15 @@ def user_register(request):
     """User registration page"""
     return render(request, 'voting/user_register.html')
 
+def _registration_conflict(collisions):
+    """Rejection naming the first colliding field, plus the full list"""
+    return JsonResponse({
+        'success': False,
+        'message': registration_index.UNIQUE_FIELDS[collisions[0]],
+        'conflicts': collisions
+    })
+
+@idempotent
 @csrf_exempt
 def user_register_submit(request):
     """Handle user registration form submission"""
@@ -92,31 +108,6 @@ def user_register_submit(request):
                     'message': f"Missing required fields: {', '.join(missing_fields)}"
                 })
             
-            # Check if username, voter ID, or Aadhaar already exists
-            if RegisteredUser.objects.filter(username=username).exists():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Username already exists'
-                })
-            
-            if RegisteredUser.objects.filter(voter_id_epic=voter_id_epic).exists():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Voter ID already registered'
-                })
-            
-            if RegisteredUser.objects.filter(aadhaar_number=aadhaar_number).exists():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Aadhaar number already registered'
-                })
-            
-            if RegisteredUser.objects.filter(phone_number=phone_number).exists():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Phone number already registered'
-                })
-            
             # Validate Aadhaar number (12 digits)
             if not aadhaar_number.isdigit() or len(aadhaar_number) != 12:
                 return JsonResponse({
@@ -131,6 +122,18 @@ def user_register_submit(request):
                     'message': 'Phone number must be 10 digits'
                 })
             
+            # Check if username, voter ID, Aadhaar or phone already exist
+            # (Bloom filters first, then at most one query)
+            unique_values = {
+                'username': username,
+                'voter_id_epic': voter_id_epic,
+                'aadhaar_number': aadhaar_number,
+                'phone_number': phone_number,
+            }
+            collisions = registration_index.check_unique(unique_values)
+            if collisions:
+                return _registration_conflict(collisions)
+            
             # Create user registration
             with transaction.atomic():
                 user_registration = RegisteredUser.objects.create(
@@ -159,6 +162,16 @@ def user_register_submit(request):
                     'redirect_url': '/send-otp/'
                 })
                 
+        except IntegrityError:
+            # Registered concurrently (or by another process) since the check
+            collisions = registration_index.find_collisions(unique_values)
+            if collisions:
+                return _registration_conflict(collisions)
+            logger.error("Registration failed on an unexpected integrity error")
+            return JsonResponse({
+                'success': False,
+                'message': 'Registration failed. Please try again.'
+            })
         except Exception as e:
             logger.error(f"Registration error: {str(e)}")
             return JsonResponse({
@@ -216,6 +229,7 @@ def voter_auth(request):
                 # Store user details in session
                 request.session['user_details'] = {
                     'voter_id': voter_id,
+                    'voter_pk': voter.pk,
                     'username': voter.user.username,
                     'login_type': 'voter_id',
                     'constituency': voter.constituency
@@ -232,6 +246,7 @@ def voter_auth(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
+@read_only_view
 def vote_page(request):
     """Main voting page"""
     # Check if user is authenticated via session
@@ -249,15 +264,83 @@ def vote_page(request):
         return redirect('home')
     
     # Get candidates for the voter's constituency
-    candidates = Candidate.objects.filter(constituency=voter.constituency).select_related('party')
+    ballot = get_ballot(voter.constituency)
     
     return render(request, 'voting/vote.html', {
-        'candidates': candidates,
+        'candidates': ballot.entries,
+        'ballot_json': ballot.json,
         'voter': voter
     })
 
+def claim_voter(voter_pk):
+    """
+    Atomically mark a voter as having voted
+    
+    Issues UPDATE ... WHERE has_voted = false so concurrent submissions
+    race on the row lock instead of a read-modify-write in Python.
+    
+    Returns:
+        bool: True if this call flipped has_voted, False otherwise
+    """
+    return Voter.objects.filter(pk=voter_pk, has_voted=False).update(has_voted=True) == 1
+
+def commit_vote(voter_pk, candidate_id, constituency, ip_address=None):
+    """
+    Record a ballot in its own transaction
+    
+    Returns:
+        bool: False if the voter could not be claimed
+    """
+    with transaction.atomic():
+        if not claim_voter(voter_pk):
+            return False
+        
+        Vote.objects.create(
+            voter_id=voter_pk,
+            candidate_id=candidate_id,
+            ip_address=ip_address
+        )
+        
+        # Keep the results and turnout tables in step with the Vote table
+        record_vote(candidate_id, constituency)
+        record_voter_turnout(constituency)
+    return True
+
+def journal_vote(journal, voter_pk, candidate_id, constituency, ip_address=None):
+    """
+    Record a ballot through the group-commit journal
+    
+    The voter is claimed in the database first, as in commit_vote, so
+    another worker's journal cannot accept a second ballot for them; the
+    Vote insert and tallies are applied in bulk by the journal flusher.
+    
+    Returns:
+        bool: False if the voter has already voted or has a ballot in flight
+    """
+    if not claim_voter(voter_pk):
+        return False
+    try:
+        accepted = journal.append(voter_pk, candidate_id, constituency, ip_address)
+    except Exception:
+        # Nothing was made durable: let the voter try again
+        Voter.objects.filter(pk=voter_pk, has_voted=True, vote__isnull=True).update(has_voted=False)
+        raise
+    if not accepted:
+        logger.error(f"Voter {voter_pk} was claimed with a ballot already in this process's journal")
+    return accepted
+
+def _session_voter(user_details):
+    """Return (voter_pk, constituency) for the logged-in voter"""
+    if 'voter_pk' in user_details:
+        return user_details['voter_pk'], user_details['constituency']
+    
+    # Sessions created before voter_pk was stored
+    return Voter.objects.values_list('pk', 'constituency').get(voter_id=user_details['voter_id'])
+
+@idempotent
 @csrf_exempt
 @require_http_methods(["POST"])
+@admission_controlled('vote')
 def submit_vote(request):
     """Handle vote submission"""
     user_details = request.session.get('user_details')
@@ -266,35 +349,35 @@ def submit_vote(request):
     
     try:
         data = json.loads(request.body)
-        candidate_name = data.get('candidate')
-        party_name = data.get('party')
         
-        with transaction.atomic():
-            # Get voter
-            voter = Voter.objects.get(voter_id=user_details['voter_id'])
-            
-            # Check if already voted
-            if voter.has_voted:
+        voter_pk, constituency = _session_voter(user_details)
+        
+        # Validate the choice against the cached ballot for this constituency
+        candidate = get_ballot(constituency).resolve(
+            candidate_id=data.get('candidate_id'),
+            name=data.get('candidate'),
+            party=data.get('party')
+        )
+        if candidate is None:
+            raise Candidate.DoesNotExist
+        
+        ip_address = get_client_ip(request)
+        
+        journal = get_vote_journal()
+        if journal is not None:
+            accepted = journal_vote(journal, voter_pk, candidate['id'], constituency, ip_address)
+        else:
+            accepted = commit_vote(voter_pk, candidate['id'], constituency, ip_address)
+        
+        if not accepted:
+            if Voter.objects.filter(pk=voter_pk).exists():
                 return JsonResponse({'error': 'You have already voted'}, status=400)
-            
-            # Get candidate
-            candidate = Candidate.objects.get(name=candidate_name, party__name=party_name)
-            
-            # Create vote record
-            vote = Vote.objects.create(
-                voter=voter,
-                candidate=candidate,
-                ip_address=get_client_ip(request)
-            )
-            
-            # Mark voter as having voted
-            voter.has_voted = True
-            voter.save()
-            
-            # Clear session
-            request.session.flush()
-            
-            return JsonResponse({'success': True, 'message': 'Vote submitted successfully'})
+            raise Voter.DoesNotExist
+        
+        # Clear session
+        request.session.flush()
+        
+        return JsonResponse({'success': True, 'message': 'Vote submitted successfully'})
             
     except Voter.DoesNotExist:
         return JsonResponse({'error': 'Voter not found'}, status=404)
@@ -327,6 +410,7 @@ def logout_user(request):
     request.session.flush()
     return JsonResponse({'success': True})
 
+@read_only_view
 def voter_info(request):
     """Voter information page"""
     user_details = request.session.get('user_details')
@@ -379,12 +463,8 @@ def face_detection(request):
         return redirect('home')
 
 def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    """Client address for audit rows (see voting.rate_limit.client_ip)"""
+    return client_ip(request)
 
 def send_otp_page(request):
     """OTP verification page"""
@@ -408,6 +488,7 @@ def login_page(request):
     return render(request, 'voting/login.html')
 
 @csrf_exempt
+@admission_controlled('otp')
 def login_send_otp(request):
     """Send OTP for login verification"""
     if request.method == 'POST':
@@ -430,16 +511,20 @@ def login_send_otp(request):
                 'data': data
             }
             
-            # For development - generate and log OTP
-            otp_code = str(random.randint(100000, 999999))
-            logger.info(f"Login OTP for {phone}: {otp_code} (method: {method})")
-            print(f"Login OTP for {phone}: {otp_code} (method: {method})")
+            otp_code = otp_service.issue(phone, purpose='login')
+            if not otp_service.deliver(phone, otp_code):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Failed to send OTP. Please try again.'
+                }, status=503)
             
-            return JsonResponse({
+            response_data = {
                 'success': True,
-                'message': f'OTP sent successfully to {phone}',
-                'otp': otp_code  # Remove this in production
-            })
+                'message': f'OTP sent successfully to {phone}'
+            }
+            if otp_service.expose_codes():
+                response_data['otp'] = otp_code  # Development only
+            return JsonResponse(response_data)
             
         except json.JSONDecodeError:
             return JsonResponse({
@@ -456,6 +541,7 @@ def login_send_otp(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 @csrf_exempt
+@admission_controlled('otp')
 def login_verify_otp(request):
     """Verify OTP and complete login"""
     if request.method == 'POST':
@@ -471,15 +557,18 @@ def login_verify_otp(request):
                     'error': 'No login attempt found. Please try again.'
                 })
             
-            # Validate OTP (accept any 6-digit code for development)
+            # Validate OTP format
             if not otp_code or not otp_code.isdigit() or len(otp_code) != 6:
                 return JsonResponse({
                     'success': False,
                     'error': 'Please enter a valid 6-digit OTP'
                 })
             
-            # For development - accept any 6-digit OTP
-            logger.info(f"Login OTP verification bypassed - accepted OTP: {otp_code} for phone: {login_attempt['phone']}")
+            if not otp_service.verify(login_attempt['phone'], otp_code, purpose='login'):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Invalid or expired OTP'
+                })
             
             # Create mock user session for development
             # In production, you would verify the user exists in your database
@@ -515,6 +604,7 @@ def login_verify_otp(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 @csrf_exempt
+@admission_controlled('otp')
 def send_otp(request):
     """Send OTP to phone number for verification"""
     if request.method == 'POST':
@@ -541,22 +631,20 @@ def send_otp(request):
                     'error': 'Please provide a valid 10-digit phone number'
                 })
             
-            # Generate 6-digit OTP (for display purposes only)
-            otp_code = str(random.randint(100000, 999999))
-            
-            # Skip database operations for development
-            # No need to create OTP records since we accept any 6-digit code
-            
-            # Here you would integrate with an SMS service like Twilio, AWS SNS, etc.
-            # For development, we'll just log the OTP
-            logger.info(f"OTP for {phone}: {otp_code} (development mode - any 6-digit code accepted)")
-            print(f"OTP for {phone}: {otp_code} (development mode - any 6-digit code accepted)")  # Console output for development
+            otp_code = otp_service.issue(phone, purpose='registration')
+            if not otp_service.deliver(phone, otp_code):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Failed to send OTP. Please try again.'
+                }, status=503)
             
-            return JsonResponse({
+            response_data = {
                 'success': True,
-                'message': f'OTP sent successfully to {phone}',
-                'otp': otp_code  # Remove this in production - only for development
-            })
+                'message': f'OTP sent successfully to {phone}'
+            }
+            if otp_service.expose_codes():
+                response_data['otp'] = otp_code  # Development only
+            return JsonResponse(response_data)
             
         except json.JSONDecodeError:
             return JsonResponse({
@@ -576,6 +664,7 @@ def send_otp(request):
     })
 
 @csrf_exempt
+@admission_controlled('otp')
 def verify_otp(request):
     """Verify OTP and complete registration"""
     if request.method == 'POST':
@@ -599,15 +688,18 @@ def verify_otp(request):
                     'error': 'Registration not found'
                 })
             
-            # Verify OTP - Simplified for development (accept any 6-digit code)
+            # Verify OTP format
             if not otp_code or not otp_code.isdigit() or len(otp_code) != 6:
                 return JsonResponse({
                     'success': False,
                     'error': 'Please enter a valid 6-digit OTP'
                 })
             
-            # For development - accept any 6-digit OTP
-            logger.info(f"OTP verification bypassed - accepted OTP: {otp_code} for phone: {registration.phone_number}")
+            if not otp_service.verify(registration.phone_number, otp_code, purpose='registration'):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Invalid or expired OTP'
+                })
             
             # Mark phone as verified and complete registration
             with transaction.atomic():
@@ -616,37 +708,19 @@ def verify_otp(request):
                 # Auto-approve and create voter account for seamless experience
                 registration.documents_verified = True
                 registration.is_approved = True
+                registration.save(update_fields=['phone_verified', 'documents_verified', 'is_approved', 'updated_at'])
                 
-                # Create Django User account
-                django_user, created = User.objects.get_or_create(
-                    username=registration.username,
-                    defaults={
-                        'first_name': registration.full_name.split()[0],
-                        'last_name': ' '.join(registration.full_name.split()[1:]) if len(registration.full_name.split()) > 1 else '',
-                        'email': registration.email or '',
-                        'is_active': True,
-                    }
-                )
-                
-                if created:
-                    # Set a default password (user will login via OTP)
-                    django_user.set_password('temp_password_123')
-                    django_user.save()
-                
-                # Create Voter account
-                voter, voter_created = Voter.objects.get_or_create(
-                    voter_id=registration.voter_id_epic,
-                    defaults={
-                        'user': django_user,
-                        'constituency': registration.constituency,
-                        'phone_number': registration.phone_number,
-                        'date_of_birth': registration.date_of_birth,
-                    }
-                )
-                
-                # Link the voter to registration
-                registration.linked_voter = voter
-                registration.save()
+                # Create the User and Voter and link them (OTP login, no password to hash)
+                stats = provisioning.provision_registrations([registration.pk])
+                if not stats['provisioned']:
+                    # Leave the registration pending rather than approved without a voter
+                    transaction.set_rollback(True)
+                    logger.warning(f"Could not provision registration {registration.pk} "
+                                   f"({stats['conflicts']} conflicts); approval rolled back")
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Your voter account could not be created. Please contact the election office.'
+                    })
                 
                 # Clear session
                 del request.session['pending_registration_id']
@@ -0,0 +1,42 @@
+"""
+Operator metrics
+Admission control and SMS dispatch counters for the worker serving the request
+"""
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from .admission import admission_metrics
+from .sms_dispatch import get_dispatcher
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def admission_metrics_api(request):
+    """
+    Admission counters for the worker process serving the request
+
+    Response:
+        {
+            "vote": {"active": 3, "queued": 0, "service_time_ms": 12.4,
+                     "admitted": 15230, "shed_rate": 12, "shed_latency": 40}
+        }
+    """
+    return JsonResponse(admission_metrics())
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def sms_dispatch_metrics_api(request):
+    """
+    SMS queue depth, delivery counters and enqueue-to-delivery latency
+
+    Response:
+        {
+            "enqueued": 5120, "sent": 5100, "retried": 14, "failed": 0, "rejected": 0,
+            "batches": 212, "queued": 18, "retrying": 2,
+            "latency_p50_ms": 31.0, "latency_p95_ms": 180.2, "latency_max_ms": 950.4
+        }
+    """
+    return JsonResponse(get_dispatcher().metrics())
@@ -9,7 +9,9 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from .federated_auth import (
     FederatedAuthenticationManager,
@@ -17,6 +19,9 @@ from .federated_auth import (
     BiometricEmbedding
 )
 from .models import Voter
+from .db_router import read_only_view
+from .rate_limit import client_ip, locked_values, record_failures
+from . import embedding_cache
 import json
 import logging
 import numpy as np
@@ -25,13 +30,8 @@ logger = logging.getLogger(__name__)
 
 
 def get_client_ip(request):
-    """Extract client IP address from request"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    """Extract client IP address from request (see voting.rate_limit.client_ip)"""
+    return client_ip(request)
 
 
 @require_http_methods(["POST"])
@@ -79,7 +79,7 @@ def register_biometric_api(request):
         
         # Get voter
         try:
-            voter = Voter.objects.get(voter_id_epic=voter_id)
+            voter = Voter.objects.get(voter_id=voter_id)
         except Voter.DoesNotExist:
             return JsonResponse({
                 'success': False,
@@ -213,6 +213,100 @@ def verify_biometric_api(request):
         }, status=500)
 
 
+@staff_member_required
+@require_http_methods(["POST"])
+def verify_biometric_batch_api(request):
+    """
+    Verify a queue of voters from a polling booth kiosk in one call
+    
+    The kiosk signs in as a booth officer and sends the face descriptors it
+    computed. Voters locked out on /api/verify-biometric/ are refused here
+    too, and failures here count towards their lockout.
+    
+    Request body:
+        {
+            "items": [
+                {"voter_id": "ABC1234567", "embedding": [128 floats], "confidence": 0.92},
+                ...
+            ]
+        }
+    
+    Response (one result per item, in order):
+        {
+            "results": [
+                {"voter_id": "ABC1234567", "verified": true, "similarity": 0.87,
+                 "message": "Authentication successful"},
+                {"voter_id": "XYZ7654321", "verified": false, "error": "Face detection confidence too low"},
+                ...
+            ]
+        }
+    """
+    verification = getattr(settings, 'BIOMETRIC_VERIFICATION', {})
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'error': 'Missing required fields'}, status=400)
+    if len(items) > verification.get('MAX_BATCH_SIZE', 100):
+        return JsonResponse({
+            'error': f"At most {verification.get('MAX_BATCH_SIZE', 100)} voters per batch"
+        }, status=400)
+    
+    try:
+        dimension = verification.get('EMBEDDING_DIMENSION', 128)
+        min_confidence = verification.get('MIN_CONFIDENCE', 0.5)
+        voter_ids = [item.get('voter_id') if isinstance(item, dict) else None for item in items]
+        locked = locked_values('biometric', 'voter_id', {str(voter_id) for voter_id in voter_ids if voter_id})
+        
+        results, pending = [], []
+        for item, voter_id in zip(items, voter_ids):
+            result = {'voter_id': voter_id, 'verified': False}
+            results.append(result)
+            if not voter_id or not item.get('embedding'):
+                result['error'] = 'Missing required fields'
+                continue
+            if str(voter_id) in locked:
+                result['error'] = 'Too many attempts. Please try again later.'
+                continue
+            confidence = item.get('confidence', 0.0)
+            if not isinstance(confidence, (int, float)) or confidence < min_confidence:
+                result['error'] = 'Face detection confidence too low'
+                result['similarity'] = 0.0
+                continue
+            try:
+                challenge = np.asarray(item['embedding'], dtype=np.float32)
+            except (TypeError, ValueError):
+                challenge = None
+            if challenge is None or challenge.shape != (dimension,):
+                result['error'] = 'Invalid embedding'
+                continue
+            pending.append((result, str(voter_id), challenge))
+        
+        verified = FederatedAuthenticationManager.verify_biometric_batch(
+            [(voter_id, challenge) for result, voter_id, challenge in pending],
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+        for (result, voter_id, challenge), (is_verified, similarity, message) in zip(pending, verified):
+            result.update(verified=is_verified, similarity=round(similarity, 4), message=message)
+        
+        record_failures('biometric', 'voter_id', [
+            str(result['voter_id']) for result in results
+            if result['voter_id'] and not result['verified'] and str(result['voter_id']) not in locked
+        ])
+        logger.info(f"Batch biometric verification from {get_client_ip(request)}: "
+                    f"{sum(result['verified'] for result in results)} of {len(results)} verified")
+        return JsonResponse({'results': results})
+    
+    except Exception as e:
+        logger.error(f"Error in batch biometric verification: {str(e)}")
+        return JsonResponse({'error': 'Verification failed'}, status=500)
+
+
+@read_only_view
 @require_http_methods(["GET"])
 def federated_model_info_api(request):
     """
@@ -231,16 +325,20 @@ def federated_model_info_api(request):
         active_model = FederatedAuthenticationManager.get_active_model_version()
         
         if not active_model:
-            # Create initial model version if none exists
-            active_model = FederatedModelVersion.objects.create(
-                version='v1.0.0',
-                model_weights={'weights': []},
-                num_participants=0,
-                is_active=True,
-                notes='Initial federated model version'
-            )
-            active_model.activate()
-            logger.info("Created initial federated model version v1.0.0")
+            with transaction.atomic():
+                # A lagging replica may not have it yet; check the primary
+                active_model = FederatedAuthenticationManager.get_active_model_version()
+                if not active_model:
+                    # Create initial model version if none exists
+                    active_model = FederatedModelVersion.objects.create(
+                        version='v1.0.0',
+                        model_weights={'weights': []},
+                        num_participants=0,
+                        is_active=True,
+                        notes='Initial federated model version'
+                    )
+                    active_model.activate()
+                    logger.info("Created initial federated model version v1.0.0")
         
         return JsonResponse({
             'version': active_model.version,
@@ -339,7 +437,7 @@ def submit_federated_gradients_api(request):
         
         min_participants = getattr(settings, 'FEDERATED_LEARNING', {}).get('MIN_PARTICIPANTS', 10)
         
-        logger.info(f"Received gradient contribution from {voter.voter_id_epic} ({pending_count}/{min_participants} pending)")
+        logger.info(f"Received gradient contribution from {voter.voter_id} ({pending_count}/{min_participants} pending)")
         
         return JsonResponse({
             'status': 'success',
@@ -442,7 +540,9 @@ def delete_biometric_data(request):
             is_active=True
         ).update(is_active=False)
         
-        logger.info(f"Deactivated {deleted_count} biometric embeddings for voter {voter.voter_id_epic}")
+        # A queryset update sends no signals
+        transaction.on_commit(lambda: embedding_cache.invalidate(voter.voter_id))
+        logger.info(f"Deactivated {deleted_count} biometric embeddings for voter {voter.voter_id}")
         
         return JsonResponse({
             'success': True,
@@ -463,6 +563,7 @@ def delete_biometric_data(request):
         }, status=500)
 
 
+@read_only_view
 @require_http_methods(["GET"])
 def federated_learning_stats(request):
     """
@@ -16,6 +16,7 @@ from .ballot_simplification import (
     BallotInteractionLog,
 )
 from .models import Voter, Candidate, Party
+from .db_router import read_only_view
 import json
 
 
@@ -270,6 +271,7 @@ def request_simplification(request):
     })
 
 
+@read_only_view
 @require_http_methods(["GET"])
 def get_user_literacy_status(request):
     """
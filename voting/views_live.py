@@ -0,0 +1,76 @@
+"""
+Live results streaming endpoint
+Pushes per-constituency turnout and tally deltas to observers over
+Server-Sent Events. Designed for the ASGI entry point (vote4all.asgi);
+under WSGI it degrades to a single snapshot and lets EventSource reconnect.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .live_results import LiveEvent, get_aggregator, read_tallies
+
+
+def _config():
+    return getattr(settings, 'LIVE_RESULTS', {})
+
+
+async def live_results_stream(request):
+    """
+    Server-Sent Events stream of turnout and tally changes
+
+    Query params:
+        - constituency: only send events for this constituency (optional)
+
+    Events:
+        snapshot: full tallies on connect (and after falling behind)
+        delta: candidates whose totals changed since the previous tick
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    constituency = request.GET.get('constituency') or None
+    retry_ms = int(_config().get('TICK_SECONDS', 2.0) * 1000)
+
+    if not isinstance(request, ASGIRequest):
+        # A sync server would buffer an endless stream; send one snapshot
+        snapshot = await sync_to_async(read_tallies)()
+        chunk = LiveEvent('snapshot', 0, snapshot).render(constituency) or b''
+        response = HttpResponse(f"retry: {retry_ms}\n\n".encode() + chunk, content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(
+            _event_stream(get_aggregator(), constituency, retry_ms),
+            content_type='text/event-stream'
+        )
+
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+async def _event_stream(aggregator, constituency, retry_ms):
+    # Django 4.2 does not notice client disconnects mid-stream, so every
+    # stream ends after MAX_STREAM_SECONDS and EventSource reconnects
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _config().get('MAX_STREAM_SECONDS', 600)
+
+    queue = await aggregator.subscribe()
+    try:
+        yield f"retry: {retry_ms}\n\n".encode()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            chunk = event.render(constituency)
+            if chunk:
+                yield chunk
+    finally:
+        aggregator.unsubscribe(queue)
@@ -0,0 +1,56 @@
+"""
+Elector search API
+Backs the search page: find an electoral record by name, EPIC number or
+constituency (voting.elector_search)
+"""
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from .db_router import read_only_view
+from .elector_search import normalize, search
+
+
+@read_only_view
+@require_http_methods(["GET"])
+def elector_search_api(request):
+    """
+    Prefix and fuzzy search over the electoral roll
+
+    Query params:
+        - q: name, EPIC number or constituency, or the start of one
+        - constituency: only voters of this constituency (optional)
+        - limit: page size (default PAGE_SIZE, at most MAX_PAGE_SIZE)
+        - cursor: next_cursor from the previous page (optional)
+
+    Response:
+        {
+            "results": [
+                {"voter_id": "ABC1234567", "full_name": "Asha Rao", "constituency": "Varanasi", "score": 1.4615}
+            ],
+            "next_cursor": "WzEuNDYxNSwgIkFCQzEyMzQ1NjciXQ=="
+        }
+    """
+    config = getattr(settings, 'ELECTOR_SEARCH', {})
+    query = request.GET.get('q', '')
+    min_length = config.get('MIN_QUERY_LENGTH', 2)
+    if len(normalize(query)) < min_length:
+        return JsonResponse({'error': f'q must have at least {min_length} letters or digits'}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', config.get('PAGE_SIZE', 20)))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    limit = max(1, min(limit, config.get('MAX_PAGE_SIZE', 50)))
+
+    try:
+        page = search(
+            query,
+            constituency=request.GET.get('constituency') or None,
+            limit=limit,
+            cursor=request.GET.get('cursor') or None,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(page)
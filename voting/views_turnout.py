@@ -0,0 +1,56 @@
+"""
+Turnout curve API
+Serves per-constituency turnout over time from the TurnoutBucket rollups
+"""
+
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_http_methods
+
+from .db_router import read_only_view
+from .turnout import GRANULARITIES, turnout_curve
+
+
+@read_only_view
+@require_http_methods(["GET"])
+def turnout_api(request):
+    """
+    Turnout curves per constituency
+
+    Query params:
+        - constituency: limit to one constituency (optional)
+        - granularity: minute, hour (default) or day
+        - since, until: ISO 8601 bounds on bucket start (optional)
+
+    Response:
+        {
+            "granularity": "hour",
+            "constituencies": {
+                "Varanasi": [
+                    {"start": "2024-06-01T07:00:00+05:30", "granularity": "hour", "votes": 812, "cumulative": 812}
+                ]
+            }
+        }
+    """
+    granularity = request.GET.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return JsonResponse({
+            'error': f"granularity must be one of {', '.join(GRANULARITIES)}"
+        }, status=400)
+
+    bounds = {}
+    for name in ('since', 'until'):
+        value = request.GET.get(name)
+        if not value:
+            continue
+        moment = parse_datetime(value)
+        if moment is None or moment.tzinfo is None:
+            return JsonResponse({'error': f'{name} must be an ISO 8601 datetime with offset'}, status=400)
+        bounds[name] = moment
+
+    curves = turnout_curve(
+        constituency=request.GET.get('constituency') or None,
+        granularity=granularity,
+        **bounds
+    )
+    return JsonResponse({'granularity': granularity, 'constituencies': curves})
@@ -0,0 +1,437 @@
+"""
+Group-commit vote journal
+Optional write path for submit_vote: accepted ballots are appended to a
+local append-only log and fsynced in groups, then bulk-inserted into Vote
+by a background flusher. Entries that never reached the database (crash,
+kill -9, power loss) are replayed idempotently on the next start.
+
+Each worker process owns one journal file (votes-<pid>.log) and holds an
+exclusive flock on it while alive. Any journal file that can be locked
+belongs to a dead process and is replayed and removed.
+
+The journal does not remove the per-vote database commit: so that two
+workers cannot both accept a ballot for one voter, voting.views.journal_vote
+still claims the voter with one autocommit UPDATE per ballot before the
+append. What moves out of the request is the Vote insert and the tally
+and turnout writes, which the flusher applies in bulk.
+"""
+
+from collections import Counter, deque
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATTERN = 'votes-*.log'
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+def apply_ballots(records):
+    """
+    Insert journaled ballots into Vote in one transaction
+
+    Voters that already have a Vote row are skipped, so applying the same
+    records twice (e.g. replay after a crash) changes nothing. Voters are
+    normally claimed (has_voted) when their ballot is journaled, see
+    voting.views.journal_vote; has_voted is only set here for entries
+    journaled without a claim.
+
+    Args:
+        records: list of journal record dicts
+
+    Returns:
+        int: number of votes inserted
+    """
+    from .models import Vote, Voter
+    from .tallies import record_votes
+    from .turnout import record_turnout
+
+    if not records:
+        return 0
+
+    with transaction.atomic():
+        voted = set(
+            Vote.objects
+            .filter(voter_id__in={record['voter_pk'] for record in records})
+            .values_list('voter_id', flat=True)
+        )
+
+        votes = []
+        counts = Counter()
+        turnout = Counter()
+        skipped = 0
+        for record in records:
+            if record['voter_pk'] in voted:
+                skipped += 1
+                continue
+            voted.add(record['voter_pk'])
+            votes.append(Vote(
+                voter_id=record['voter_pk'],
+                candidate_id=record['candidate_id'],
+                ip_address=record.get('ip_address'),
+            ))
+            counts[(record['candidate_id'], record['constituency'])] += 1
+            cast_at = parse_datetime(record['cast_at']) if record.get('cast_at') else timezone.now()
+            turnout[(record['constituency'], cast_at)] += 1
+
+        Vote.objects.bulk_create(votes)
+        unclaimed = Voter.objects.filter(
+            pk__in=[vote.voter_id for vote in votes], has_voted=False
+        ).update(has_voted=True)
+        record_votes(counts)
+        record_turnout(turnout)
+
+    if unclaimed:
+        logger.warning(f"{unclaimed} journaled ballots were applied for voters not claimed when journaled")
+    if skipped:
+        # Replayed entries, or a ballot accepted without a claim
+        logger.warning(f"Skipped {skipped} journaled ballots for voters who already have a vote")
+    return len(votes)
+
+
+def read_journal(path, offset=0):
+    """
+    Yield (end_offset, record) for each complete entry after offset
+    A torn final line from an interrupted write is ignored
+    """
+    with open(path, 'rb') as journal_file:
+        journal_file.seek(offset)
+        for line in journal_file:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            yield offset, json.loads(line)
+
+
+def read_checkpoint(path):
+    """Byte offset up to which a journal has been applied"""
+    try:
+        with open(path + CHECKPOINT_SUFFIX) as checkpoint_file:
+            return int(checkpoint_file.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, offset):
+    """Durably record the applied offset (write temp file, fsync, rename)"""
+    temp_path = f"{path}{CHECKPOINT_SUFFIX}.tmp"
+    with open(temp_path, 'w') as checkpoint_file:
+        checkpoint_file.write(str(offset))
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_path, path + CHECKPOINT_SUFFIX)
+
+
+def replay_journal(path, batch_size=500):
+    """
+    Apply every entry past the checkpoint of one journal file
+
+    Returns:
+        tuple: (entries read, votes inserted)
+    """
+    offset = read_checkpoint(path)
+    batch = []
+    read = inserted = 0
+
+    for end_offset, record in read_journal(path, offset):
+        batch.append(record)
+        read += 1
+        if len(batch) >= batch_size:
+            inserted += apply_ballots(batch)
+            write_checkpoint(path, end_offset)
+            batch = []
+        offset = end_offset
+
+    if batch:
+        inserted += apply_ballots(batch)
+        write_checkpoint(path, offset)
+
+    return read, inserted
+
+
+def recover_orphaned_journals(directory, batch_size=500):
+    """
+    Replay and remove journals left behind by dead processes
+
+    Returns:
+        tuple: (entries read, votes inserted) across all recovered files
+    """
+    total_read = total_inserted = 0
+
+    for path in sorted(glob.glob(os.path.join(directory, JOURNAL_PATTERN))):
+        with open(path, 'ab') as journal_file:
+            try:
+                fcntl.flock(journal_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Owned by a live process
+
+            read, inserted = replay_journal(path, batch_size)
+            os.remove(path)
+            if os.path.exists(path + CHECKPOINT_SUFFIX):
+                os.remove(path + CHECKPOINT_SUFFIX)
+
+        total_read += read
+        total_inserted += inserted
+        logger.info(f"Recovered vote journal {path}: {read} entries, {inserted} new votes")
+
+    return total_read, total_inserted
+
+
+class VoteJournal:
+    """
+    Append-only ballot journal with group commit and a background flusher
+
+    append() blocks until the ballot's journal entry has been fsynced.
+    A committer thread fsyncs every FLUSH_INTERVAL_MS or as soon as
+    FLUSH_BATCH_SIZE entries are waiting, so one fsync covers many ballots.
+    A flusher thread bulk-inserts durable entries into Vote and advances
+    the checkpoint.
+    """
+
+    def __init__(self, directory, flush_interval_ms=10, flush_batch_size=256,
+                 apply_batch_size=500, apply_interval_ms=100, rotate_bytes=64 * 1024 * 1024):
+        self.directory = str(directory)
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch_size = flush_batch_size
+        self.apply_batch_size = apply_batch_size
+        self.apply_interval = apply_interval_ms / 1000
+        self.rotate_bytes = rotate_bytes
+        self.pid = os.getpid()
+        self.path = os.path.join(self.directory, f'votes-{self.pid}.log')
+
+        self._lock = threading.Lock()
+        self._durable_changed = threading.Condition(self._lock)
+        self._commit_wakeup = threading.Condition(self._lock)
+        self._apply_wakeup = threading.Condition(self._lock)
+
+        self._file = None
+        self._written_offset = 0
+        self._written_seq = 0
+        self._durable_seq = 0
+        self._unsynced = []
+        self._durable = deque()
+        self._pending_voters = set()
+        self._error = None
+        self._stopping = False
+        self._committer = None
+        self._flusher = None
+
+    @classmethod
+    def from_settings(cls, config):
+        return cls(
+            directory=config.get('DIRECTORY', settings.BASE_DIR / 'vote_journal'),
+            flush_interval_ms=config.get('FLUSH_INTERVAL_MS', 10),
+            flush_batch_size=config.get('FLUSH_BATCH_SIZE', 256),
+            apply_batch_size=config.get('APPLY_BATCH_SIZE', 500),
+            apply_interval_ms=config.get('APPLY_INTERVAL_MS', 100),
+            rotate_bytes=config.get('ROTATE_BYTES', 64 * 1024 * 1024),
+        )
+
+    def start(self):
+        """Recover orphaned journals, open our own and start the worker threads"""
+        os.makedirs(self.directory, exist_ok=True)
+        recover_orphaned_journals(self.directory, self.apply_batch_size)
+        self._file = self._open_locked()
+
+        self._committer = threading.Thread(target=self._commit_loop, name='vote-journal-commit', daemon=True)
+        self._flusher = threading.Thread(target=self._apply_loop, name='vote-journal-apply', daemon=True)
+        self._committer.start()
+        self._flusher.start()
+        atexit.register(self.stop)
+        logger.info(f"Vote journal started at {self.path}")
+        return self
+
+    def _open_locked(self):
+        while True:
+            journal_file = open(self.path, 'ab')
+            fcntl.flock(journal_file, fcntl.LOCK_EX)
+            # A recovering process may have removed the file before we
+            # locked it; only keep the handle if it is still linked
+            try:
+                if os.stat(self.path).st_ino == os.fstat(journal_file.fileno()).st_ino:
+                    journal_file.seek(0, os.SEEK_END)
+                    self._written_offset = journal_file.tell()
+                    return journal_file
+            except FileNotFoundError:
+                pass
+            journal_file.close()
+
+    def append(self, voter_pk, candidate_id, constituency, ip_address=None):
+        """
+        Journal a ballot and block until it is durable
+
+        Callers claim the voter in the database first (journal_vote); the
+        in-process check only guards against journaling one claim twice.
+
+        Returns:
+            bool: False if this process already holds a ballot for the voter
+        """
+        record = {
+            'voter_pk': voter_pk,
+            'candidate_id': candidate_id,
+            'constituency': constituency,
+            'ip_address': ip_address,
+            'cast_at': timezone.now().isoformat(),
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError('Vote journal is shut down')
+            if voter_pk in self._pending_voters:
+                return False
+            self._pending_voters.add(voter_pk)
+
+            self._file.write(line)
+            self._written_offset += len(line)
+            self._written_seq += 1
+            seq = self._written_seq
+            self._unsynced.append((self._written_offset, record))
+            if len(self._unsynced) >= self.flush_batch_size:
+                self._commit_wakeup.notify()
+
+            while self._durable_seq < seq:
+                if self._error:
+                    raise self._error
+                self._durable_changed.wait()
+
+        return True
+
+    def _commit_loop(self):
+        while True:
+            with self._lock:
+                self._commit_wakeup.wait_for(
+                    lambda: len(self._unsynced) >= self.flush_batch_size or self._stopping,
+                    timeout=self.flush_interval
+                )
+                if not self._unsynced:
+                    if self._stopping:
+                        return
+                    continue
+                self._file.flush()
+                batch, self._unsynced = self._unsynced, []
+                seq = self._written_seq
+
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logger.error(f"Vote journal fsync failed: {e}")
+                with self._lock:
+                    self._error = e
+                    self._durable_changed.notify_all()
+                return
+
+            with self._lock:
+                self._durable_seq = seq
+                self._durable.extend(batch)
+                self._durable_changed.notify_all()
+                if len(self._durable) >= self.apply_batch_size:
+                    self._apply_wakeup.notify()
+
+    def _apply_loop(self):
+        try:
+            while True:
+                with self._lock:
+                    self._apply_wakeup.wait_for(
+                        lambda: len(self._durable) >= self.apply_batch_size or self._stopping,
+                        timeout=self.apply_interval
+                    )
+                    size = min(len(self._durable), self.apply_batch_size)
+                    batch = [self._durable.popleft() for _ in range(size)]
+                    if not batch:
+                        if self._stopping and not self._committer.is_alive():
+                            return
+                        continue
+
+                try:
+                    apply_ballots([record for _, record in batch])
+                    write_checkpoint(self.path, batch[-1][0])
+                except Exception as e:
+                    logger.error(f"Failed to apply {len(batch)} journaled ballots, will retry: {e}")
+                    with self._lock:
+                        self._durable.extendleft(reversed(batch))
+                        if self._stopping:
+                            return  # Left in the journal for replay
+                    time.sleep(self.apply_interval)
+                    continue
+
+                with self._lock:
+                    for _, record in batch:
+                        self._pending_voters.discard(record['voter_pk'])
+                    self._maybe_rotate(batch[-1][0])
+        finally:
+            connection.close()
+
+    def _maybe_rotate(self, applied_offset):
+        # Called with the lock held: nothing can be appended meanwhile
+        fully_applied = (
+            applied_offset == self._written_offset
+            and not self._unsynced
+            and not self._durable
+        )
+        if fully_applied and self._written_offset >= self.rotate_bytes:
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            self._written_offset = 0
+            write_checkpoint(self.path, 0)
+
+    def pending(self):
+        """Number of journaled ballots not yet applied to the database"""
+        with self._lock:
+            return len(self._unsynced) + len(self._durable)
+
+    def stop(self):
+        """Flush and apply everything outstanding, then release the journal"""
+        with self._lock:
+            if self._stopping or self._file is None:
+                return
+            self._stopping = True
+            self._commit_wakeup.notify_all()
+            self._apply_wakeup.notify_all()
+
+        self._committer.join()
+        self._flusher.join()
+
+        with self._lock:
+            drained = not self._durable and not self._unsynced
+            if drained:
+                os.remove(self.path)
+                if os.path.exists(self.path + CHECKPOINT_SUFFIX):
+                    os.remove(self.path + CHECKPOINT_SUFFIX)
+            self._file.close()
+        logger.info(f"Vote journal stopped ({'drained' if drained else 'entries left for replay'})")
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_vote_journal():
+    """
+    Process-wide vote journal
+
+    Returns:
+        VoteJournal, or None when settings.VOTE_JOURNAL is disabled
+    """
+    global _journal
+
+    config = getattr(settings, 'VOTE_JOURNAL', {})
+    if not config.get('ENABLED'):
+        return None
+
+    if _journal is None or _journal.pid != os.getpid():
+        with _journal_lock:
+            if _journal is None or _journal.pid != os.getpid():
+                _journal = VoteJournal.from_settings(config).start()
+    return _journal